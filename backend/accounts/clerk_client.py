@@ -0,0 +1,175 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after ``failure_threshold`` consecutive failures and rejects calls for
+    ``reset_timeout`` seconds. After that one trial call is let through
+    (half-open). A success closes the breaker again and a failure reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit opened after {self.failures} consecutive failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class ClientMetrics:
+    """Per-endpoint request, error and latency counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def _endpoint(self, endpoint):
+        stats = self._endpoints.get(endpoint)
+        if stats is None:
+            stats = self._endpoints[endpoint] = {
+                "requests": 0,
+                "errors": 0,
+                "timeouts": 0,
+                "shortCircuited": 0,
+                "staleServed": 0,
+                "latencyTotalMs": 0.0,
+                "latencyMaxMs": 0.0,
+                "latencyBucketsMs": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            }
+        return stats
+
+    def record_request(self, endpoint, latency_ms, error=False, timeout=False):
+        with self._lock:
+            stats = self._endpoint(endpoint)
+            stats["requests"] += 1
+            stats["errors"] += int(error)
+            stats["timeouts"] += int(timeout)
+            stats["latencyTotalMs"] += latency_ms
+            stats["latencyMaxMs"] = max(stats["latencyMaxMs"], latency_ms)
+            stats["latencyBucketsMs"][bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+
+    def increment(self, endpoint, counter):
+        with self._lock:
+            self._endpoint(endpoint)[counter] += 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._endpoints.items():
+                result[endpoint] = {
+                    **stats,
+                    "latencyBucketsMs": dict(zip(
+                        [f"le_{bound}" for bound in LATENCY_BUCKETS_MS] + ["inf"],
+                        stats["latencyBucketsMs"],
+                    )),
+                    "latencyAvgMs": stats["latencyTotalMs"] / stats["requests"] if stats["requests"] else 0.0,
+                }
+            return result
+
+
+class ClerkHTTPClient:
+    """
+    Shared keep-alive session for calls to Clerk.
+
+    Every call has explicit connect/read timeouts, idempotent GETs are retried
+    once on connection errors and 502/503/504, and a circuit breaker stops
+    calling Clerk while it is failing so workers do not stall on it.
+    Responses with a 5xx status count as failures for the breaker.
+    """
+
+    def __init__(self, connect_timeout=2.0, read_timeout=3.0, pool_size=10, retries=1,
+                 breaker=None, metrics=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = metrics or ClientMetrics()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(
+                total=retries,
+                connect=retries,
+                read=retries,
+                status=retries,
+                backoff_factor=0.1,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset(["GET"]),
+                raise_on_status=False,
+            ),
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, endpoint, headers=None):
+        if not self.breaker.allow_request():
+            self.metrics.increment(endpoint, "shortCircuited")
+            raise CircuitOpenError(f"Circuit open for {endpoint}")
+
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except requests.Timeout:
+            self.metrics.record_request(endpoint, (time.perf_counter() - start) * 1000, error=True, timeout=True)
+            self.breaker.record_failure()
+            raise
+        except requests.RequestException:
+            self.metrics.record_request(endpoint, (time.perf_counter() - start) * 1000, error=True)
+            self.breaker.record_failure()
+            raise
+
+        server_error = response.status_code >= 500
+        self.metrics.record_request(endpoint, (time.perf_counter() - start) * 1000, error=server_error)
+        if server_error:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
@@ -0,0 +1,78 @@
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .models import UserAccount
+
+CACHE_KEY_PREFIX = "identity:"
+IDENTITY_TTL = 600
+
+
+class IdentityContext:
+    """
+    The authenticated user's ``UserAccount`` and the profiles they own.
+
+    Built once per user and cached, so views can check profile ownership
+    and read ``isStartup`` without querying ``UserAccount`` or ``Profile``.
+    """
+
+    def __init__(self, user_account, profiles):
+        self.user_account = user_account
+        # profileID -> isStartup
+        self.profiles = profiles
+
+    @property
+    def user_id(self):
+        return self.user_account.userID if self.user_account else None
+
+    @property
+    def profile_ids(self):
+        return set(self.profiles)
+
+    def owns(self, profile_id):
+        try:
+            return int(profile_id) in self.profiles
+        except (TypeError, ValueError):
+            return False
+
+    def is_startup(self, profile_id):
+        return self.profiles.get(int(profile_id))
+
+
+def _cache_key(clerk_user_id):
+    return f"{CACHE_KEY_PREFIX}{clerk_user_id}"
+
+
+def load_identity(clerk_user_id):
+    cached = cache.get(_cache_key(clerk_user_id))
+    if cached is not None:
+        return IdentityContext(*cached)
+
+    from profiles.models import Profile
+
+    user_account = UserAccount.objects.filter(clerkUserID=clerk_user_id).first()
+    if user_account is None:
+        # Not cached: the account is created on the user's first authenticated request
+        return IdentityContext(None, {})
+
+    profiles = dict(
+        Profile.objects.filter(userID=user_account.userID).values_list('profileID', 'isStartup')
+    )
+    cache.set(_cache_key(clerk_user_id), (user_account, profiles), IDENTITY_TTL)
+    return IdentityContext(user_account, profiles)
+
+
+def invalidate_identity(clerk_user_id):
+    cache.delete(_cache_key(clerk_user_id))
+
+
+def attach_identity(request, clerk_user_id):
+    request.identity = SimpleLazyObject(lambda: load_identity(clerk_user_id))
+
+
+def get_identity(request):
+    """Identity attached by the JWT authentication, or loaded for other auth backends."""
+    identity = getattr(request, 'identity', None)
+    if identity is None:
+        identity = load_identity(request.user.username)
+        request.identity = identity
+    return identity
@@ -0,0 +1,112 @@
+import logging
+import threading
+import time
+
+from jwt.algorithms import RSAAlgorithm
+from rest_framework.exceptions import AuthenticationFailed
+
+logger = logging.getLogger(__name__)
+
+
+class JWKSKeyRing:
+    """
+    In-process ring of parsed JWKS public keys indexed by ``kid``.
+
+    Keys are parsed once per refresh instead of once per request. A refresh is
+    started in the background once ``refresh_ahead`` of the TTL has elapsed, so
+    requests keep using the current keys while new ones are fetched. Unknown
+    ``kid`` values trigger a synchronous refetch, rate limited by
+    ``min_refetch_interval`` so random ``kid`` values cannot hammer Clerk.
+    Only one thread fetches at a time; the others wait and reuse its result.
+    """
+
+    def __init__(self, fetch_jwks, ttl=3600, refresh_ahead=0.8, min_refetch_interval=30):
+        self._fetch_jwks = fetch_jwks
+        self._ttl = ttl
+        self._refresh_ahead = refresh_ahead
+        self._min_refetch_interval = min_refetch_interval
+        self._keys = {}
+        self._fetched_at = 0.0
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._background_refresh = None
+
+    def get_key(self, kid):
+        now = time.monotonic()
+        if now >= self._expires_at:
+            self._refresh(self._generation)
+        elif now >= self._refresh_at:
+            self._schedule_background_refresh()
+
+        key = self._lookup(kid)
+        if key is None and time.monotonic() - self._fetched_at >= self._min_refetch_interval:
+            logger.info(f"Unknown JWKS kid {kid!r}, refetching signing keys")
+            self._refresh(self._generation)
+            key = self._lookup(kid)
+
+        if key is None:
+            raise AuthenticationFailed("Unknown token signing key.")
+        return key
+
+    def has_keys(self):
+        return bool(self._keys)
+
+    def _lookup(self, kid):
+        keys = self._keys
+        if kid is None and len(keys) == 1:
+            # Tokens without a kid are only accepted while Clerk publishes a single key
+            return next(iter(keys.values()))
+        return keys.get(kid)
+
+    def _refresh(self, seen_generation):
+        with self._lock:
+            if self._generation != seen_generation:
+                # Another thread refreshed while we were waiting for the lock
+                return
+            try:
+                jwks_data = self._fetch_jwks()
+            except AuthenticationFailed:
+                if not self._keys:
+                    raise
+                logger.warning("JWKS refresh failed, keeping previously loaded keys")
+                retry_at = time.monotonic() + self._min_refetch_interval
+                self._refresh_at = retry_at
+                self._expires_at = max(self._expires_at, retry_at)
+                return
+
+            keys = {}
+            for jwk in jwks_data.get("keys", []):
+                try:
+                    keys[jwk.get("kid")] = RSAAlgorithm.from_jwk(jwk)
+                except Exception as e:
+                    logger.warning(f"Skipping unparsable JWK {jwk.get('kid')!r}: {str(e)}")
+            if not keys:
+                raise AuthenticationFailed("No usable signing keys in JWKS.")
+
+            now = time.monotonic()
+            self._keys = keys
+            self._fetched_at = now
+            self._expires_at = now + self._ttl
+            self._refresh_at = now + self._ttl * self._refresh_ahead
+            self._generation += 1
+
+    def _schedule_background_refresh(self):
+        with self._lock:
+            if self._background_refresh is not None and self._background_refresh.is_alive():
+                return
+            seen_generation = self._generation
+            self._background_refresh = threading.Thread(
+                target=self._run_background_refresh,
+                args=(seen_generation,),
+                name="jwks-refresh",
+                daemon=True,
+            )
+            self._background_refresh.start()
+
+    def _run_background_refresh(self, seen_generation):
+        try:
+            self._refresh(seen_generation)
+        except Exception as e:
+            logger.error(f"Background JWKS refresh failed: {str(e)}")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from accounts.stub_clerk import StubClerkServer
+
+
+class Command(BaseCommand):
+    help = "Run a local stub Clerk server (JWKS + users API) for offline development and tests"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--user', default='user_stub', help='Clerk user ID to register and mint a token for')
+        parser.add_argument('--email', default='stub@example.com')
+        parser.add_argument('--token-lifetime', type=int, default=3600)
+
+    def handle(self, *args, **options):
+        stub = StubClerkServer(port=options['port'])
+        stub.add_user(options['user'], options['email'], 'Stub', 'User')
+        token = stub.issue_token(options['user'], lifetime=options['token_lifetime'])
+
+        self.stdout.write(f"CLERK_FRONTEND_API_URL={stub.url}")
+        self.stdout.write(f"CLERK_API_URL={stub.api_url}")
+        self.stdout.write(f"Bearer token for {options['user']}:\n{token}")
+        try:
+            stub.serve_forever()
+        except KeyboardInterrupt:
+            stub.stop()
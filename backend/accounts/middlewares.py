@@ -1,3 +1,4 @@
+import logging
 from datetime import datetime
 
 import environ
@@ -6,17 +7,41 @@ import pytz
 import requests
 from django.contrib.auth.models import User
 from django.core.cache import cache
-from jwt.algorithms import RSAAlgorithm
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from .services import UserAccountService
+from .clerk_client import CircuitBreaker, CircuitOpenError, ClerkHTTPClient
+from .identity import attach_identity
+from .jwks import JWKSKeyRing
+from .sync import ClerkUserDeleted, ClerkUserSync
+from .token_cache import VerifiedTokenCache
 
 env = environ.Env()
 
-CLERK_API_URL = "https://api.clerk.com/v1"
+CLERK_API_URL = env("CLERK_API_URL", default="https://api.clerk.com/v1")
 CLERK_FRONTEND_API_URL = env("CLERK_FRONTEND_API_URL")
 CLERK_SECRET_KEY = env("CLERK_SECRET_KEY")
 CACHE_KEY = "jwks_data"
+JWKS_TTL = env.int("CLERK_JWKS_TTL", default=3600)
+TOKEN_CACHE_SIZE = env.int("JWT_TOKEN_CACHE_SIZE", default=10000)
+USER_CACHE_TTL = env.int("CLERK_USER_CACHE_TTL", default=900)
+CLERK_WEBHOOK_SECRET = env("CLERK_WEBHOOK_SECRET", default="")
+STALE_JWKS_CACHE_KEY = "jwks_data_stale"
+STALE_USER_CACHE_PREFIX = "clerk_user_stale:"
+# How long the last good Clerk responses are kept to serve while Clerk is down
+STALE_TTL = env.int("CLERK_STALE_TTL", default=7 * 24 * 3600)
+
+logger = logging.getLogger(__name__)
+
+clerk_http_client = ClerkHTTPClient(
+    connect_timeout=env.float("CLERK_HTTP_CONNECT_TIMEOUT", default=2.0),
+    read_timeout=env.float("CLERK_HTTP_READ_TIMEOUT", default=3.0),
+    pool_size=env.int("CLERK_HTTP_POOL_SIZE", default=10),
+    retries=env.int("CLERK_HTTP_RETRIES", default=1),
+    breaker=CircuitBreaker(
+        failure_threshold=env.int("CLERK_BREAKER_FAILURES", default=5),
+        reset_timeout=env.float("CLERK_BREAKER_RESET", default=30.0),
+    ),
+)
 
 
 class JWTAuthenticationMiddleware(BaseAuthentication):
@@ -31,33 +56,25 @@ class JWTAuthenticationMiddleware(BaseAuthentication):
         user = self.decode_jwt(token)
         if not user:
             return None
-            
-        clerk = ClerkSDK()
-        info, found = clerk.fetch_user_info(user.username)
-        
-        if found:
-            user.email = info["email_address"]
-            user.first_name = info["first_name"]
-            user.last_name = info["last_name"]
-            user.last_login = info["last_login"]
-            user.save()
-            
-            user_account, error = UserAccountService.create_or_update_user_account(
-                clerk_user_id=user.username,
-                email=info["email_address"],
-                first_name=info["first_name"],
-                last_name=info["last_name"]
-            )
-            
-            if error:
-                print(f"Error creating UserAccount: {error}")
-            
+
+        try:
+            clerk_user_sync.sync(user)
+        except ClerkUserDeleted:
+            raise AuthenticationFailed("User has been deleted.")
+        attach_identity(request, user.username)
         return user, None
 
     def decode_jwt(self, token):
-        clerk = ClerkSDK()
-        jwks_data = clerk.get_jwks()
-        public_key = RSAAlgorithm.from_jwk(jwks_data["keys"][0])
+        cached = verified_token_cache.get(token)
+        if cached is not None:
+            payload, user = cached
+            return user
+
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.DecodeError:
+            raise AuthenticationFailed("Token decode error.")
+        public_key = jwks_key_ring.get_key(kid)
         try:
             payload = jwt.decode(
                 token,
@@ -75,41 +92,95 @@ class JWTAuthenticationMiddleware(BaseAuthentication):
         user_id = payload.get("sub")
         if user_id:
             user, created = User.objects.get_or_create(username=user_id)
+            verified_token_cache.set(token, payload, user)
             return user
         return None
 
 
 class ClerkSDK:
     def fetch_user_info(self, user_id: str):
-        response = requests.get(
-            f"{CLERK_API_URL}/users/{user_id}",
-            headers={"Authorization": f"Bearer {CLERK_SECRET_KEY}"},
+        stale_key = f"{STALE_USER_CACHE_PREFIX}{user_id}"
+        try:
+            response = clerk_http_client.get(
+                f"{CLERK_API_URL}/users/{user_id}",
+                endpoint="users",
+                headers={"Authorization": f"Bearer {CLERK_SECRET_KEY}"},
+            )
+        except (CircuitOpenError, requests.RequestException) as e:
+            logger.warning(f"Clerk users API unavailable: {str(e)}")
+            response = None
+
+        if response is not None and response.status_code == 200:
+            info = self.parse_user(response.json())
+            cache.set(stale_key, info, STALE_TTL)
+            return info, True
+
+        if response is None or response.status_code >= 500:
+            stale_info = cache.get(stale_key)
+            if stale_info is not None:
+                clerk_http_client.metrics.increment("users", "staleServed")
+                return stale_info, True
+
+        return {
+            "email_address": "",
+            "first_name": "",
+            "last_name": "",
+            "last_login": None,
+        }, False
+
+    @staticmethod
+    def parse_user(data):
+        """Map a Clerk user object (REST response or webhook payload) to our fields."""
+        email_addresses = data.get("email_addresses") or []
+        primary_email = next(
+            (email for email in email_addresses if email.get("id") == data.get("primary_email_address_id")),
+            email_addresses[0] if email_addresses else {},
         )
-        if response.status_code == 200:
-            data = response.json()
-            return {
-                "email_address": data["email_addresses"][0]["email_address"],
-                "first_name": data["first_name"],
-                "last_name": data["last_name"],
-                "last_login": datetime.fromtimestamp(
-                    data["last_sign_in_at"] / 1000, tz=pytz.UTC
-                ),
-            }, True
-        else:
-            return {
-                "email_address": "",
-                "first_name": "",
-                "last_name": "",
-                "last_login": None,
-            }, False
-
-    def get_jwks(self):
-        jwks_data = cache.get(CACHE_KEY)
+        last_sign_in_at = data.get("last_sign_in_at")
+        return {
+            "email_address": primary_email.get("email_address", ""),
+            "first_name": data.get("first_name") or "",
+            "last_name": data.get("last_name") or "",
+            "last_login": datetime.fromtimestamp(
+                last_sign_in_at / 1000, tz=pytz.UTC
+            ) if last_sign_in_at else None,
+        }
+
+    def get_jwks(self, force_refresh=False):
+        jwks_data = None if force_refresh else cache.get(CACHE_KEY)
         if not jwks_data:
-            response = requests.get(f"{CLERK_FRONTEND_API_URL}/.well-known/jwks.json")
-            if response.status_code == 200:
+            try:
+                response = clerk_http_client.get(
+                    f"{CLERK_FRONTEND_API_URL}/.well-known/jwks.json",
+                    endpoint="jwks",
+                )
+            except (CircuitOpenError, requests.RequestException) as e:
+                logger.warning(f"Clerk JWKS endpoint unavailable: {str(e)}")
+                response = None
+
+            if response is not None and response.status_code == 200:
                 jwks_data = response.json()
-                cache.set(CACHE_KEY, jwks_data)
+                cache.set(CACHE_KEY, jwks_data, JWKS_TTL)
+                cache.set(STALE_JWKS_CACHE_KEY, jwks_data, STALE_TTL)
             else:
-                raise AuthenticationFailed("Failed to fetch JWKS.")
-        return jwks_data
\ No newline at end of file
+                jwks_data = cache.get(STALE_JWKS_CACHE_KEY)
+                if not jwks_data:
+                    raise AuthenticationFailed("Failed to fetch JWKS.")
+                clerk_http_client.metrics.increment("jwks", "staleServed")
+        return jwks_data
+
+
+# Shared by every request handled by this process; the shared cache entry above
+# only backs the first load, later refreshes always go to Clerk for new keys.
+jwks_key_ring = JWKSKeyRing(
+    fetch_jwks=lambda: ClerkSDK().get_jwks(force_refresh=jwks_key_ring.has_keys()),
+    ttl=JWKS_TTL,
+)
+
+verified_token_cache = VerifiedTokenCache(maxsize=TOKEN_CACHE_SIZE)
+clerk_user_sync = ClerkUserSync(
+    ClerkSDK,
+    ttl=USER_CACHE_TTL,
+    webhooks_enabled=bool(CLERK_WEBHOOK_SECRET),
+    on_deleted=verified_token_cache.evict_user,
+)
\ No newline at end of file
@@ -14,6 +14,17 @@ class UserAccountService:
                     'lastName': last_name
                 }
             )
+
+            if not created:
+                # Only write back the fields Clerk actually changed
+                changed_fields = []
+                for field, value in (('email', email), ('firstName', first_name), ('lastName', last_name)):
+                    if getattr(user_account, field) != value:
+                        setattr(user_account, field, value)
+                        changed_fields.append(field)
+                if changed_fields:
+                    user_account.save(update_fields=changed_fields)
+
             return user_account, None
             
         except ValidationError as e:
@@ -21,4 +32,4 @@ class UserAccountService:
         except IntegrityError as e:
             return None, f"Database integrity error: {str(e)}"
         except Exception as e:
-            return None, f"Unexpected error: {str(e)}" 
\ No newline at end of file
+            return None, f"Unexpected error: {str(e)}" 
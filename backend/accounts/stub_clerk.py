@@ -0,0 +1,120 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+USER_PATH = re.compile(r"^/v1/users/(?P<user_id>[^/?]+)$")
+
+
+class StubClerkServer:
+    """
+    Minimal local stand-in for Clerk, for tests and offline development.
+
+    Serves ``/.well-known/jwks.json`` and ``/v1/users/<id>`` and can mint
+    session tokens signed with its own key. Point ``CLERK_FRONTEND_API_URL``
+    at :attr:`url` and ``CLERK_API_URL`` at :attr:`api_url` to use it.
+    Set ``delay`` or ``fail`` to simulate a slow or broken Clerk.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, kid="stub-key"):
+        self.kid = kid
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self.users = {}
+        self.requests = []
+        self.delay = 0.0
+        self.fail = False
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return f"{self.url}/v1"
+
+    def jwks(self):
+        jwk = json.loads(RSAAlgorithm.to_jwk(self.private_key.public_key()))
+        jwk.update({"kid": self.kid, "use": "sig", "alg": "RS256"})
+        return {"keys": [jwk]}
+
+    def rotate_key(self, kid):
+        """Sign with a new key published under ``kid``; the old key is no longer served."""
+        self.kid = kid
+        self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    def add_user(self, user_id, email, first_name="", last_name=""):
+        self.users[user_id] = {
+            "id": user_id,
+            "primary_email_address_id": f"email_{user_id}",
+            "email_addresses": [{"id": f"email_{user_id}", "email_address": email}],
+            "first_name": first_name,
+            "last_name": last_name,
+            "last_sign_in_at": int(time.time() * 1000),
+        }
+        return self.users[user_id]
+
+    def issue_token(self, user_id, lifetime=60):
+        now = int(time.time())
+        return jwt.encode(
+            {"sub": user_id, "iat": now, "nbf": now, "exp": now + lifetime},
+            self.private_key,
+            algorithm="RS256",
+            headers={"kid": self.kid},
+        )
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="stub-clerk", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append(self.path)
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if stub.fail:
+                    return self._send(503, {"errors": [{"message": "stub failure"}]})
+
+                if self.path == "/.well-known/jwks.json":
+                    return self._send(200, stub.jwks())
+                match = USER_PATH.match(self.path)
+                if match and match.group("user_id") in stub.users:
+                    return self._send(200, stub.users[match.group("user_id")])
+                return self._send(404, {"errors": [{"message": "not found"}]})
+
+            def _send(self, status_code, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
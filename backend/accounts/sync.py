@@ -0,0 +1,112 @@
+import logging
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from .identity import invalidate_identity
+from .services import UserAccountService
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_PREFIX = "clerk_user:"
+SYNCED_FIELDS = (
+    ("email", "email_address"),
+    ("first_name", "first_name"),
+    ("last_name", "last_name"),
+    ("last_login", "last_login"),
+)
+
+
+class ClerkUserDeleted(Exception):
+    pass
+
+
+class ClerkUserSync:
+    """
+    Keeps the local ``User``/``UserAccount`` rows in step with Clerk.
+
+    User info is cached, so the request path only calls Clerk when a user
+    has no entry. Without the webhook, entries expire after ``ttl`` seconds
+    and are fetched again. With the webhook (``webhooks_enabled``), Clerk
+    pushes every change through :meth:`ingest_event`, so entries do not
+    expire: the request path calls Clerk only for a user it has not seen
+    yet, or whose entry the cache evicted. Database rows are only written
+    when a field changed.
+
+    A ``user.deleted`` event leaves a marker entry, and :meth:`sync` raises
+    :class:`ClerkUserDeleted` for that user from then on. ``on_deleted`` is
+    called with the user ID, e.g. to drop the user's verified tokens.
+    """
+
+    def __init__(self, clerk_factory, ttl=900, not_found_ttl=60, webhooks_enabled=False, on_deleted=None):
+        self._clerk_factory = clerk_factory
+        # Pushed entries are kept until the next event replaces them
+        self._ttl = None if webhooks_enabled else ttl
+        self._not_found_ttl = not_found_ttl
+        self._on_deleted = on_deleted
+
+    @staticmethod
+    def cache_key(clerk_user_id):
+        return f"{CACHE_KEY_PREFIX}{clerk_user_id}"
+
+    def sync(self, user):
+        key = self.cache_key(user.username)
+        info = cache.get(key)
+        if info is not None:
+            if info.get("deleted"):
+                raise ClerkUserDeleted(user.username)
+            return info.get("found", False)
+
+        info, found = self._clerk_factory().fetch_user_info(user.username)
+        if found:
+            self.apply(user, info)
+            cache.set(key, {**info, "found": True}, self._ttl)
+        else:
+            # Remember misses briefly so an unknown user cannot make every request call Clerk
+            cache.set(key, {"found": False}, self._not_found_ttl)
+        return found
+
+    def apply(self, user, info):
+        changed_fields = []
+        for field, info_key in SYNCED_FIELDS:
+            if getattr(user, field) != info[info_key]:
+                setattr(user, field, info[info_key])
+                changed_fields.append(field)
+        if changed_fields:
+            user.save(update_fields=changed_fields)
+
+        user_account, error = UserAccountService.create_or_update_user_account(
+            clerk_user_id=user.username,
+            email=info["email_address"],
+            first_name=info["first_name"],
+            last_name=info["last_name"]
+        )
+        if error:
+            logger.error(f"Error creating UserAccount: {error}")
+        invalidate_identity(user.username)
+        return user_account
+
+    def ingest_event(self, event):
+        """Apply a Clerk ``user.*`` webhook event and refresh the cached entry."""
+        event_type = event.get("type")
+        data = event.get("data") or {}
+        clerk_user_id = data.get("id")
+        if not clerk_user_id:
+            return False
+
+        if event_type == "user.deleted":
+            # No expiry: tokens issued before the delete would authenticate again once it expired
+            cache.set(self.cache_key(clerk_user_id), {"found": False, "deleted": True}, None)
+            invalidate_identity(clerk_user_id)
+            if self._on_deleted is not None:
+                self._on_deleted(clerk_user_id)
+            return True
+
+        if event_type not in ("user.created", "user.updated"):
+            return False
+
+        info = self._clerk_factory().parse_user(data)
+        user, created = User.objects.get_or_create(username=clerk_user_id)
+        self.apply(user, info)
+        cache.set(self.cache_key(clerk_user_id), {**info, "found": True}, self._ttl)
+        return True
@@ -1,3 +1,203 @@
-from django.test import TestCase
+import base64
+import hashlib
+import hmac
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+import jwt
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import jwks, middlewares
+from .middlewares import ClerkSDK
+from .stub_clerk import StubClerkServer
+from .sync import ClerkUserDeleted, ClerkUserSync
+from .token_cache import VerifiedTokenCache
+from .webhooks import WebhookVerificationError, verify_svix_signature
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+WEBHOOK_KEY = b'test webhook key'
+WEBHOOK_SECRET = 'whsec_' + base64.b64encode(WEBHOOK_KEY).decode('ascii')
+
+
+def _signed_headers(body, msg_id='msg_1', timestamp=None, key=WEBHOOK_KEY):
+    timestamp = str(int(time.time()) if timestamp is None else timestamp)
+    signature = base64.b64encode(
+        hmac.new(key, f'{msg_id}.{timestamp}.'.encode('utf-8') + body, hashlib.sha256).digest()
+    ).decode('ascii')
+    return {'svix-id': msg_id, 'svix-timestamp': timestamp, 'svix-signature': f'v1,{signature}'}
+
+
+class WebhookSignatureTests(SimpleTestCase):
+    body = b'{"type": "user.updated"}'
+
+    def test_valid_signature(self):
+        verify_svix_signature(WEBHOOK_SECRET, _signed_headers(self.body), self.body)
+
+    def test_one_of_several_signatures(self):
+        headers = _signed_headers(self.body)
+        headers['svix-signature'] = f"v1,bm9wZQ== {headers['svix-signature']}"
+        verify_svix_signature(WEBHOOK_SECRET, headers, self.body)
+
+    def test_tampered_body(self):
+        with self.assertRaises(WebhookVerificationError):
+            verify_svix_signature(WEBHOOK_SECRET, _signed_headers(self.body), self.body + b' ')
+
+    def test_wrong_key(self):
+        with self.assertRaises(WebhookVerificationError):
+            verify_svix_signature(WEBHOOK_SECRET, _signed_headers(self.body, key=b'other key'), self.body)
+
+    def test_old_timestamp(self):
+        headers = _signed_headers(self.body, timestamp=int(time.time()) - 3600)
+        with self.assertRaises(WebhookVerificationError):
+            verify_svix_signature(WEBHOOK_SECRET, headers, self.body)
+
+    def test_missing_headers(self):
+        headers = _signed_headers(self.body)
+        del headers['svix-signature']
+        with self.assertRaises(WebhookVerificationError):
+            verify_svix_signature(WEBHOOK_SECRET, headers, self.body)
+
+
+class VerifiedTokenCacheTests(SimpleTestCase):
+    def test_evict_user(self):
+        tokens = VerifiedTokenCache()
+        exp = time.time() + 60
+        tokens.set('token-a', {'exp': exp}, User(username='user_a'))
+        tokens.set('token-a2', {'exp': exp}, User(username='user_a'))
+        tokens.set('token-b', {'exp': exp}, User(username='user_b'))
+        self.assertEqual(tokens.evict_user('user_a'), 2)
+        self.assertIsNone(tokens.get('token-a'))
+        self.assertIsNotNone(tokens.get('token-b'))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ClerkUserSyncTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.stub = StubClerkServer().start()
+        self.addCleanup(self.stub.stop)
+        patcher = mock.patch.object(middlewares, 'CLERK_API_URL', self.stub.api_url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.stub.add_user('user_1', 'one@example.com', 'One')
+        # Database writes are not under test here
+        patcher = mock.patch.object(ClerkUserSync, 'apply')
+        self.apply = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _user_requests(self):
+        return [path for path in self.stub.requests if path.startswith('/v1/users/')]
+
+    def test_cached_after_first_fetch(self):
+        sync = ClerkUserSync(ClerkSDK)
+        user = User(username='user_1')
+        self.assertTrue(sync.sync(user))
+        self.assertTrue(sync.sync(user))
+        self.assertEqual(self._user_requests(), ['/v1/users/user_1'])
+        self.assertEqual(self.apply.call_count, 1)
+
+    def test_unknown_user_cached_briefly(self):
+        sync = ClerkUserSync(ClerkSDK)
+        self.assertFalse(sync.sync(User(username='user_2')))
+        self.assertFalse(sync.sync(User(username='user_2')))
+        self.assertEqual(len(self._user_requests()), 1)
+
+    def test_pushed_entries_do_not_expire_with_webhooks(self):
+        sync = ClerkUserSync(ClerkSDK, ttl=0.01, webhooks_enabled=True)
+        with mock.patch('accounts.sync.User.objects.get_or_create', return_value=(User(username='user_1'), False)):
+            self.assertTrue(sync.ingest_event({'type': 'user.updated', 'data': self.stub.users['user_1']}))
+        time.sleep(0.05)
+        self.assertTrue(sync.sync(User(username='user_1')))
+        self.assertEqual(self._user_requests(), [])
+
+    def test_deleted_user_rejected_and_tokens_evicted(self):
+        deleted = []
+        sync = ClerkUserSync(ClerkSDK, on_deleted=deleted.append)
+        user = User(username='user_1')
+        sync.sync(user)
+        self.assertTrue(sync.ingest_event({'type': 'user.deleted', 'data': {'id': 'user_1'}}))
+        self.assertEqual(deleted, ['user_1'])
+        with self.assertRaises(ClerkUserDeleted):
+            sync.sync(user)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class JWKSKeyRingTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.stub = StubClerkServer().start()
+        self.addCleanup(self.stub.stop)
+        patcher = mock.patch.object(middlewares, 'CLERK_FRONTEND_API_URL', self.stub.url)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.now = 1000.0
+
+    def _key_ring(self, clock=True):
+        if clock:
+            patcher = mock.patch.object(jwks, 'time', mock.Mock(monotonic=lambda: self.now))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        key_ring = jwks.JWKSKeyRing(
+            fetch_jwks=lambda: ClerkSDK().get_jwks(force_refresh=key_ring.has_keys()), ttl=3600
+        )
+        return key_ring
+
+    def _jwks_requests(self):
+        return [path for path in self.stub.requests if path == '/.well-known/jwks.json']
+
+    def _verifies(self, key):
+        token = self.stub.issue_token('user_1')
+        return jwt.decode(token, key, algorithms=['RS256'])['sub'] == 'user_1'
+
+    def test_key_by_kid(self):
+        key_ring = self._key_ring()
+        self.assertTrue(self._verifies(key_ring.get_key('stub-key')))
+        self.assertTrue(self._verifies(key_ring.get_key('stub-key')))
+        self.assertEqual(len(self._jwks_requests()), 1)
+
+    def test_rotated_key_fetched_for_new_kid(self):
+        key_ring = self._key_ring()
+        key_ring.get_key('stub-key')
+        self.stub.rotate_key('stub-key-2')
+        self.now += 31
+        self.assertTrue(self._verifies(key_ring.get_key('stub-key-2')))
+        self.assertEqual(len(self._jwks_requests()), 2)
+        with self.assertRaises(AuthenticationFailed):
+            key_ring.get_key('stub-key')
+
+    def test_unknown_kid_refetches_once_per_window(self):
+        key_ring = self._key_ring()
+        key_ring.get_key('stub-key')
+        for _ in range(3):
+            self.now += 31
+            for _ in range(20):
+                with self.assertRaises(AuthenticationFailed):
+                    key_ring.get_key('random-kid')
+                self.now += 0.5
+        # The first load, then one refetch per 30 s window
+        self.assertEqual(len(self._jwks_requests()), 4)
+        self.assertTrue(self._verifies(key_ring.get_key('stub-key')))
+
+    def test_concurrent_cold_start_shares_one_fetch(self):
+        key_ring = self._key_ring(clock=False)
+        self.stub.delay = 0.2
+        keys, errors = [], []
+
+        def get_key():
+            try:
+                keys.append(key_ring.get_key('stub-key'))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=get_key) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(keys), 10)
+        self.assertEqual(len(self._jwks_requests()), 1)
@@ -0,0 +1,73 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of already verified session tokens.
+
+    Entries are keyed by a SHA-256 digest of the raw token (the token itself is
+    never kept) and hold the verified claims and the resolved ``User`` until the
+    token's ``exp``. A hit skips both the RS256 verification and the user lookup.
+    """
+
+    def __init__(self, maxsize=10000):
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token):
+        key = self._digest(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, user, expires_at = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Hand out a copy so callers can mutate the user without racing other requests
+        return claims, copy.copy(user)
+
+    def set(self, token, claims, user):
+        expires_at = claims.get("exp")
+        if not expires_at:
+            return
+        key = self._digest(token)
+        with self._lock:
+            self._entries[key] = (claims, copy.copy(user), expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def evict_user(self, username):
+        """Drop every token resolved to ``username``; returns how many were dropped."""
+        with self._lock:
+            keys = [key for key, (_, user, _) in self._entries.items() if user.username == username]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self._maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+            }
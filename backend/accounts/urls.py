@@ -8,4 +8,6 @@ router.register(r'users', views.UserAccountViewSet, basename='useraccount')
 urlpatterns = [
     path('', include(router.urls)),
     path('me/', views.current_user, name='current-user'),
+    path('webhooks/clerk/', views.clerk_webhook, name='clerk-webhook'),
+    path('diagnostics/', views.auth_diagnostics, name='auth-diagnostics'),
 ] 
\ No newline at end of file
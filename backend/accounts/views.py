@@ -1,9 +1,15 @@
+import json
+import logging
 from django.shortcuts import render
-from rest_framework import viewsets, permissions
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework import viewsets, permissions, status
+from rest_framework.decorators import api_view, permission_classes, authentication_classes
 from rest_framework.response import Response
+from .middlewares import CLERK_WEBHOOK_SECRET, clerk_http_client, clerk_user_sync, verified_token_cache
 from .models import UserAccount
 from .serializers import UserAccountSerializer
+from .webhooks import WebhookVerificationError, verify_svix_signature
+
+logger = logging.getLogger(__name__)
 
 class UserAccountViewSet(viewsets.ModelViewSet):
     queryset = UserAccount.objects.all()
@@ -29,3 +35,47 @@ def current_user(request):
         return Response(serializer.data)
     except UserAccount.DoesNotExist:
         return Response({"error": "User account not found"}, status=404)
+
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def clerk_webhook(request):
+    """
+    Receive Clerk user.created/user.updated/user.deleted events so the
+    authentication path can serve user info without calling Clerk.
+    Disabled unless CLERK_WEBHOOK_SECRET is configured.
+    """
+    if not CLERK_WEBHOOK_SECRET:
+        return Response({"error": "Webhook not configured"}, status=status.HTTP_404_NOT_FOUND)
+
+    body = request.body
+    try:
+        verify_svix_signature(CLERK_WEBHOOK_SECRET, request.headers, body)
+    except WebhookVerificationError as e:
+        logger.warning(f"Rejected Clerk webhook: {str(e)}")
+        return Response({"error": "Invalid signature"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        event = json.loads(body)
+    except json.JSONDecodeError:
+        return Response({"error": "Invalid JSON"}, status=status.HTTP_400_BAD_REQUEST)
+
+    handled = clerk_user_sync.ingest_event(event)
+    return Response({"handled": handled}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def auth_diagnostics(request):
+    """
+    Token cache and Clerk client metrics for this worker process
+    """
+    return Response({
+        "tokenCache": verified_token_cache.stats(),
+        "clerkHttp": {
+            "breakerState": clerk_http_client.breaker.state,
+            "consecutiveFailures": clerk_http_client.breaker.failures,
+            "endpoints": clerk_http_client.metrics.snapshot(),
+        },
+    })
@@ -0,0 +1,40 @@
+import base64
+import hashlib
+import hmac
+import time
+
+SIGNATURE_TOLERANCE = 300
+
+
+class WebhookVerificationError(Exception):
+    pass
+
+
+def verify_svix_signature(secret, headers, body):
+    """
+    Verify a Clerk (Svix) webhook signature.
+
+    The signed content is ``{svix-id}.{svix-timestamp}.{body}`` and the secret is
+    the base64 part of the ``whsec_...`` signing secret from the Clerk dashboard.
+    """
+    msg_id = headers.get("svix-id")
+    timestamp = headers.get("svix-timestamp")
+    signatures = headers.get("svix-signature")
+    if not msg_id or not timestamp or not signatures:
+        raise WebhookVerificationError("Missing signature headers")
+
+    try:
+        if abs(time.time() - int(timestamp)) > SIGNATURE_TOLERANCE:
+            raise WebhookVerificationError("Signature timestamp out of tolerance")
+    except ValueError:
+        raise WebhookVerificationError("Invalid signature timestamp")
+
+    key = base64.b64decode(secret.split("_", 1)[1] if secret.startswith("whsec_") else secret)
+    signed_content = f"{msg_id}.{timestamp}.".encode("utf-8") + body
+    expected = base64.b64encode(hmac.new(key, signed_content, hashlib.sha256).digest()).decode("utf-8")
+
+    for versioned_signature in signatures.split(" "):
+        version, _, signature = versioned_signature.partition(",")
+        if version == "v1" and hmac.compare_digest(signature, expected):
+            return
+    raise WebhookVerificationError("No matching signature")
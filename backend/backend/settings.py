@@ -98,6 +98,23 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Shared by every worker process: identities, discover snapshots, seen bitmaps
+# and the in-memory index version counters are invalidated through it, which
+# Django's default per-process LocMemCache cannot do across workers.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": env("REDIS_URL", default="redis://localhost:6379/0"),
+        "KEY_PREFIX": "foundermatching",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        },
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -149,4 +166,52 @@ REST_FRAMEWORK = {
         "rest_framework.authentication.BasicAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
-}
\ No newline at end of file
+}
+
+# Discover ranking signals, combined as a weighted sum (see discover/scoring.py)
+DISCOVER_SIGNALS = [
+    {"class": "discover.scoring.CounterpartSignal", "weight": 4.0},
+    {"class": "discover.scoring.JobTagSignal", "weight": 3.0},
+    {"class": "discover.scoring.TagOverlapSignal", "weight": 2.0},
+    {"class": "discover.text_relevance.TextRelevanceSignal", "weight": 1.5},
+    {"class": "discover.scoring.SameIndustrySignal", "weight": 1.0},
+    {"class": "discover.scoring.SameCountrySignal", "weight": 0.5},
+    {"class": "discover.collaborative.CollaborativeSignal", "weight": 1.5},
+]
+
+# Implicit ALS factors written by `manage.py train_collaborative`; the
+# collaborative signal scores zero until the file exists
+DISCOVER_ALS_FACTORS_PATH = env("DISCOVER_ALS_FACTORS_PATH", default=str(BASE_DIR / "discover_als_factors.npz"))
+
+# Candidate generators of the discover pipeline (discover/pipeline.py); their
+# candidates are unioned before filtering and reranking. The tag index can be
+# swapped for discover.minhash.retrieve (MinHash/LSH); index retrievers rank
+# everyone when the pool is no larger than their limit.
+DISCOVER_CANDIDATE_GENERATORS = [
+    {"generator": "discover.tag_index.retrieve", "limit": 2000},
+    {"generator": "discover.pipeline.recent_profiles", "limit": 300},
+    {"generator": "discover.pipeline.popular_profiles", "limit": 300},
+]
+
+# Facet-filtered discover ranks every matching profile when at most this many
+# match, instead of filtering the candidate generators' output
+DISCOVER_FACET_RANK_ALL_LIMIT = 5000
+
+# MMR diversity over the top DISCOVER_DIVERSITY_POOL profiles of the discover
+# feed (discover/diversity.py): 1.0 keeps the score order, lower values trade
+# relevance for variety in tags and industry
+DISCOVER_DIVERSITY_LAMBDA = 0.7
+DISCOVER_DIVERSITY_POOL = 300
+
+# Serve discover from the PrecomputedMatches table (`manage.py precompute_matches`)
+# when the viewer has precomputed rows, instead of ranking per request. Once
+# fewer than DISCOVER_PRECOMPUTED_MIN_RESULTS of them are left unhandled, the
+# live ranking is appended to them
+DISCOVER_SERVE_PRECOMPUTED = False
+DISCOVER_PRECOMPUTED_K = 200
+DISCOVER_PRECOMPUTED_MIN_RESULTS = 100
+# Incremental re-scoring after profile edits (discover/incremental.py), run by
+# `manage.py rescore_matches`: queue bound, and how many other profiles' lists
+# one edit may patch
+DISCOVER_RESCORE_QUEUE_SIZE = 1000
+DISCOVER_RESCORE_PATCH_LIMIT = 1000
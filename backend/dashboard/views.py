@@ -8,7 +8,7 @@ from django.utils import timezone
 from datetime import timedelta
 from .models import DashboardView, ViewHistory, ProfilePreviewCard
 from .serializers import DashboardViewSerializer
-from profiles.models import Profile, UserAccount
+from accounts.identity import get_identity
 from django.db import connection
 import logging
 
@@ -24,29 +24,16 @@ class DashboardViewSet(viewsets.ViewSet):
             
             if not profile_id:
                 return Response({"error": "profileID is required"}, status=status.HTTP_400_BAD_REQUEST)
-            try:
-                logger.info(f"Attempting to fetch profile with ID: {profile_id}")
-                
-                try:
-                    user_account = UserAccount.objects.get(clerkUserID=request.user.username)
-                    logger.debug(f"Found UserAccount with ID: {user_account.userID}")
-                except UserAccount.DoesNotExist:
-                    logger.error(f"No UserAccount found for clerk ID: {request.user.username}")
-                    return Response(
-                        {"error": "User account not found"},
-                        status=status.HTTP_404_NOT_FOUND
-                    )
-                
-                profile = Profile.objects.get(profileID=profile_id)
-                if profile.userID.userID != user_account.userID:
-                    return Response({"error": "You don't have access to this profile"}, status=status.HTTP_403_FORBIDDEN)
-                
-            except Profile.DoesNotExist:
-                logger.warning(f"Profile not found for ID: {profile_id}")
-                return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
-            except Exception as e:
-                logger.error(f"Error accessing profile: {str(e)}")
-                return Response({"error": f"Error accessing profile: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            identity = get_identity(request)
+            if identity.user_account is None:
+                logger.error(f"No UserAccount found for clerk ID: {request.user.username}")
+                return Response(
+                    {"error": "User account not found"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            if not identity.owns(profile_id):
+                return Response({"error": "You don't have access to this profile"}, status=status.HTTP_403_FORBIDDEN)
 
             try:
                 # Get view count
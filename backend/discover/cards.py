@@ -0,0 +1,165 @@
+"""
+Swipe card projection for discover.
+
+A card holds the handful of columns the discover deck renders, read with
+``values()`` in a fixed number of queries per page. Privacy settings are
+applied in bulk. Nested sections (experiences, certificates, achievements,
+job positions) are not part of a card; they are loaded per profile through
+``load_sections`` when the user opens one.
+"""
+from collections import defaultdict
+
+from django.db.models import Q
+
+from .models import (
+    Profile, ProfilePrivacySettings, ProfileTagInstances, Matching,
+    Experience, Certificate, Achievement, JobPosition, JobPositionTagInstances
+)
+from .serializers import ExperienceSerializer, CertificateSerializer, AchievementSerializer
+
+CARD_FIELDS = (
+    'profileID', 'isStartup', 'name', 'avatar', 'industry',
+    'country', 'city', 'slogan', 'currentStage',
+)
+
+# Card field -> ProfilePrivacySettings column guarding it
+CARD_PRIVACY_FIELDS = {
+    'industry': 'industryPrivacy',
+    'country': 'countryPrivacy',
+    'city': 'cityPrivacy',
+    'slogan': 'sloganPrivacy',
+}
+
+# Section -> privacy column; None when the section is always visible
+SECTION_PRIVACY_FIELDS = {
+    'experiences': 'experiencePrivacy',
+    'certificates': 'certificatePrivacy',
+    'achievements': 'achievementPrivacy',
+    'jobPositions': None,
+}
+SECTIONS = tuple(SECTION_PRIVACY_FIELDS)
+
+
+def is_visible(privacy_setting, is_connected=False):
+    # Profiles without privacy settings are treated as public, as on creation
+    if privacy_setting in (None, 'public'):
+        return True
+    return privacy_setting == 'connections' and is_connected
+
+
+def load_cards(profile_ids):
+    """
+    Cards for ``profile_ids`` in the given order, in three queries.
+
+    Discover only shows profiles the viewer is not connected to, so fields
+    restricted to connections are hidden as well as private ones.
+    """
+    rows = {
+        row['profileID']: row
+        for row in Profile.objects.filter(profileID__in=profile_ids).values(*CARD_FIELDS)
+    }
+    privacy = {
+        row['profileID']: row
+        for row in ProfilePrivacySettings.objects.filter(
+            profileID__in=profile_ids
+        ).values('profileID', *CARD_PRIVACY_FIELDS.values())
+    }
+    tags = defaultdict(list)
+    for owner_id, value in ProfileTagInstances.objects.filter(
+        profileOwnerID__in=profile_ids
+    ).values_list('profileOwnerID', 'tagID__value'):
+        tags[owner_id].append(value)
+
+    cards = []
+    for profile_id in profile_ids:
+        card = rows.get(profile_id)
+        if card is None:
+            continue
+        settings = privacy.get(profile_id, {})
+        for field, privacy_field in CARD_PRIVACY_FIELDS.items():
+            if not is_visible(settings.get(privacy_field)):
+                card[field] = None
+        card['tags'] = tags[profile_id]
+        cards.append(card)
+    return cards
+
+
+def is_connected(viewer_profile_id, target_profile_id):
+    return Matching.objects.filter(
+        (Q(candidateprofileid=viewer_profile_id) & Q(startupprofileid=target_profile_id)) |
+        (Q(candidateprofileid=target_profile_id) & Q(startupprofileid=viewer_profile_id)),
+        ismatched=True
+    ).exists()
+
+
+def _job_positions(profile_id):
+    jobs = list(JobPosition.objects.filter(profileOwner=profile_id).order_by('jobPositionID').values(
+        'jobPositionID', 'jobTitle', 'isOpening', 'country', 'city', 'startDate', 'description'
+    ))
+    tags = defaultdict(list)
+    for job_id, value in JobPositionTagInstances.objects.filter(
+        jobPositionID__profileOwner=profile_id
+    ).values_list('jobPositionID', 'tagID__value'):
+        tags[job_id].append(value)
+    for job in jobs:
+        job_id = job.pop('jobPositionID')
+        if job['startDate']:
+            job['startDate'] = job['startDate'].strftime('%Y-%m-%d')
+        job['tags'] = tags[job_id]
+    return jobs
+
+
+def load_job_cards(job_position_ids):
+    """
+    Open job positions for ``job_position_ids`` in the given order, each with
+    the card of the startup offering it, in five queries.
+    """
+    jobs = {
+        job['jobPositionID']: job
+        for job in JobPosition.objects.filter(
+            jobPositionID__in=job_position_ids, isOpening=True
+        ).values('jobPositionID', 'profileOwner', 'jobTitle', 'country', 'city', 'startDate', 'description')
+    }
+    tags = defaultdict(list)
+    for job_id, value in JobPositionTagInstances.objects.filter(
+        jobPositionID__in=list(jobs)
+    ).values_list('jobPositionID', 'tagID__value'):
+        tags[job_id].append(value)
+    startups = {card['profileID']: card for card in load_cards(list({job['profileOwner'] for job in jobs.values()}))}
+
+    results = []
+    for job_id in job_position_ids:
+        job = jobs.get(job_id)
+        if job is None:
+            continue
+        if job['startDate']:
+            job['startDate'] = job['startDate'].strftime('%Y-%m-%d')
+        job['tags'] = tags[job_id]
+        job['startup'] = startups.get(job.pop('profileOwner'))
+        results.append(job)
+    return results
+
+
+def load_sections(profile_id, sections, privacy_settings, connected=False):
+    """
+    Nested sections of one profile, one query per requested section that
+    the viewer may see. Hidden sections are returned as None.
+    """
+    loaders = {
+        'experiences': lambda: ExperienceSerializer(
+            Experience.objects.filter(profileOwner=profile_id), many=True
+        ).data,
+        'certificates': lambda: CertificateSerializer(
+            Certificate.objects.filter(profileOwner=profile_id), many=True
+        ).data,
+        'achievements': lambda: AchievementSerializer(
+            Achievement.objects.filter(profileOwner=profile_id), many=True
+        ).data,
+        'jobPositions': lambda: _job_positions(profile_id),
+    }
+    data = {}
+    for section in sections:
+        privacy_field = SECTION_PRIVACY_FIELDS[section]
+        setting = privacy_settings.get(privacy_field) if privacy_field else None
+        data[section] = loaders[section]() if is_visible(setting, connected) else None
+    return data
@@ -0,0 +1,206 @@
+"""
+Collaborative filtering for discover from implicit feedback.
+
+Views, saves, skips and accept/reject decisions are summed into one signed
+weight per (viewer, target) pair. Positive pairs are preferences, negative
+ones are confident non-preferences. ``train_als`` factorizes that matrix
+with implicit alternating least squares (Hu, Koren and Volinsky): every
+profile gets a user vector (how it behaves as a viewer) and an item vector
+(how others respond to it).
+
+``manage.py train_collaborative`` exports the float32 factors to
+``DISCOVER_ALS_FACTORS_PATH``. ``CollaborativeSignal`` scores a viewer
+against every profile with one matrix-vector product, and reloads the file
+when the trainer replaces it.
+"""
+import logging
+import os
+import threading
+
+import numpy as np
+from django.conf import settings
+from scipy import sparse
+
+from revisit.models import SavedProfiles, SkippedProfiles
+from .models import Matching, ProfileViews
+from .scoring import Signal
+
+logger = logging.getLogger(__name__)
+
+# Weight of one interaction; a pair's weights are summed
+INTERACTION_WEIGHTS = {
+    'view': 1.0,
+    'save': 4.0,
+    'accept': 8.0,
+    'skip': -2.0,
+    'reject': -4.0,
+}
+
+
+def factors_path():
+    return getattr(settings, 'DISCOVER_ALS_FACTORS_PATH', None)
+
+
+def load_interactions():
+    """
+    ``(profile_ids, matrix)``: a (viewer x target) CSR matrix of summed
+    interaction weights, rows and columns aligned with ``profile_ids``.
+    """
+    pairs = []
+
+    def add(rows, kind):
+        rows = np.array(list(rows), dtype=np.int64).reshape(-1, 2)
+        pairs.append((rows, np.full(len(rows), INTERACTION_WEIGHTS[kind], dtype=np.float32)))
+
+    add(ProfileViews.objects.values_list('fromProfileID', 'toProfileID'), 'view')
+    add(SavedProfiles.objects.values_list('savedFromProfileID', 'savedToProfileID'), 'save')
+    add(SkippedProfiles.objects.values_list('skippedFromProfileID', 'skippedToProfileID'), 'skip')
+    for status, kind in (('accepted', 'accept'), ('rejected', 'reject')):
+        # Each side's decision is that side's feedback on the other
+        add(Matching.objects.filter(candidatestatus=status).values_list(
+            'candidateprofileid', 'startupprofileid'), kind)
+        add(Matching.objects.filter(startupstatus=status).values_list(
+            'startupprofileid', 'candidateprofileid'), kind)
+
+    ids = np.concatenate([rows for rows, _ in pairs])
+    weights = np.concatenate([weights for _, weights in pairs])
+    profile_ids, positions = np.unique(ids, return_inverse=True)
+    positions = positions.reshape(-1, 2)
+    # The constructor sums duplicate (viewer, target) pairs
+    matrix = sparse.csr_matrix(
+        (weights, (positions[:, 0], positions[:, 1])),
+        shape=(len(profile_ids), len(profile_ids)),
+    )
+    matrix.eliminate_zeros()
+    return profile_ids, matrix
+
+
+def _least_squares(matrix, fixed, regularization):
+    """
+    One ALS half-step: the factors of every row of ``matrix`` given the other
+    side's ``fixed`` factors. ``matrix.data`` holds the signed confidence
+    ``alpha * log(1 + |weight|)``; the sign is the preference.
+    """
+    n_factors = fixed.shape[1]
+    # Rows without interactions only see this term, so solving it once covers them
+    gram = fixed.T @ fixed + regularization * np.eye(n_factors)
+    factors = np.zeros((matrix.shape[0], n_factors), dtype=np.float64)
+    indptr, indices, data = matrix.indptr, matrix.indices, matrix.data
+    for row in np.flatnonzero(np.diff(indptr)):
+        start, end = indptr[row], indptr[row + 1]
+        neighbours = fixed[indices[start:end]]
+        confidence = np.abs(data[start:end])
+        preference = data[start:end] > 0
+        lhs = gram + (neighbours.T * confidence) @ neighbours
+        rhs = neighbours.T @ ((1.0 + confidence) * preference)
+        factors[row] = np.linalg.solve(lhs, rhs)
+    return factors
+
+
+def train_als(matrix, factors=32, regularization=0.1, alpha=5.0, iterations=10, seed=0, callback=None):
+    """
+    Implicit ALS over a (viewer x target) matrix of signed interaction
+    weights. Returns float32 ``(user_factors, item_factors)``; the predicted
+    preference of viewer ``u`` for target ``i`` is their dot product.
+    """
+    matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+    matrix.data = np.sign(matrix.data) * alpha * np.log1p(np.abs(matrix.data))
+    transposed = matrix.T.tocsr()
+
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(0, 0.01, (matrix.shape[0], factors))
+    item_factors = rng.normal(0, 0.01, (matrix.shape[1], factors))
+    for iteration in range(iterations):
+        user_factors = _least_squares(matrix, item_factors, regularization)
+        item_factors = _least_squares(transposed, user_factors, regularization)
+        if callback is not None:
+            callback(iteration)
+    return user_factors.astype(np.float32), item_factors.astype(np.float32)
+
+
+def export_factors(path, profile_ids, user_factors, item_factors):
+    """Write the factors next to ``path`` and move them into place, so readers never see a partial file."""
+    temporary = f"{path}.tmp.npz"
+    np.savez(
+        temporary,
+        profile_ids=np.asarray(profile_ids, dtype=np.int64),
+        user_factors=user_factors,
+        item_factors=item_factors,
+    )
+    os.replace(temporary, path)
+
+
+class CollaborativeFactors:
+    def __init__(self, profile_ids, user_factors, item_factors, mtime=None):
+        self.profile_ids = profile_ids
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.mtime = mtime
+
+    @classmethod
+    def load(cls, path):
+        mtime = os.stat(path).st_mtime
+        with np.load(path) as arrays:
+            return cls(arrays['profile_ids'], arrays['user_factors'], arrays['item_factors'], mtime=mtime)
+
+    def row(self, profile_id):
+        position = int(np.searchsorted(self.profile_ids, int(profile_id)))
+        if position < len(self.profile_ids) and self.profile_ids[position] == int(profile_id):
+            return position
+        return None
+
+
+_factors = None
+_factors_lock = threading.Lock()
+
+
+def get_factors():
+    """This worker's factors, reloaded when the trainer replaced the file; None before the first training."""
+    global _factors
+    path = factors_path()
+    try:
+        mtime = os.stat(path).st_mtime if path else None
+    except FileNotFoundError:
+        mtime = None
+    if mtime is None:
+        return None
+    if _factors is None or _factors.mtime != mtime:
+        with _factors_lock:
+            if _factors is None or _factors.mtime != mtime:
+                try:
+                    _factors = CollaborativeFactors.load(path)
+                except (OSError, KeyError, ValueError) as e:
+                    logger.error(f"Could not load collaborative factors from {path}: {str(e)}")
+                    return _factors
+    return _factors
+
+
+class CollaborativeSignal(Signal):
+    """
+    Predicted preference from implicit feedback, clipped to [0, 1]. Zero for
+    profiles without interactions and before the first training run.
+    """
+
+    name = 'collaborative'
+
+    @staticmethod
+    def _align(features, factors, predicted):
+        result = np.zeros(len(features), dtype=np.float32)
+        rows = features.rows(factors.profile_ids)
+        found = rows >= 0
+        result[rows[found]] = np.clip(predicted[found], 0.0, 1.0)
+        return result
+
+    def score(self, features, viewer_row):
+        factors = get_factors()
+        row = factors.row(features.profile_ids[viewer_row]) if factors is not None else None
+        if row is None:
+            return np.zeros(len(features), dtype=np.float32)
+        return self._align(features, factors, factors.item_factors @ factors.user_factors[row])
+
+    def score_column(self, features, candidate_row):
+        factors = get_factors()
+        row = factors.row(features.profile_ids[candidate_row]) if factors is not None else None
+        if row is None:
+            return np.zeros(len(features), dtype=np.float32)
+        return self._align(features, factors, factors.user_factors @ factors.item_factors[row])
@@ -0,0 +1,170 @@
+"""
+Maximal marginal relevance (MMR) reranking of the top of the discover feed.
+
+Profiles are picked greedily. Each pick maximizes
+``lambda * relevance - (1 - lambda) * similarity to the closest profile
+already picked``. Similarity is the cosine of profile vectors made of the
+profile tags and a one-hot industry. Only the first
+``DISCOVER_DIVERSITY_POOL`` profiles of the ranking are reordered; the rest
+follow in score order.
+
+Picks are made a page at a time. The state (picks so far, and every pool
+profile's similarity to its closest pick) is cached per viewer next to the
+feed snapshot, so the next page continues from it instead of starting over.
+"""
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from scipy import sparse
+
+from .models import Profile
+from .scoring import ProfileFeatures
+
+STATE_TTL = 900
+CACHE_KEY_PREFIX = 'discover:diversity:'
+
+
+def _cache_key(profile_id):
+    return f'{CACHE_KEY_PREFIX}{int(profile_id)}'
+
+
+def _unit_vectors(pool_ids):
+    """L2-normalized (pool x (tags + industries)) CSR rows, aligned with ``pool_ids``."""
+    features = ProfileFeatures.load(Profile.objects.filter(profileID__in=pool_ids.tolist()))
+    # Profiles deleted since the ranking get the empty row appended at the end
+    rows = features.rows(pool_ids)
+    rows = np.where(rows >= 0, rows, len(features))
+    tags = sparse.vstack([
+        features.tags, sparse.csr_matrix((1, features.tags.shape[1]), dtype=np.float32)
+    ]).tocsr()[rows]
+    industry = np.append(features.industry, -1)[rows]
+    has_industry = np.flatnonzero(industry >= 0)
+    industries = sparse.csr_matrix(
+        (np.ones(len(has_industry), dtype=np.float32), (has_industry, industry[has_industry])),
+        shape=(len(pool_ids), int(industry.max(initial=-1)) + 1),
+    )
+
+    vectors = sparse.hstack([tags, industries], format='csr', dtype=np.float32)
+    norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+    inverse = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return (sparse.diags(inverse) @ vectors).astype(np.float32).tocsr()
+
+
+class DiversityState:
+    def __init__(self, pool_ids, relevance, vectors, max_similarity=None, picks=None):
+        self.pool_ids = pool_ids
+        # Pool scores scaled to [0, 1], so lambda weighs comparable quantities
+        self.relevance = relevance
+        self.vectors = vectors
+        self.max_similarity = (
+            np.zeros(len(pool_ids), dtype=np.float32) if max_similarity is None else max_similarity
+        )
+        self.picks = np.zeros(0, dtype=np.int32) if picks is None else picks
+        self._similarity = None
+
+    @classmethod
+    def build(cls, pool_ids, pool_scores):
+        pool_ids = np.asarray(pool_ids, dtype=np.int64)
+        pool_scores = np.asarray(pool_scores, dtype=np.float32)
+        low, high = pool_scores.min(initial=0.0), pool_scores.max(initial=0.0)
+        if high > low:
+            relevance = (pool_scores - low) / (high - low)
+        else:
+            relevance = np.ones(len(pool_scores), dtype=np.float32)
+        return cls(pool_ids, relevance.astype(np.float32), _unit_vectors(pool_ids))
+
+    def extend(self, upto, lam):
+        """Pick until ``upto`` profiles are picked (or the pool is exhausted); returns the number of new picks."""
+        upto = min(upto, len(self.pool_ids))
+        count = upto - len(self.picks)
+        if count <= 0:
+            return 0
+        if self._similarity is None:
+            self._similarity = (self.vectors @ self.vectors.T).toarray()
+        similarity = self._similarity
+        max_similarity = self.max_similarity
+        diversity_weight = np.float32(1.0 - lam)
+
+        gain = np.float32(lam) * self.relevance - diversity_weight * max_similarity
+        gain[self.picks] = -np.inf
+        picks = np.empty(count, dtype=np.int32)
+        for i in range(count):
+            pick = int(np.argmax(gain))
+            picks[i] = pick
+            closer = np.maximum(max_similarity, similarity[pick])
+            # Lower every gain by how much closer its nearest pick just got
+            gain -= diversity_weight * (closer - max_similarity)
+            gain[pick] = -np.inf
+            max_similarity = closer
+        self.max_similarity = max_similarity
+        self.picks = np.concatenate((self.picks, picks))
+        return count
+
+    def served(self, profile_ids, scores):
+        """``(profile_ids, scores)`` in served order: picks, the rest of the pool, then the tail."""
+        pool_size = len(self.pool_ids)
+        rest = np.ones(pool_size, dtype=bool)
+        rest[self.picks] = False
+        order = np.concatenate((self.picks, np.flatnonzero(rest)))
+        return (
+            np.concatenate((self.pool_ids[order], profile_ids[pool_size:])),
+            np.concatenate((scores[:pool_size][order], scores[pool_size:])),
+        )
+
+    def save(self, profile_id):
+        cache.set(_cache_key(profile_id), (
+            self.pool_ids.astype(np.int32).tobytes(),
+            self.relevance.tobytes(),
+            self.max_similarity.astype(np.float32).tobytes(),
+            self.picks.tobytes(),
+            self.vectors.indptr.astype(np.int32).tobytes(),
+            self.vectors.indices.astype(np.int32).tobytes(),
+            self.vectors.data.tobytes(),
+            self.vectors.shape[1],
+        ), STATE_TTL)
+
+    @classmethod
+    def load(cls, profile_id):
+        packed = cache.get(_cache_key(profile_id))
+        if packed is None:
+            return None
+        pool_ids, relevance, max_similarity, picks, indptr, indices, data, n_cols = packed
+        pool_ids = np.frombuffer(pool_ids, dtype=np.int32).astype(np.int64)
+        vectors = sparse.csr_matrix((
+            np.frombuffer(data, dtype=np.float32),
+            np.frombuffer(indices, dtype=np.int32),
+            np.frombuffer(indptr, dtype=np.int32),
+        ), shape=(len(pool_ids), n_cols))
+        return cls(
+            pool_ids,
+            np.frombuffer(relevance, dtype=np.float32),
+            vectors,
+            np.frombuffer(max_similarity, dtype=np.float32).copy(),
+            np.frombuffer(picks, dtype=np.int32).copy(),
+        )
+
+
+def enabled():
+    return getattr(settings, 'DISCOVER_DIVERSITY_LAMBDA', 1.0) < 1.0
+
+
+def diversify(viewer_id, profile_ids, scores, page_start, per_page):
+    """
+    Served order of a ranked feed with MMR picks covering the requested page.
+
+    ``page_start(profile_ids, scores)`` gives the page's position in the
+    served order so far. Returns ``(profile_ids, scores, new_picks)``.
+    """
+    lam = getattr(settings, 'DISCOVER_DIVERSITY_LAMBDA', 1.0)
+    pool_size = getattr(settings, 'DISCOVER_DIVERSITY_POOL', 300)
+    pool_ids = profile_ids[:pool_size]
+
+    state = DiversityState.load(viewer_id)
+    if state is None or not np.array_equal(state.pool_ids, pool_ids):
+        # New or rebuilt snapshot: start over
+        state = DiversityState.build(pool_ids, scores[:pool_size])
+    start = page_start(*state.served(profile_ids, scores))
+    new_picks = state.extend(start + per_page, lam)
+    if new_picks:
+        state.save(viewer_id)
+    return (*state.served(profile_ids, scores), new_picks)
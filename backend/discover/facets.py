@@ -0,0 +1,233 @@
+"""
+Facet filters and facet counts for discover.
+
+``FacetIndex`` holds every profile's facet values as integer codes
+(industry, country, currentStage, isStartup) plus a sparse profile x tag
+matrix. Industry and country are only indexed where they are public, so
+neither a filter nor a count reveals a hidden value. Filtering a candidate
+list is one array lookup per facet.
+
+Counts follow the usual faceting rule: a facet is counted under every
+filter except its own, so the other values of a selected facet stay
+selectable. They are computed in two parts:
+
+- the slice: profiles matching the other filters, counted with
+  ``np.bincount``. This does not depend on the viewer and is cached per
+  (facet, filters) on the index.
+- the correction: the same counts over the viewer's own and already handled
+  profiles (``discover.seen``), subtracted from the slice. The viewer has
+  handled few profiles, so this stays cheap.
+
+Each worker keeps its own index (see ``discover.indexes``) and rebuilds it
+in the background when profiles change, at most once every
+``REBUILD_INTERVAL`` seconds: counts may trail profile edits by that much.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy import sparse
+
+from .cards import is_visible
+from .indexes import VersionedIndex
+from .models import Profile, ProfilePrivacySettings, ProfileTagInstances
+
+VERSION_CACHE_KEY = 'discover:facets:version'
+REBUILD_INTERVAL = 60
+# Values returned per facet, most frequent first; selected values are always included
+MAX_FACET_VALUES = 20
+SLICE_CACHE_SIZE = 256
+
+FACETS = ('industry', 'country', 'currentStage', 'isStartup', 'tag')
+# Profile columns (and privacy columns) whose changes affect the index
+FACET_FIELDS = {'industry', 'country', 'currentStage', 'isStartup', 'industryPrivacy', 'countryPrivacy'}
+# Facet -> ProfilePrivacySettings column guarding it
+FACET_PRIVACY_FIELDS = {
+    'industry': 'industryPrivacy',
+    'country': 'countryPrivacy',
+}
+
+
+class InvalidFacetFilter(ValueError):
+    pass
+
+
+def parse_filters(query_params):
+    """
+    ``{facet: [values]}`` from repeated query parameters, e.g.
+    ``?industry=AI&industry=Health&isStartup=true``. Values of one facet are
+    alternatives; different facets must all match.
+    """
+    filters = {}
+    for facet in FACETS:
+        values = [value for value in query_params.getlist(facet) if value != '']
+        if not values:
+            continue
+        if facet == 'isStartup':
+            try:
+                values = [{'true': True, 'false': False}[value.lower()] for value in values]
+            except KeyError:
+                raise InvalidFacetFilter('isStartup must be true or false')
+        filters[facet] = sorted(set(values), key=str)
+    return filters
+
+
+def filter_key(filters):
+    """Stable string for ``filters``, used to key snapshots and totals."""
+    return json.dumps(filters, sort_keys=True) if filters else ''
+
+
+def _encode(values):
+    """``(codes, labels)``: int32 codes into sorted labels, -1 where the value is missing."""
+    labels = sorted({value for value in values if value is not None}, key=str)
+    positions = {label: code for code, label in enumerate(labels)}
+    codes = np.array([positions.get(value, -1) for value in values], dtype=np.int32)
+    return codes, labels
+
+
+class FacetIndex:
+    def __init__(self, rows, privacy, tags):
+        """
+        ``rows``: ``(profileID, industry, country, currentStage, isStartup)``;
+        ``privacy``: ``{profileID: {privacy column: setting}}``;
+        ``tags``: ``(profileID, tag value)`` pairs.
+        """
+        rows = sorted(rows)
+        self.profile_ids = np.array([row[0] for row in rows], dtype=np.int64)
+
+        self.codes = {}
+        self.labels = {}
+        for column, facet in enumerate(('industry', 'country', 'currentStage', 'isStartup'), start=1):
+            privacy_field = FACET_PRIVACY_FIELDS.get(facet)
+            values = [
+                row[column] if privacy_field is None or is_visible(privacy.get(row[0], {}).get(privacy_field))
+                else None
+                for row in rows
+            ]
+            if facet != 'isStartup':
+                values = [value.strip() if value and value.strip() else None for value in values]
+            self.codes[facet], self.labels[facet] = _encode(values)
+
+        tag_rows = self.rows([owner_id for owner_id, _ in tags])
+        tag_codes, self.labels['tag'] = _encode([value for _, value in tags])
+        keep = tag_rows >= 0
+        # Profiles x tags; (profile, tag) pairs are unique in ProfileTagInstances
+        self.tags = sparse.csr_matrix(
+            (np.ones(int(keep.sum()), dtype=np.float32), (tag_rows[keep], tag_codes[keep])),
+            shape=(len(self.profile_ids), len(self.labels['tag'])),
+        )
+        self._tags_by_column = self.tags.tocsc()
+        self._label_codes = {
+            facet: {label: code for code, label in enumerate(labels)} for facet, labels in self.labels.items()
+        }
+        self._slices = OrderedDict()
+        self._slices_lock = threading.Lock()
+
+    @classmethod
+    def build(cls):
+        rows = list(Profile.objects.values_list('profileID', 'industry', 'country', 'currentStage', 'isStartup'))
+        privacy = {
+            row['profileID']: row
+            for row in ProfilePrivacySettings.objects.values('profileID', *FACET_PRIVACY_FIELDS.values())
+        }
+        tags = list(ProfileTagInstances.objects.values_list('profileOwnerID', 'tagID__value'))
+        return cls(rows, privacy, tags)
+
+    def __len__(self):
+        return len(self.profile_ids)
+
+    def rows(self, profile_ids):
+        """Row of each profile ID, -1 for profiles not in the index."""
+        profile_ids = np.asarray(profile_ids, dtype=np.int64)
+        rows = np.searchsorted(self.profile_ids, profile_ids)
+        rows = np.minimum(rows, max(len(self.profile_ids) - 1, 0))
+        found = (self.profile_ids[rows] == profile_ids) if len(self.profile_ids) else np.zeros(len(rows), bool)
+        return np.where(found, rows, -1)
+
+    def _facet_mask(self, facet, values):
+        """Rows matching any of ``values`` of one facet."""
+        codes = [self._label_codes[facet][value] for value in values if value in self._label_codes[facet]]
+        if facet == 'tag':
+            if not codes:
+                return np.zeros(len(self.profile_ids), dtype=bool)
+            return np.asarray(self._tags_by_column[:, codes].sum(axis=1)).ravel() > 0
+        return np.isin(self.codes[facet], codes)
+
+    def mask(self, filters, skip=None):
+        """Rows matching every filter, except the one on facet ``skip``."""
+        mask = np.ones(len(self.profile_ids), dtype=bool)
+        for facet, values in filters.items():
+            if facet != skip:
+                mask &= self._facet_mask(facet, values)
+        return mask
+
+    def matching_ids(self, filters):
+        return self.profile_ids[self.mask(filters)]
+
+    def contains(self, profile_ids, filters):
+        """Boolean mask over ``profile_ids``: True where the profile matches ``filters``."""
+        rows = self.rows(profile_ids)
+        return (rows >= 0) & self.mask(filters)[np.maximum(rows, 0)]
+
+    def _count(self, facet, row_mask):
+        if facet == 'tag':
+            return np.asarray(self.tags.T @ row_mask.astype(np.float32)).ravel().astype(np.int64)
+        codes = self.codes[facet][row_mask]
+        return np.bincount(codes[codes >= 0], minlength=len(self.labels[facet]))
+
+    def _slice_counts(self, facet, filters):
+        """Counts of ``facet`` over every profile matching the other filters, cached."""
+        key = (facet, filter_key({other: values for other, values in filters.items() if other != facet}))
+        with self._slices_lock:
+            counts = self._slices.get(key)
+            if counts is not None:
+                self._slices.move_to_end(key)
+                return counts
+        counts = self._count(facet, self.mask(filters, skip=facet))
+        with self._slices_lock:
+            self._slices[key] = counts
+            while len(self._slices) > SLICE_CACHE_SIZE:
+                self._slices.popitem(last=False)
+        return counts
+
+    def counts(self, filters, excluded_ids):
+        """
+        ``{facet: [{'value', 'count'}]}`` over the profiles matching the other
+        filters, minus ``excluded_ids``.
+        """
+        excluded_rows = self.rows(excluded_ids)
+        excluded = np.zeros(len(self.profile_ids), dtype=bool)
+        excluded[excluded_rows[excluded_rows >= 0]] = True
+
+        result = {}
+        for facet in FACETS:
+            counts = self._slice_counts(facet, filters)
+            if excluded.any():
+                counts = counts - self._count(facet, excluded & self.mask(filters, skip=facet))
+            selected = {
+                self._label_codes[facet][value] for value in filters.get(facet, ())
+                if value in self._label_codes[facet]
+            }
+            codes = np.flatnonzero(counts > 0)
+            codes = codes[np.lexsort((codes, -counts[codes]))]
+            shown = codes[:MAX_FACET_VALUES].tolist()
+            shown += [code for code in sorted(selected) if code not in shown]
+            result[facet] = [
+                {'value': self.labels[facet][code], 'count': int(counts[code])} for code in shown
+            ]
+        return result
+
+
+# Profile edits come in bursts; a rebuild reads every profile
+_index = VersionedIndex('facets', VERSION_CACHE_KEY, FacetIndex.build, min_age=REBUILD_INTERVAL)
+
+
+def get_facet_index():
+    """This worker's index; see ``discover.indexes``."""
+    return _index.get()
+
+
+def refresh_profile(profile_id):
+    """Signal every worker, this one included, to rebuild once REBUILD_INTERVAL has passed."""
+    _index.bump()
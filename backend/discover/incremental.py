@@ -0,0 +1,180 @@
+"""
+Incremental re-scoring of precomputed discover matches.
+
+When a profile's tags, job positions, text or scored fields change, its ID
+is queued in the ``RescoreQueue`` table (see foundermatchingdb.sql). One
+``manage.py rescore_matches`` process drains it: it re-scores each profile
+against its counterparts, replaces its own top-K list and patches the lists
+of other profiles where its score changed. That costs one ranking and one
+column of the score matrix per profile instead of a full recompute, and
+keeps the feature load off the web workers.
+
+The queue is bounded and holds each profile once. Reading and rewriting the
+other profiles' lists happens under the advisory lock of
+``precomputed.lock_lists``, so no other writer overwrites the patches. The queue's
+size and age are exposed on the discover diagnostics endpoint.
+"""
+import logging
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import PrecomputedMatches
+from .precomputed import default_k, lock_lists, top_k_counterparts, write_matches
+from .scoring import ProfileFeatures, get_engine
+
+logger = logging.getLogger(__name__)
+
+# Profile columns read by the scoring signals
+SCORED_FIELDS = frozenset(('isStartup', 'industry', 'country', 'currentStage'))
+
+
+def _patch_lists(profile_id, viewer_ids, scores, k, patch_limit):
+    """
+    Lists of other profiles after re-scoring ``profile_id``. Returns
+    ``([(viewerID, match IDs, scores)], rerank)``: the lists patched in place,
+    and the viewers whose list must be ranked again.
+
+    Lists that contain the profile are always rewritten; beyond those only the
+    ``patch_limit`` viewers scoring it highest are considered, and only when
+    the new score beats their current k-th entry. A full list where the
+    profile drops below the k-th entry cannot be patched, since the entry that
+    takes its place is not stored.
+    """
+    listing = set(PrecomputedMatches.objects.filter(
+        matchProfileID=profile_id
+    ).values_list('profileID', flat=True))
+
+    best = np.argsort(-scores, kind='stable')[:patch_limit]
+    best = best[scores[best] > 0]
+    listed = np.flatnonzero(np.isin(viewer_ids, list(listing)))
+    contenders = {
+        int(viewer_ids[i]): float(scores[i]) for i in np.union1d(best, listed)
+    }
+    kth_scores = dict(PrecomputedMatches.objects.filter(
+        profileID__in=list(contenders), rank=k - 1
+    ).values_list('profileID', 'score'))
+    rerank = {
+        viewer_id for viewer_id in listing
+        if viewer_id in kth_scores and contenders.get(viewer_id, -1.0) < kth_scores[viewer_id]
+    }
+    contenders = {
+        viewer_id: score for viewer_id, score in contenders.items()
+        if viewer_id not in rerank and (viewer_id in listing or score > kth_scores.get(viewer_id, -1.0))
+    }
+
+    lists = defaultdict(list)
+    for viewer_id, match_id, score in PrecomputedMatches.objects.filter(
+        profileID__in=(listing - rerank) | set(contenders)
+    ).values_list('profileID', 'matchProfileID', 'score'):
+        lists[viewer_id].append((match_id, score))
+
+    patched = []
+    # Only profiles that already have a list; the others are ranked live
+    for viewer_id, entries in lists.items():
+        entries = [entry for entry in entries if entry[0] != profile_id]
+        if viewer_id in contenders:
+            entries.append((profile_id, contenders[viewer_id]))
+        entries.sort(key=lambda entry: (-entry[1], entry[0]))
+        entries = entries[:k]
+        patched.append((
+            viewer_id,
+            [match_id for match_id, _ in entries],
+            [score for _, score in entries],
+        ))
+    return patched, rerank
+
+
+def rescore_profiles(profile_ids, k=None, patch_limit=None, features=None):
+    """Re-score ``profile_ids`` and patch ``PrecomputedMatches``; returns the number of lists written."""
+    k = k or default_k()
+    patch_limit = patch_limit or getattr(settings, 'DISCOVER_RESCORE_PATCH_LIMIT', 1000)
+    features = features or ProfileFeatures.load()
+    engine = get_engine()
+    written = 0
+    for profile_id in profile_ids:
+        row = features.row(profile_id)
+        if row is None:
+            # Deleted; its rows go with the profile (ON DELETE CASCADE)
+            continue
+        computed_at = timezone.now()
+        match_ids, scores = top_k_counterparts(features, engine, row, k)
+
+        counterparts = np.flatnonzero(features.is_startup != features.is_startup[row])
+        column = engine.score_column(features, row)[counterparts]
+        with transaction.atomic():
+            # Lists are read, patched and written back under the lock
+            lock_lists()
+            patched, rerank = _patch_lists(
+                int(profile_id), features.profile_ids[counterparts], column, k, patch_limit
+            )
+            results = [(int(profile_id), match_ids, scores)] + patched
+            for viewer_id in sorted(rerank):
+                viewer_row = features.row(viewer_id)
+                if viewer_row is not None:
+                    results.append((viewer_id, *top_k_counterparts(features, engine, viewer_row, k)))
+            write_matches(results, computed_at)
+        written += len(results)
+    return written
+
+
+def enqueue(profile_id):
+    """
+    Queue a profile for re-scoring when discover serves precomputed matches.
+    Returns False when the queue is full; the nightly recompute picks it up.
+    """
+    if not getattr(settings, 'DISCOVER_SERVE_PRECOMPUTED', False):
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO "RescoreQueue" ("ProfileID")
+            SELECT %s WHERE (SELECT count(*) FROM "RescoreQueue") < %s
+            ON CONFLICT ("ProfileID") DO NOTHING
+            RETURNING "ProfileID"
+        """, [int(profile_id), getattr(settings, 'DISCOVER_RESCORE_QUEUE_SIZE', 1000)])
+        if cursor.fetchone() is not None:
+            return True
+        cursor.execute('SELECT 1 FROM "RescoreQueue" WHERE "ProfileID" = %s', [int(profile_id)])
+        if cursor.fetchone() is not None:
+            # Already queued
+            return True
+    logger.warning(f"Rescore queue full, dropping profile {profile_id}")
+    return False
+
+
+def process_batch(batch_size=20, features=None):
+    """
+    Take up to ``batch_size`` queued profiles, oldest first, and re-score them.
+    Returns ``(profiles, lists written)``. The profiles leave the queue with
+    the transaction, so a failed batch is retried.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                DELETE FROM "RescoreQueue"
+                WHERE "ProfileID" IN (
+                    SELECT "ProfileID" FROM "RescoreQueue"
+                    ORDER BY "QueuedAt", "ProfileID"
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING "ProfileID"
+            """, [batch_size])
+            profile_ids = sorted(profile_id for profile_id, in cursor.fetchall())
+        if not profile_ids:
+            return 0, 0
+        return len(profile_ids), rescore_profiles(profile_ids, features=features)
+
+
+def queue_stats():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT count(*), min("QueuedAt") FROM "RescoreQueue"')
+        pending, oldest = cursor.fetchone()
+    return {
+        'pending': pending,
+        'maxSize': getattr(settings, 'DISCOVER_RESCORE_QUEUE_SIZE', 1000),
+        'oldestQueuedAt': oldest.isoformat() if oldest else None,
+    }
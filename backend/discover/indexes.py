@@ -0,0 +1,113 @@
+"""
+Per-worker in-memory indexes kept current through cache version counters.
+
+The tag index, MinHash index, text corpus, facet index, job index and tag
+autocomplete each live in every worker process. A change bumps the index's
+version counter in the shared cache. A worker whose copy is behind keeps
+serving it while a background thread rebuilds, and swaps the new copy in
+whole; only a worker's first request waits for a build. The worker that
+made a change can also apply it to its own copy in place (``apply``).
+"""
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedIndex:
+    def __init__(self, name, version_key, build, update=None, min_age=0, max_age=None):
+        """
+        ``build()`` loads a new index from the database. ``update(index)``,
+        when given, returns an up to date copy more cheaply; a full build
+        still runs once the index is older than ``max_age`` seconds. A stale
+        index younger than ``min_age`` seconds keeps serving as it is.
+        """
+        self.name = name
+        self.version_key = version_key
+        self._build = build
+        self._update = update
+        self.min_age = min_age
+        self.max_age = max_age
+        self.index = None
+        self.version = None
+        self.built_at = None
+        # Held while the index is swapped or changed in place
+        self._lock = threading.Lock()
+        # Held by the one build running in this process
+        self._build_lock = threading.Lock()
+
+    def current_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            # Not 1: a copy built before the counter was evicted must not match the new one
+            cache.add(self.version_key, time.time_ns(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def bump(self):
+        """Mark every worker's copy stale; returns the new version, None when the counter was lost."""
+        try:
+            return cache.incr(self.version_key)
+        except ValueError:
+            self.current_version()
+            return None
+
+    def _too_old(self, now):
+        return self.max_age is not None and now - self.built_at > self.max_age
+
+    def get(self):
+        """This worker's index; a stale one is served while it is rebuilt in the background."""
+        version = self.current_version()
+        index = self.index
+        if index is None:
+            with self._build_lock:
+                if self.index is None:
+                    self._refresh(version)
+            return self.index
+        now = time.monotonic()
+        if self._too_old(now) or (self.version != version and now - self.built_at >= self.min_age):
+            self._refresh_in_background(version)
+        return index
+
+    def _refresh(self, version):
+        """Bring the index up to ``version``, read before any data is loaded."""
+        if self.index is not None and self._update is not None and not self._too_old(time.monotonic()):
+            index, built_at = self._update(self.index), self.built_at
+        else:
+            index, built_at = self._build(), time.monotonic()
+        with self._lock:
+            self.index, self.version, self.built_at = index, version, built_at
+
+    def _refresh_in_background(self, version):
+        if not self._build_lock.acquire(blocking=False):
+            # A build is already running; the next request checks again
+            return
+
+        def run():
+            try:
+                self._refresh(version)
+            except Exception as e:
+                logger.error(f"Rebuilding the {self.name} index failed: {str(e)}")
+            finally:
+                close_old_connections()
+                self._build_lock.release()
+
+        threading.Thread(target=run, name=f'{self.name}-refresh', daemon=True).start()
+
+    def apply(self, version, change):
+        """
+        Run ``change(index)`` on this worker's copy for a change it just made
+        and bumped to ``version``. Only a copy current up to the previous
+        version is changed; any other is left to the next refresh.
+        """
+        if version is None:
+            return
+        with self._lock:
+            if self.index is None or self.version != version - 1:
+                return
+            change(self.index)
+            self.version = version
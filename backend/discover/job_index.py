@@ -0,0 +1,145 @@
+"""
+In-process index of open job positions for the candidate job feed.
+
+Only positions with ``isOpening=True`` are loaded, so closed roles take no
+memory and no scoring time. Two inverted indexes map a tag ID and a job
+title token to the sorted rows of the positions carrying them. A candidate
+is scored only against the positions sharing at least one tag or title
+token with them:
+
+- tags: share of the position's tags the candidate's profile tags cover
+- experience: share of the title tokens found in the candidate's
+  experience roles
+- country: the position is in the candidate's country
+
+Each worker keeps its own copy and rebuilds it when job positions change
+(see ``refresh_profile`` and ``discover.indexes``).
+"""
+from collections import defaultdict
+
+import numpy as np
+
+from .indexes import VersionedIndex
+from .models import Experience, JobPosition, JobPositionTagInstances, Profile, ProfileTagInstances
+from .text_relevance import tokenize
+
+VERSION_CACHE_KEY = 'discover:job_index:version'
+
+TAG_WEIGHT = 3.0
+EXPERIENCE_WEIGHT = 1.5
+COUNTRY_WEIGHT = 1.0
+
+_EMPTY_ROWS = np.zeros(0, dtype=np.int32)
+
+
+def _normalize(value):
+    return (value or '').strip().lower()
+
+
+def _postings(pairs):
+    """``{key: sorted int32 rows}`` from ``(key, row)`` pairs."""
+    postings = defaultdict(list)
+    for key, row in pairs:
+        postings[key].append(row)
+    return {key: np.unique(np.array(rows, dtype=np.int32)) for key, rows in postings.items()}
+
+
+class JobIndex:
+    def __init__(self, positions, job_tags):
+        """``positions``: ``(jobPositionID, profileOwner, jobTitle, country)`` rows; ``job_tags``: ``(jobPositionID, tagID)``."""
+        positions = sorted(positions)
+        self.job_ids = np.array([row[0] for row in positions], dtype=np.int64)
+        self.owner_ids = np.array([row[1] for row in positions], dtype=np.int64)
+        self.countries = np.array([_normalize(row[3]) for row in positions], dtype=object)
+
+        title_tokens = [set(tokenize(row[2])) for row in positions]
+        self.token_counts = np.array([len(tokens) for tokens in title_tokens], dtype=np.float32)
+        self._token_postings = _postings(
+            (token, row) for row, tokens in enumerate(title_tokens) for token in tokens
+        )
+
+        rows = {job_id: row for row, job_id in enumerate(self.job_ids.tolist())}
+        tag_rows = [(tag_id, rows[job_id]) for job_id, tag_id in job_tags if job_id in rows]
+        self._tag_postings = _postings(tag_rows)
+        self.tag_counts = np.bincount(
+            np.array([row for _, row in tag_rows], dtype=np.int64), minlength=len(self.job_ids)
+        ).astype(np.float32)
+
+    @classmethod
+    def build(cls):
+        positions = list(JobPosition.objects.filter(isOpening=True).values_list(
+            'jobPositionID', 'profileOwner', 'jobTitle', 'country'
+        ))
+        job_tags = list(JobPositionTagInstances.objects.filter(
+            jobPositionID__isOpening=True
+        ).values_list('jobPositionID', 'tagID'))
+        return cls(positions, job_tags)
+
+    def __len__(self):
+        return len(self.job_ids)
+
+    @staticmethod
+    def _shared(postings, keys, n_rows):
+        """Rows reached through ``keys`` and, per row, how many of the keys reached it."""
+        lists = [postings.get(key, _EMPTY_ROWS) for key in keys]
+        if not any(len(rows) for rows in lists):
+            return np.zeros(n_rows, dtype=np.float32)
+        return np.bincount(np.concatenate(lists), minlength=n_rows).astype(np.float32)
+
+    def score(self, tag_ids, role_tokens, country, exclude_owners=()):
+        """
+        ``(job_ids, owner_ids, scores)`` of the positions sharing a tag or a
+        title token with the candidate, best first, then jobPositionID.
+        """
+        n_rows = len(self.job_ids)
+        shared_tags = self._shared(self._tag_postings, tag_ids, n_rows)
+        shared_tokens = self._shared(self._token_postings, role_tokens, n_rows)
+        rows = np.flatnonzero((shared_tags > 0) | (shared_tokens > 0))
+        if len(exclude_owners):
+            rows = rows[~np.isin(self.owner_ids[rows], np.asarray(list(exclude_owners), dtype=np.int64))]
+
+        scores = (
+            TAG_WEIGHT * np.divide(
+                shared_tags[rows], self.tag_counts[rows],
+                out=np.zeros(len(rows), dtype=np.float32), where=self.tag_counts[rows] > 0
+            )
+            + EXPERIENCE_WEIGHT * np.divide(
+                shared_tokens[rows], self.token_counts[rows],
+                out=np.zeros(len(rows), dtype=np.float32), where=self.token_counts[rows] > 0
+            )
+        )
+        if country:
+            scores += COUNTRY_WEIGHT * (self.countries[rows] == country).astype(np.float32)
+        scores = scores.astype(np.float32)
+        job_ids = self.job_ids[rows]
+        order = np.lexsort((job_ids, -scores))
+        return job_ids[order], self.owner_ids[rows][order], scores[order]
+
+
+def candidate_terms(profile_id):
+    """``(tag IDs, experience role tokens, country)`` of a candidate profile."""
+    tag_ids = list(ProfileTagInstances.objects.filter(profileOwnerID=profile_id).values_list('tagID', flat=True))
+    role_tokens = {
+        token
+        for role in Experience.objects.filter(profileOwner=profile_id).values_list('role', flat=True)
+        for token in tokenize(role)
+    }
+    country = Profile.objects.filter(profileID=profile_id).values_list('country', flat=True).first()
+    return tag_ids, role_tokens, _normalize(country)
+
+
+_index = VersionedIndex('job_index', VERSION_CACHE_KEY, JobIndex.build)
+
+
+def get_job_index():
+    """This worker's index; see ``discover.indexes``."""
+    return _index.get()
+
+
+def refresh_profile(profile_id):
+    """
+    Signal every worker, this one included, to rebuild.
+    Positions are replaced wholesale by ProfileSerializer, and only open ones
+    are loaded, so a rebuild is cheaper than tracking row changes.
+    """
+    _index.bump()
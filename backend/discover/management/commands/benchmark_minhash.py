@@ -0,0 +1,91 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from scipy import sparse
+
+from discover.minhash import RECALL_TARGET, MinHashLSH
+
+
+def _random_tag_matrix(n_profiles, n_tags, tags_per_profile, rng):
+    """Tag sets drawn from a Zipf-like popularity curve, like real tag usage."""
+    popularity = 1.0 / np.arange(1, n_tags + 1)
+    popularity /= popularity.sum()
+    sizes = rng.integers(1, 2 * tags_per_profile, n_profiles)
+    rows = np.repeat(np.arange(n_profiles), sizes)
+    cols = rng.choice(n_tags, size=len(rows), p=popularity)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n_profiles, n_tags)
+    )
+    matrix.data[:] = 1.0
+    return matrix
+
+
+def _exact_jaccard(matrix, sizes, row):
+    shared = (matrix @ matrix[row].T).toarray().ravel()
+    union = sizes + sizes[row] - shared
+    jaccard = np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+    jaccard[row] = -1
+    return jaccard
+
+
+def _threshold(jaccard, k):
+    """Similarity of the k-th best profile; ties at the threshold all count as relevant."""
+    return max(np.partition(jaccard, -k)[-k], np.finfo(np.float32).tiny)
+
+
+class Command(BaseCommand):
+    help = "Compare MinHash/LSH retrieval with an exact Jaccard scan on synthetic tag sets (recall@k and latency)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profiles', type=int, default=100000)
+        parser.add_argument('--tags', type=int, default=2000)
+        parser.add_argument('--tags-per-profile', type=int, default=6)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--k', type=int, default=50)
+        parser.add_argument('--num-perm', type=int, default=192)
+        parser.add_argument('--bands', type=int, nargs='+', default=[32, 48, 64, 96])
+        parser.add_argument('--seed', type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        k = options['k']
+        matrix = _random_tag_matrix(options['profiles'], options['tags'], options['tags_per_profile'], rng)
+        sizes = np.diff(matrix.indptr).astype(np.float32)
+        # profileID = row + 1
+        profile_ids = np.arange(1, options['profiles'] + 1, dtype=np.int64)
+        query_rows = rng.choice(options['profiles'], options['queries'], replace=False)
+
+        started = time.perf_counter()
+        exact = [_exact_jaccard(matrix, sizes, row) for row in query_rows]
+        exact_ms = (time.perf_counter() - started) * 1000 / len(query_rows)
+        self.stdout.write(f"exact Jaccard scan: {exact_ms:.2f} ms/query over {options['profiles']} profiles")
+
+        for bands in options['bands']:
+            if options['num_perm'] % bands:
+                continue
+            started = time.perf_counter()
+            index = MinHashLSH(num_perm=options['num_perm'], bands=bands).fit(profile_ids, matrix)
+            index.query(index.signatures[0])
+            build_s = time.perf_counter() - started
+
+            recalls = []
+            candidates = []
+            started = time.perf_counter()
+            results = [index.similar_to(profile_ids[row], limit=k)[0] for row in query_rows]
+            lsh_ms = (time.perf_counter() - started) * 1000 / len(query_rows)
+            for found, jaccard in zip(results, exact):
+                candidates.append(len(found))
+                threshold = _threshold(jaccard, k)
+                relevant = min(int((jaccard >= threshold).sum()), k)
+                if relevant:
+                    hits = int((jaccard[found - 1] >= threshold).sum())
+                    recalls.append(min(hits, relevant) / relevant)
+            recall = np.mean(recalls) if recalls else 0
+            note = '' if recall >= RECALL_TARGET and lsh_ms < exact_ms else \
+                f" (below recall {RECALL_TARGET} or slower than the exact scan)"
+            self.stdout.write(
+                f"LSH num_perm={options['num_perm']} bands={bands}: build {build_s:.2f} s, "
+                f"{lsh_ms:.2f} ms/query, recall@{k} {recall:.3f}, "
+                f"median results {int(np.median(candidates))}{note}"
+            )
@@ -0,0 +1,77 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from discover.precomputed import default_k, top_k_counterparts, write_matches
+from discover.scoring import ProfileFeatures, ScoringEngine
+
+# Per worker process, set by _init_worker
+_features = None
+_engine = None
+
+
+def _init_worker(features):
+    global _features, _engine
+    _features = features
+    _engine = ScoringEngine.from_settings()
+
+
+def _score_shard(viewer_rows, k):
+    """Top-K counterparts for each viewer row: [(profileID, match IDs, scores)]."""
+    return [
+        (int(_features.profile_ids[viewer_row]), *top_k_counterparts(_features, _engine, viewer_row, k))
+        for viewer_row in viewer_rows
+    ]
+
+
+class Command(BaseCommand):
+    help = "Precompute the top-K discover counterparts of every profile into PrecomputedMatches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=default_k())
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--shard-size', type=int, default=500, help='Profiles scored per task')
+        parser.add_argument('--profile', type=int, nargs='*', help='Only recompute these viewer profiles')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        features = ProfileFeatures.load()
+        engine = ScoringEngine.from_settings()
+
+        if options['profile']:
+            viewer_rows = features.rows(options['profile'])
+            viewer_rows = viewer_rows[viewer_rows >= 0]
+        else:
+            viewer_rows = np.arange(len(features))
+        if not len(viewer_rows):
+            self.stdout.write("No profiles to score")
+            return
+
+        # Build lazily loaded signal state (e.g. the text corpus) before forking,
+        # and close connections so workers do not share the parent's sockets
+        engine.score(features, int(viewer_rows[0]))
+        connections.close_all()
+
+        shard_size = max(1, options['shard_size'])
+        shards = [viewer_rows[i:i + shard_size] for i in range(0, len(viewer_rows), shard_size)]
+        computed_at = timezone.now()
+        written = 0
+        with ProcessPoolExecutor(
+            max_workers=max(1, options['workers']),
+            initializer=_init_worker,
+            initargs=(features,)
+        ) as executor:
+            futures = [executor.submit(_score_shard, shard, options['k']) for shard in shards]
+            for done, future in enumerate(as_completed(futures), start=1):
+                written += write_matches(future.result(), computed_at)
+                self.stdout.write(f"shard {done}/{len(shards)}: {written} matches written")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Precomputed top-{options['k']} matches for {len(viewer_rows)} of "
+            f"{len(features)} profiles in {time.perf_counter() - started:.1f} s"
+        ))
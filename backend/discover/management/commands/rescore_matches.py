@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from discover.incremental import process_batch
+
+
+class Command(BaseCommand):
+    help = "Re-score the profiles queued in RescoreQueue and patch their PrecomputedMatches lists"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20, help='Profiles re-scored per transaction')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls of an empty queue')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            try:
+                profiles, written = process_batch(max(1, options['batch_size']))
+            except Exception as e:
+                # The batch stays queued; retry after the interval
+                self.stderr.write(f"Rescoring failed: {str(e)}")
+                profiles = written = 0
+                if options['once']:
+                    raise
+            finally:
+                close_old_connections()
+            if profiles:
+                self.stdout.write(
+                    f"Re-scored {profiles} profiles, {written} lists written "
+                    f"in {time.perf_counter() - started:.1f} s"
+                )
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
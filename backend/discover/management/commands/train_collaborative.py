@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from discover.collaborative import export_factors, factors_path, load_interactions, train_als
+
+
+class Command(BaseCommand):
+    help = "Train implicit ALS factors from views, saves, skips and match decisions for discover"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--factors', type=int, default=32)
+        parser.add_argument('--regularization', type=float, default=0.1)
+        parser.add_argument('--alpha', type=float, default=5.0, help='Confidence scale of interaction weights')
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--output', default=None, help='Defaults to DISCOVER_ALS_FACTORS_PATH')
+
+    def handle(self, *args, **options):
+        output = options['output'] or factors_path()
+        if not output:
+            raise CommandError("Set DISCOVER_ALS_FACTORS_PATH or pass --output")
+
+        started = time.perf_counter()
+        profile_ids, matrix = load_interactions()
+        self.stdout.write(
+            f"Loaded {matrix.nnz} interacting pairs between {len(profile_ids)} profiles "
+            f"in {time.perf_counter() - started:.1f} s"
+        )
+        if not matrix.nnz:
+            self.stdout.write("No interactions to train on")
+            return
+
+        def progress(iteration):
+            self.stdout.write(f"iteration {iteration + 1}/{options['iterations']}: {time.perf_counter() - started:.1f} s")
+
+        user_factors, item_factors = train_als(
+            matrix,
+            factors=options['factors'],
+            regularization=options['regularization'],
+            alpha=options['alpha'],
+            iterations=options['iterations'],
+            callback=progress,
+        )
+        export_factors(output, profile_ids, user_factors, item_factors)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {options['factors']} factors for {len(profile_ids)} profiles to {output} "
+            f"in {time.perf_counter() - started:.1f} s"
+        ))
@@ -0,0 +1,199 @@
+"""
+MinHash signatures and LSH banding over profile tag sets.
+
+Each profile's tags (profile tags and open job position tags, as in
+``discover.tag_index``) are reduced to ``num_perm`` uint32 MinHash values; the share of equal values between two signatures
+estimates the Jaccard similarity of the tag sets. Signatures are cut into
+``bands`` bands of ``num_perm / bands`` rows and every band is hashed into a
+bucket, so a lookup reads a handful of buckets instead of every profile.
+Pairs with Jaccard similarity ``s`` collide in at least one band with
+probability ``1 - (1 - s ** rows) ** bands``.
+
+``python manage.py benchmark_minhash`` compares recall and latency with an
+exact Jaccard scan. The defaults (192 permutations, 64 bands of 3 rows) are
+the smallest that reach ``RECALL_TARGET`` on its synthetic 100k profiles
+while answering faster than the exact scan; 128 permutations in 32 bands of
+4 rows stayed near 0.5.
+"""
+import threading
+
+import numpy as np
+from scipy import sparse
+
+from .indexes import VersionedIndex
+from .tag_index import load_tags
+
+VERSION_CACHE_KEY = 'discover:minhash:version'
+
+# recall@50 against exact Jaccard that benchmark_minhash checks the defaults for
+RECALL_TARGET = 0.8
+
+_PRIME = np.uint64((1 << 31) - 1)
+_MAX_HASH = np.uint32(np.iinfo(np.uint32).max)
+
+
+class MinHashLSH:
+    def __init__(self, num_perm=192, bands=64, seed=1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, int(_PRIME), num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, int(_PRIME), num_perm, dtype=np.uint64)
+        self._band_mix = rng.integers(1, np.iinfo(np.int64).max, self.rows, dtype=np.uint64) | np.uint64(1)
+
+        self.profile_ids = np.zeros(0, dtype=np.int64)
+        # (profiles x num_perm) uint32; rows of profiles without tags stay at the max value
+        self.signatures = np.zeros((0, num_perm), dtype=np.uint32)
+        self._buckets = None
+        self._lock = threading.Lock()
+
+    def _hash(self, tag_ids):
+        """(num_perm x len(tag_ids)) universal hashes of ``tag_ids``."""
+        tag_ids = np.asarray(tag_ids, dtype=np.uint64)
+        return ((self._a[:, None] * tag_ids[None, :] + self._b[:, None]) % _PRIME).astype(np.uint32)
+
+    def signature(self, tag_ids):
+        if not len(tag_ids):
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint32)
+        return self._hash(np.unique(tag_ids)).min(axis=1)
+
+    def fit(self, profile_ids, tag_matrix):
+        """Signatures for all rows of a (profiles x tag ID) binary CSR matrix."""
+        tag_matrix = sparse.csr_matrix(tag_matrix)
+        signatures = np.full((len(profile_ids), self.num_perm), _MAX_HASH, dtype=np.uint32)
+        non_empty = np.flatnonzero(np.diff(tag_matrix.indptr))
+        if len(non_empty):
+            tag_ids, columns = np.unique(tag_matrix.indices, return_inverse=True)
+            hashed_tags = self._hash(tag_ids)
+            starts = tag_matrix.indptr[non_empty]
+            # One permutation at a time keeps memory at one value per tag instance
+            for permutation in range(self.num_perm):
+                signatures[non_empty, permutation] = np.minimum.reduceat(
+                    hashed_tags[permutation, columns], starts
+                )
+        with self._lock:
+            self.profile_ids = np.asarray(profile_ids, dtype=np.int64)
+            self.signatures = signatures
+            self._buckets = None
+        return self
+
+    @classmethod
+    def build(cls, **kwargs):
+        pairs = np.array(
+            [(profile_id, tag_id) for profile_id, tag_ids in load_tags().items() for tag_id in tag_ids],
+            dtype=np.int64
+        ).reshape(-1, 2)
+        profile_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+        n_cols = int(pairs[:, 1].max(initial=0)) + 1
+        tag_matrix = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.float32), (rows, pairs[:, 1])),
+            shape=(len(profile_ids), n_cols),
+        )
+        return cls(**kwargs).fit(profile_ids, tag_matrix)
+
+    def __len__(self):
+        return len(self.profile_ids)
+
+    def update(self, profile_id, tag_ids):
+        """Set one profile's signature; buckets are rebuilt on the next query."""
+        profile_id = int(profile_id)
+        signature = self.signature(tag_ids)
+        with self._lock:
+            position = int(np.searchsorted(self.profile_ids, profile_id))
+            if position < len(self.profile_ids) and self.profile_ids[position] == profile_id:
+                self.signatures[position] = signature
+            else:
+                self.profile_ids = np.insert(self.profile_ids, position, profile_id)
+                self.signatures = np.insert(self.signatures, position, signature, axis=0)
+            self._buckets = None
+
+    def _band_keys(self, signatures):
+        """(len(signatures) x bands) uint64 bucket keys."""
+        banded = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        return (banded * self._band_mix).sum(axis=2)
+
+    def _get_buckets(self):
+        buckets = self._buckets
+        if buckets is not None:
+            return buckets
+        with self._lock:
+            if self._buckets is None:
+                keys = self._band_keys(self.signatures)
+                # Profiles without tags would all share one bucket; leave them out
+                has_tags = self.signatures[:, 0] != _MAX_HASH
+                rows = np.flatnonzero(has_tags)
+                buckets = []
+                for band in range(self.bands):
+                    order = np.argsort(keys[rows, band], kind='stable')
+                    buckets.append((keys[rows, band][order], rows[order]))
+                self._buckets = buckets
+            return self._buckets
+
+    def _row(self, profile_id):
+        position = int(np.searchsorted(self.profile_ids, int(profile_id)))
+        if position < len(self.profile_ids) and self.profile_ids[position] == int(profile_id):
+            return position
+        return None
+
+    def query(self, signature, limit=None, exclude=()):
+        """
+        ``(profile_ids, estimated_jaccard)`` of the profiles sharing a bucket
+        with ``signature``, most similar first.
+        """
+        if signature[0] == _MAX_HASH:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        buckets = self._get_buckets()
+        query_keys = self._band_keys(signature[None, :])[0]
+        matches = []
+        for band, (keys, rows) in enumerate(buckets):
+            start, end = np.searchsorted(keys, query_keys[band], side='left'), \
+                np.searchsorted(keys, query_keys[band], side='right')
+            matches.append(rows[start:end])
+        rows = np.unique(np.concatenate(matches))
+        profile_ids = self.profile_ids[rows]
+        if len(exclude):
+            keep = ~np.isin(profile_ids, np.asarray(list(exclude), dtype=np.int64))
+            rows, profile_ids = rows[keep], profile_ids[keep]
+        similarity = (self.signatures[rows] == signature).mean(axis=1).astype(np.float32)
+        if limit is not None and len(rows) > limit:
+            top = np.argpartition(-similarity, limit - 1)[:limit]
+            profile_ids, similarity = profile_ids[top], similarity[top]
+        order = np.lexsort((profile_ids, -similarity))
+        return profile_ids[order], similarity[order]
+
+    def similar_to(self, profile_id, limit=None, exclude=()):
+        row = self._row(profile_id)
+        if row is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return self.query(self.signatures[row], limit=limit, exclude=set(exclude) | {int(profile_id)})
+
+
+def _update_signature(index, profile_id):
+    index.update(profile_id, list(load_tags(profile_id).get(int(profile_id), ())))
+
+
+_index = VersionedIndex('minhash', VERSION_CACHE_KEY, MinHashLSH.build)
+
+
+def get_minhash_index():
+    """This worker's index; see ``discover.indexes``."""
+    return _index.get()
+
+
+def refresh_profile(profile_id):
+    """Recompute one profile's signature in this worker's index and signal the other workers."""
+    _index.apply(_index.bump(), lambda index: _update_signature(index, profile_id))
+
+
+def retrieve(profile_id, limit, exclude=()):
+    """
+    Discover retriever: profiles whose tag sets are likely similar to the
+    viewer's, or None when the index is small enough to rank everyone.
+    """
+    index = get_minhash_index()
+    if len(index) <= limit:
+        return None
+    return index.similar_to(profile_id, limit=limit, exclude=exclude)[0]
@@ -368,6 +368,7 @@ class Matching(models.Model):
     class Meta:
         managed = False
         db_table = 'Matching'
+        unique_together = (('candidateprofileid', 'startupprofileid'),)
 
 class ProfileViews(models.Model):
     viewID = models.AutoField(db_column='ViewID', primary_key=True)
@@ -378,3 +379,27 @@ class ProfileViews(models.Model):
     class Meta:
         managed = False
         db_table = 'ProfileViews'
+
+class PrecomputedMatches(models.Model):
+    """Top-K counterparts per profile, best first; filled by `manage.py precompute_matches`."""
+    profileID = models.ForeignKey(
+        Profile,
+        models.DO_NOTHING,
+        db_column='ProfileID',
+        primary_key=True,
+        related_name='precomputed_matches'
+    )
+    rank = models.SmallIntegerField(db_column='Rank')
+    matchProfileID = models.ForeignKey(
+        Profile,
+        models.DO_NOTHING,
+        db_column='MatchProfileID',
+        related_name='precomputed_match_of'
+    )
+    score = models.FloatField(db_column='Score')
+    computedAt = models.DateTimeField(db_column='ComputedAt')
+
+    class Meta:
+        managed = False
+        db_table = 'PrecomputedMatches'
+        unique_together = (('profileID', 'rank'),)
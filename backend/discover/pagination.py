@@ -0,0 +1,70 @@
+import base64
+import binascii
+import struct
+
+import numpy as np
+from django.core.cache import cache
+
+# float32 score + int32 profileID, big-endian
+_CURSOR_FORMAT = '>fi'
+TOTAL_ESTIMATE_TTL = 300
+MAX_PER_PAGE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(score, profile_id):
+    packed = struct.pack(_CURSOR_FORMAT, float(score), int(profile_id))
+    return base64.urlsafe_b64encode(packed).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        score, profile_id = struct.unpack(_CURSOR_FORMAT, base64.urlsafe_b64decode(padded))
+    except (binascii.Error, struct.error, ValueError):
+        raise InvalidCursor('Invalid cursor')
+    return np.float32(score), profile_id
+
+
+def seek(profile_ids, scores, cursor):
+    """
+    Index of the first entry after ``cursor`` in a list ranked by score
+    descending, then profileID ascending. Rows added or removed since the
+    previous page do not shift later pages like an OFFSET would.
+    """
+    if not cursor:
+        return 0
+    score, profile_id = decode_cursor(cursor)
+    # Diversified feeds are not sorted by score; resume after the cursor's entry while it is there
+    position = np.flatnonzero(profile_ids == profile_id)
+    if len(position):
+        return int(position[0]) + 1
+    after = (scores < score) | ((scores == score) & (profile_ids > profile_id))
+    return int(np.argmax(after)) if after.any() else len(profile_ids)
+
+
+def cursor_page(profile_ids, scores, cursor, per_page):
+    """Return ``(page_ids, next_cursor)`` for a keyset page of the ranked list."""
+    start = seek(profile_ids, scores, cursor)
+    end = start + per_page
+    page_ids = profile_ids[start:end]
+    next_cursor = None
+    if end < len(profile_ids) and len(page_ids):
+        next_cursor = encode_cursor(scores[end - 1], profile_ids[end - 1])
+    return page_ids.tolist(), next_cursor
+
+
+def estimated_total(profile_id, count, variant=''):
+    """
+    Approximate number of discoverable profiles for ``profile_id``.
+    Served from the cache when present, otherwise ``count()`` is stored.
+    """
+    key = f'discover:total:{profile_id}:{variant}'
+    total = cache.get(key)
+    if total is None:
+        total = count()
+        cache.set(key, total, TOTAL_ESTIMATE_TTL)
+    return total
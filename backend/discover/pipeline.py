@@ -0,0 +1,324 @@
+"""
+Discover as an explicit pipeline.
+
+1. Candidate generators (``DISCOVER_CANDIDATE_GENERATORS``: tag index,
+   recency, popularity) each propose up to ``limit`` profile IDs.
+2. The filter drops the viewer's own profiles and the profiles they already
+   accepted, rejected, skipped or saved, and the profiles not matching the
+   facet filters (``discover.facets``). The viewer's seen bitmap
+   (``discover.seen``) drops most handled profiles in memory; the survivors
+   are then checked by the anti-joins of ``discover.queries``, which decide.
+   When few profiles match the filters, they replace the generators'
+   candidates.
+3. The reranker scores the survivors with the ``DISCOVER_SIGNALS`` engine.
+   The top of the ranking is then diversified per page (``discover.diversity``).
+4. The hydrator loads cards or full profiles for one page.
+
+Every stage records its wall time and candidate counts in
+``PipelineTimings``. The view sends them as a ``Server-Timing`` header, and
+per-process totals are served by the discover diagnostics endpoint.
+Generators are plain functions ``(profile_id, limit, exclude)`` returning
+an array of profile IDs, or None for "the pool is small, rank everyone".
+So a cheaper stage can be swapped in through settings.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Prefetch, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import diversity, facets, seen
+from .cards import load_cards
+from .models import Profile, ProfileTagInstances, ProfileViews
+from .precomputed import precomputed_ranking
+from .queries import discoverable_profiles
+from .scoring import ProfileFeatures, get_engine
+from .serializers import ProfileSerializer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GENERATORS = [
+    {'generator': 'discover.tag_index.retrieve', 'limit': 2000},
+    {'generator': 'discover.pipeline.recent_profiles', 'limit': 300},
+    {'generator': 'discover.pipeline.popular_profiles', 'limit': 300},
+]
+
+POPULAR_CACHE_KEY = 'discover:popular'
+RECENT_CACHE_KEY = 'discover:recent'
+# Shared by every viewer, so a short TTL is enough to keep them off the hot path
+GENERATOR_CACHE_TTL = 300
+POPULAR_WINDOW_DAYS = 30
+
+
+class StageStats:
+    """Per-process call count, wall time and candidate counts of each stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def record(self, name, duration_ms, counts):
+        with self._lock:
+            stats = self._stages.get(name)
+            if stats is None:
+                stats = self._stages[name] = {'calls': 0, 'totalMs': 0.0, 'maxMs': 0.0, 'counts': {}}
+            stats['calls'] += 1
+            stats['totalMs'] += duration_ms
+            stats['maxMs'] = max(stats['maxMs'], duration_ms)
+            for key, value in counts.items():
+                total, calls = stats['counts'].get(key, (0, 0))
+                stats['counts'][key] = (total + value, calls + 1)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    'calls': stats['calls'],
+                    'avgMs': round(stats['totalMs'] / stats['calls'], 2),
+                    'maxMs': round(stats['maxMs'], 2),
+                    # Averaged over the calls that reported the count
+                    'avgCounts': {
+                        key: round(total / calls, 1) for key, (total, calls) in stats['counts'].items()
+                    },
+                }
+                for name, stats in self._stages.items()
+            }
+
+
+stage_stats = StageStats()
+
+
+class PipelineTimings:
+    """Wall time and candidate counts of the stages run for one request."""
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block; counts put in the yielded dict are recorded with it."""
+        counts = {}
+        started = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            duration_ms = (time.perf_counter() - started) * 1000
+            self.stages.append({'stage': name, 'durationMs': round(duration_ms, 2), **counts})
+            stage_stats.record(name, duration_ms, counts)
+
+    def server_timing(self):
+        """``Server-Timing`` header value, counts in the description."""
+        entries = []
+        for stage in self.stages:
+            counts = ' '.join(
+                f"{key}={value}" for key, value in stage.items() if key not in ('stage', 'durationMs')
+            )
+            entry = f"{stage['stage']};dur={stage['durationMs']}"
+            if counts:
+                entry += f';desc="{counts}"'
+            entries.append(entry)
+        return ', '.join(entries)
+
+
+def recent_profiles(profile_id, limit, exclude=()):
+    """Generator: the newest profiles (highest profileID)."""
+    recent = cache.get(RECENT_CACHE_KEY)
+    if recent is None or len(recent) < limit:
+        recent = np.array(
+            Profile.objects.order_by('-profileID').values_list('profileID', flat=True)[:limit],
+            dtype=np.int64
+        )
+        cache.set(RECENT_CACHE_KEY, recent, GENERATOR_CACHE_TTL)
+    return _without(recent[:limit], exclude)
+
+
+def popular_profiles(profile_id, limit, exclude=()):
+    """Generator: the profiles viewed most over the last POPULAR_WINDOW_DAYS days."""
+    popular = cache.get(POPULAR_CACHE_KEY)
+    if popular is None or len(popular) < limit:
+        since = timezone.now() - timedelta(days=POPULAR_WINDOW_DAYS)
+        popular = np.array(
+            ProfileViews.objects.filter(viewedAt__gte=since).values('toProfileID').annotate(
+                views=Count('viewID')
+            ).order_by('-views', 'toProfileID').values_list('toProfileID', flat=True)[:limit],
+            dtype=np.int64
+        )
+        cache.set(POPULAR_CACHE_KEY, popular, GENERATOR_CACHE_TTL)
+    return _without(popular[:limit], exclude)
+
+
+def _without(profile_ids, exclude):
+    if not len(exclude):
+        return profile_ids
+    return profile_ids[~np.isin(profile_ids, np.asarray(list(exclude), dtype=np.int64))]
+
+
+class DiscoverPipeline:
+    def __init__(self, profile_id, user_id, exclude=(), timings=None, facet_filters=None):
+        self.profile_id = int(profile_id)
+        self.user_id = user_id
+        self.exclude = exclude
+        self.timings = timings or PipelineTimings()
+        self.facet_filters = facet_filters or {}
+        self._facet_index = None
+
+    @property
+    def facet_index(self):
+        if self._facet_index is None:
+            self._facet_index = facets.get_facet_index()
+        return self._facet_index
+
+    def generate(self):
+        """Union of the generators' candidates, or None when any generator asks to rank everyone."""
+        if self.facet_filters:
+            matching = self.facet_index.matching_ids(self.facet_filters)
+            # Rank every match when there are few, so rare facet values are not left to the generators
+            if len(matching) <= getattr(settings, 'DISCOVER_FACET_RANK_ALL_LIMIT', 5000):
+                return _without(matching, self.exclude)
+        generated = []
+        for config in getattr(settings, 'DISCOVER_CANDIDATE_GENERATORS', DEFAULT_GENERATORS):
+            generator = import_string(config['generator'])
+            candidate_ids = generator(self.profile_id, limit=config['limit'], exclude=self.exclude)
+            if candidate_ids is None:
+                return None
+            generated.append(candidate_ids)
+        if not generated:
+            return None
+        return np.unique(np.concatenate(generated))
+
+    def _unhandled(self, profile_ids):
+        """Mask over ``profile_ids``: False for own and already handled profiles, and for facet misses."""
+        # Pre-filter in memory, so the anti-joins only see the few candidates left
+        keep = ~seen.get_seen(self.profile_id).contains(profile_ids)
+        if self.exclude:
+            keep &= ~np.isin(profile_ids, np.fromiter(self.exclude, dtype=np.int64, count=len(self.exclude)))
+        if self.facet_filters:
+            keep &= self.facet_index.contains(profile_ids, self.facet_filters)
+        if keep.any():
+            discoverable = discoverable_profiles(self.profile_id, self.user_id).filter(
+                profileID__in=profile_ids[keep].tolist()
+            ).values_list('profileID', flat=True)
+            keep &= np.isin(profile_ids, np.fromiter(discoverable, dtype=np.int64))
+        return keep
+
+    def filter(self, candidate_ids):
+        """Profile IDs among ``candidate_ids`` (all profiles when None) the viewer can still discover."""
+        if candidate_ids is None:
+            candidate_ids = np.fromiter(
+                discoverable_profiles(self.profile_id, self.user_id).values_list('profileID', flat=True),
+                dtype=np.int64
+            )
+            if self.facet_filters:
+                candidate_ids = candidate_ids[self.facet_index.contains(candidate_ids, self.facet_filters)]
+            return _without(candidate_ids, self.exclude)
+        return candidate_ids[self._unhandled(candidate_ids)]
+
+    def rerank(self, survivor_ids):
+        """``(profile_ids, scores)`` of ``survivor_ids``, best first."""
+        features = ProfileFeatures.load(
+            Profile.objects.filter(Q(profileID=self.profile_id) | Q(profileID__in=survivor_ids.tolist()))
+        )
+        viewer_row = features.row(self.profile_id)
+        candidate_rows = np.flatnonzero(features.profile_ids != self.profile_id)
+        return get_engine().rank(features, viewer_row, candidate_rows)
+
+    def ranking(self):
+        """Run the ranking stages: ``(profile_ids, scores)`` of the whole feed."""
+        precomputed = None
+        # Precomputed lists hold the unfiltered top K only, too few to filter by facet
+        if getattr(settings, 'DISCOVER_SERVE_PRECOMPUTED', False) and not self.facet_filters:
+            with self.timings.stage('precomputed') as counts:
+                # Nightly top-K from `manage.py precompute_matches`, minus profiles handled since
+                precomputed = precomputed_ranking(self.profile_id)
+                counts['hit'] = int(precomputed is not None)
+                if precomputed is not None:
+                    keep = self._unhandled(precomputed[0])
+                    precomputed = precomputed[0][keep], precomputed[1][keep]
+                    counts['out'] = len(precomputed[0])
+            # Once the viewer has handled most of the list, the live ranking continues the feed;
+            # it also brings in profiles created since the precomputation
+            if precomputed is not None and len(precomputed[0]) >= getattr(
+                settings, 'DISCOVER_PRECOMPUTED_MIN_RESULTS', 100
+            ):
+                return precomputed
+
+        live_ids, live_scores = self.live_ranking()
+        if precomputed is None:
+            return live_ids, live_scores
+        keep = ~np.isin(live_ids, precomputed[0])
+        return (
+            np.concatenate((precomputed[0], live_ids[keep])),
+            np.concatenate((precomputed[1], live_scores[keep])),
+        )
+
+    def live_ranking(self):
+        """Generate, filter and rerank: ``(profile_ids, scores)`` ranked for this request."""
+        with self.timings.stage('generate') as counts:
+            candidate_ids = self.generate()
+            if candidate_ids is None:
+                counts['rankAll'] = 1
+            else:
+                counts['out'] = len(candidate_ids)
+        with self.timings.stage('filter') as counts:
+            survivor_ids = self.filter(candidate_ids)
+            if candidate_ids is not None:
+                counts['in'] = len(candidate_ids)
+            counts['out'] = len(survivor_ids)
+        with self.timings.stage('rerank') as counts:
+            ranked = self.rerank(survivor_ids)
+            counts['out'] = len(ranked[0])
+        return ranked
+
+    def diversify(self, ranked_ids, scores, page_start, per_page):
+        """Served order with MMR picks covering the requested page; the ranking itself when disabled."""
+        # The MMR state is kept for the unfiltered feed; a filtered feed is served in score order
+        if not diversity.enabled() or self.facet_filters:
+            return ranked_ids, scores
+        with self.timings.stage('diversify') as counts:
+            ranked_ids, scores, counts['picked'] = diversity.diversify(
+                self.profile_id, ranked_ids, scores, page_start, per_page
+            )
+        return ranked_ids, scores
+
+    def facet_counts(self):
+        """Facet counts over the profiles the viewer can still discover, under the facet filters."""
+        with self.timings.stage('facets') as counts:
+            excluded = np.concatenate((
+                seen.get_seen(self.profile_id).ids(),
+                np.fromiter(self.exclude, dtype=np.int64, count=len(self.exclude)),
+            ))
+            result = self.facet_index.counts(self.facet_filters, excluded)
+            counts['excluded'] = len(excluded)
+        return result
+
+    def hydrate(self, page_ids, card_projection=False):
+        """Cards or serialized profiles for ``page_ids``, in that order."""
+        with self.timings.stage('hydrate') as counts:
+            if card_projection:
+                # Card columns only, privacy applied; sections come from DiscoverProfileSectionsView
+                results = load_cards(page_ids)
+            else:
+                profiles_by_id = Profile.objects.filter(
+                    profileID__in=page_ids
+                ).prefetch_related(
+                    'experiences',
+                    'certificates',
+                    'achievements',
+                    'jobPositions',
+                    'profileprivacysettings',
+                    Prefetch(
+                        'tags',
+                        queryset=ProfileTagInstances.objects.select_related('tagID')
+                    )
+                ).in_bulk()
+                page_profiles = [profiles_by_id[pid] for pid in page_ids if pid in profiles_by_id]
+                results = ProfileSerializer(page_profiles, many=True).data
+            counts['out'] = len(results)
+        return results
@@ -0,0 +1,72 @@
+"""
+Reading and writing ``PrecomputedMatches``, the per-profile top-K lists
+served by discover when ``DISCOVER_SERVE_PRECOMPUTED`` is on.
+"""
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import PrecomputedMatches
+
+
+# pg_advisory_xact_lock key held while PrecomputedMatches lists are rewritten
+LISTS_LOCK_KEY = 0x6469_7363_7273
+
+
+def lock_lists():
+    """
+    Serialize list writers until the end of the current transaction. Writers
+    that read lists before patching them take it first; it is reentrant.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [LISTS_LOCK_KEY])
+
+
+def default_k():
+    return getattr(settings, 'DISCOVER_PRECOMPUTED_K', 200)
+
+
+def top_k_counterparts(features, engine, viewer_row, k):
+    """Best ``k`` profiles on the other side of the marketplace: ``(profile_ids, scores)``."""
+    candidate_rows = np.flatnonzero(features.is_startup != features.is_startup[viewer_row])
+    return engine.top_k(features, viewer_row, candidate_rows, k)
+
+
+def write_matches(results, computed_at):
+    """Replace the lists of ``results``, ``[(profileID, match IDs, scores)]``, in one transaction."""
+    rows = [
+        PrecomputedMatches(
+            profileID_id=profile_id,
+            rank=rank,
+            matchProfileID_id=int(match_id),
+            score=float(score),
+            computedAt=computed_at
+        )
+        for profile_id, match_ids, scores in results
+        for rank, (match_id, score) in enumerate(zip(match_ids, scores))
+    ]
+    with transaction.atomic():
+        lock_lists()
+        PrecomputedMatches.objects.filter(
+            profileID__in=[profile_id for profile_id, _, _ in results]
+        ).delete()
+        PrecomputedMatches.objects.bulk_create(rows, batch_size=5000)
+    return len(rows)
+
+
+def precomputed_ranking(profile_id, discoverable=None):
+    """
+    ``(profile_ids, scores)`` from ``PrecomputedMatches``, best first, or None
+    when nothing was precomputed for the profile. With a ``discoverable``
+    queryset, only matches still in it are kept.
+    """
+    matches = PrecomputedMatches.objects.filter(profileID=profile_id)
+    if discoverable is not None:
+        matches = matches.filter(matchProfileID__in=discoverable.values('profileID'))
+    rows = list(matches.order_by('rank').values_list('matchProfileID', 'score'))
+    if not rows:
+        if PrecomputedMatches.objects.filter(profileID=profile_id).exists():
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return None
+    profile_ids, scores = zip(*rows)
+    return np.array(profile_ids, dtype=np.int64), np.array(scores, dtype=np.float32)
@@ -0,0 +1,41 @@
+from django.db.models import Exists, OuterRef
+
+from revisit.models import SavedProfiles, SkippedProfiles
+from .models import Profile, Matching
+
+# Viewer-side Matching statuses that take a profile out of discover
+HANDLED_STATUSES = ['accepted', 'rejected']
+
+
+def discoverable_profiles(profile_id, user_id):
+    """
+    Profiles the requesting profile can still discover, as one statement.
+
+    Excludes the user's own profiles, profiles the viewer already accepted or
+    rejected in ``Matching`` and profiles the viewer skipped or saved. Exclusions are
+    ``NOT EXISTS`` anti-joins instead of a Python-built ``IN`` list, so the
+    query does not grow with the viewer's history. Each subquery is served
+    by one of the indexes in foundermatchingdb.sql.
+    """
+    return Profile.objects.exclude(
+        userID=user_id
+    ).filter(
+        ~Exists(Matching.objects.filter(
+            candidateprofileid=profile_id,
+            startupprofileid=OuterRef('profileID'),
+            candidatestatus__in=HANDLED_STATUSES
+        )),
+        ~Exists(Matching.objects.filter(
+            startupprofileid=profile_id,
+            candidateprofileid=OuterRef('profileID'),
+            startupstatus__in=HANDLED_STATUSES
+        )),
+        ~Exists(SkippedProfiles.objects.filter(
+            skippedFromProfileID=profile_id,
+            skippedToProfileID=OuterRef('profileID')
+        )),
+        ~Exists(SavedProfiles.objects.filter(
+            savedFromProfileID=profile_id,
+            savedToProfileID=OuterRef('profileID')
+        )),
+    )
@@ -0,0 +1,314 @@
+"""
+Compatibility scoring for discover.
+
+Profiles are loaded once into column arrays (``ProfileFeatures``). Every
+signal then scores the viewer against all rows at once with NumPy/SciPy
+vector operations. The engine combines the signals as a weighted sum.
+
+New signals subclass ``Signal`` and are enabled through the
+``DISCOVER_SIGNALS`` setting, without changes to the views.
+"""
+import logging
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+from scipy import sparse
+
+from .models import Profile, ProfileTagInstances, JobPositionTagInstances
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(values):
+    """Map strings to int codes (-1 for empty) comparable within one feature set."""
+    normalized = np.array([(value or '').strip().lower() for value in values], dtype=object)
+    if not len(normalized):
+        return np.zeros(0, dtype=np.int32)
+    uniques, codes = np.unique(normalized, return_inverse=True)
+    codes = codes.astype(np.int32)
+    if len(uniques) and uniques[0] == '':
+        codes[codes == 0] = -1
+    return codes
+
+
+def _incidence_matrix(row_ids, tag_ids, n_rows, n_cols):
+    data = np.ones(len(row_ids), dtype=np.float32)
+    matrix = sparse.csr_matrix((data, (row_ids, tag_ids)), shape=(n_rows, n_cols), dtype=np.float32)
+    # Duplicate (row, tag) pairs are summed by the constructor; keep the matrix binary
+    matrix.data[:] = 1.0
+    return matrix
+
+
+class ProfileFeatures:
+    """Column-oriented features for a set of profiles; row ``i`` is ``profile_ids[i]``."""
+
+    def __init__(self, profile_ids, is_startup, industry, country, stage, tags, job_tags):
+        self.profile_ids = profile_ids
+        self.is_startup = is_startup
+        self.industry = industry
+        self.country = country
+        self.stage = stage
+        # (profiles x tag ID) binary incidence matrices
+        self.tags = tags
+        self.job_tags = job_tags
+        self._rows = None
+
+    def __len__(self):
+        return len(self.profile_ids)
+
+    def row(self, profile_id):
+        if self._rows is None:
+            self._rows = {int(pid): i for i, pid in enumerate(self.profile_ids)}
+        return self._rows.get(int(profile_id))
+
+    def rows(self, profile_ids):
+        """Row indices of ``profile_ids``, -1 for profiles not in this feature set."""
+        profile_ids = np.asarray(profile_ids, dtype=np.int64)
+        if not len(self.profile_ids):
+            return np.full(len(profile_ids), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.profile_ids, profile_ids), len(self.profile_ids) - 1)
+        return np.where(self.profile_ids[positions] == profile_ids, positions, -1)
+
+    @classmethod
+    def load(cls, queryset=None):
+        """
+        Load features for the profiles in ``queryset`` (all profiles when None).
+        Three queries: profile attributes, profile tags and job position tags.
+        """
+        if queryset is None:
+            queryset = Profile.objects.all()
+
+        attrs = list(
+            queryset.order_by('profileID').values_list(
+                'profileID', 'isStartup', 'industry', 'country', 'currentStage'
+            )
+        )
+        profile_id_subquery = queryset.values('profileID')
+        tag_pairs = np.array(
+            list(ProfileTagInstances.objects.filter(
+                profileOwnerID__in=profile_id_subquery
+            ).values_list('profileOwnerID', 'tagID')),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        job_tag_pairs = np.array(
+            list(JobPositionTagInstances.objects.filter(
+                jobPositionID__profileOwner__in=profile_id_subquery,
+                jobPositionID__isOpening=True
+            ).values_list('jobPositionID__profileOwner', 'tagID')),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        return cls.from_rows(attrs, tag_pairs, job_tag_pairs)
+
+    @classmethod
+    def from_rows(cls, attrs, tag_pairs, job_tag_pairs):
+        profile_ids = np.array([row[0] for row in attrs], dtype=np.int64)
+        n_rows = len(profile_ids)
+        n_cols = int(max(
+            tag_pairs[:, 1].max(initial=0) if len(tag_pairs) else 0,
+            job_tag_pairs[:, 1].max(initial=0) if len(job_tag_pairs) else 0,
+        )) + 1
+
+        def to_matrix(pairs):
+            rows = np.searchsorted(profile_ids, pairs[:, 0]) if len(pairs) else np.zeros(0, dtype=np.int64)
+            return _incidence_matrix(rows, pairs[:, 1], n_rows, n_cols)
+
+        return cls(
+            profile_ids=profile_ids,
+            is_startup=np.array([bool(row[1]) for row in attrs], dtype=bool),
+            industry=_encode([row[2] for row in attrs]),
+            country=_encode([row[3] for row in attrs]),
+            stage=_encode([row[4] for row in attrs]),
+            tags=to_matrix(tag_pairs),
+            job_tags=to_matrix(job_tag_pairs),
+        )
+
+
+class Signal:
+    """
+    One scoring component. ``score`` returns a float32 array in [0, 1] with one
+    value per row of ``features``, describing how well that row fits the viewer.
+    """
+
+    name = None
+
+    def __init__(self, weight=1.0):
+        self.weight = weight
+
+    def score(self, features, viewer_row):
+        raise NotImplementedError
+
+    def score_column(self, features, candidate_row):
+        """
+        Every row's score with ``candidate_row`` as the candidate, as if each
+        row were the viewer. The default suits symmetric signals.
+        """
+        return self.score(features, candidate_row)
+
+
+def _overlap(matrix, query_vector):
+    """Number of shared columns between every row of ``matrix`` and a binary row vector."""
+    return (matrix @ query_vector.toarray().ravel()).astype(np.float32)
+
+
+def _row_sizes(matrix):
+    return np.diff(matrix.indptr).astype(np.float32)
+
+
+class TagOverlapSignal(Signal):
+    """Jaccard similarity of profile tag sets."""
+
+    name = 'tags'
+
+    def score(self, features, viewer_row):
+        viewer_tags = features.tags[viewer_row]
+        viewer_size = float(viewer_tags.nnz)
+        if not viewer_size:
+            return np.zeros(len(features), dtype=np.float32)
+        shared = _overlap(features.tags, viewer_tags)
+        union = _row_sizes(features.tags) + viewer_size - shared
+        return np.divide(shared, union, out=np.zeros_like(shared), where=union > 0)
+
+
+class JobTagSignal(Signal):
+    """
+    How much of a startup's open job position tags a candidate's profile tags
+    cover. Works in both directions: a startup viewer is matched against
+    candidate tags, and a candidate viewer against startup job tags.
+    """
+
+    name = 'jobTags'
+
+    def score(self, features, viewer_row):
+        if features.is_startup[viewer_row]:
+            job_tags = features.job_tags[viewer_row]
+            required = float(job_tags.nnz)
+            if not required:
+                return np.zeros(len(features), dtype=np.float32)
+            return _overlap(features.tags, job_tags) / required
+
+        shared = _overlap(features.job_tags, features.tags[viewer_row])
+        required = _row_sizes(features.job_tags)
+        return np.divide(shared, required, out=np.zeros_like(shared), where=required > 0)
+
+    def score_column(self, features, candidate_row):
+        # Startup viewers: how much of their job tags the candidate's tags cover
+        shared = _overlap(features.job_tags, features.tags[candidate_row])
+        required = _row_sizes(features.job_tags)
+        as_startup = np.divide(shared, required, out=np.zeros_like(shared), where=required > 0)
+
+        # Candidate viewers: how much of the candidate's job tags their tags cover
+        job_tags = features.job_tags[candidate_row]
+        if job_tags.nnz:
+            as_candidate = _overlap(features.tags, job_tags) / float(job_tags.nnz)
+        else:
+            as_candidate = np.zeros(len(features), dtype=np.float32)
+        return np.where(features.is_startup, as_startup, as_candidate)
+
+
+class _SameValueSignal(Signal):
+    attribute = None
+
+    def score(self, features, viewer_row):
+        codes = getattr(features, self.attribute)
+        viewer_code = codes[viewer_row]
+        if viewer_code < 0:
+            return np.zeros(len(features), dtype=np.float32)
+        return (codes == viewer_code).astype(np.float32)
+
+
+class SameIndustrySignal(_SameValueSignal):
+    name = 'industry'
+    attribute = 'industry'
+
+
+class SameCountrySignal(_SameValueSignal):
+    name = 'country'
+    attribute = 'country'
+
+
+class SameStageSignal(_SameValueSignal):
+    name = 'stage'
+    attribute = 'stage'
+
+
+class CounterpartSignal(Signal):
+    """Prefers the other side of the marketplace: candidates for startups and vice versa."""
+
+    name = 'counterpart'
+
+    def score(self, features, viewer_row):
+        return (features.is_startup != features.is_startup[viewer_row]).astype(np.float32)
+
+
+DEFAULT_SIGNALS = [
+    {'class': 'discover.scoring.CounterpartSignal', 'weight': 4.0},
+    {'class': 'discover.scoring.JobTagSignal', 'weight': 3.0},
+    {'class': 'discover.scoring.TagOverlapSignal', 'weight': 2.0},
+    {'class': 'discover.scoring.SameIndustrySignal', 'weight': 1.0},
+    {'class': 'discover.scoring.SameCountrySignal', 'weight': 0.5},
+]
+
+
+class ScoringEngine:
+    def __init__(self, signals):
+        self.signals = signals
+
+    @classmethod
+    def from_settings(cls):
+        signals = []
+        for config in getattr(settings, 'DISCOVER_SIGNALS', DEFAULT_SIGNALS):
+            signal_class = import_string(config['class'])
+            signals.append(signal_class(weight=config.get('weight', 1.0), **config.get('options', {})))
+        return cls(signals)
+
+    def score(self, features, viewer_row):
+        total = np.zeros(len(features), dtype=np.float32)
+        for signal in self.signals:
+            if signal.weight:
+                total += np.float32(signal.weight) * signal.score(features, viewer_row)
+        return total
+
+    def score_column(self, features, candidate_row):
+        """Every row's combined score for ``candidate_row``, as if each row were the viewer."""
+        total = np.zeros(len(features), dtype=np.float32)
+        for signal in self.signals:
+            if signal.weight:
+                total += np.float32(signal.weight) * signal.score_column(features, candidate_row)
+        return total
+
+    def rank(self, features, viewer_row, candidate_rows):
+        """
+        Score ``candidate_rows`` for the viewer and return ``(profile_ids, scores)``
+        ordered by score descending, then profileID ascending for stable pages.
+        """
+        candidate_rows = np.asarray(candidate_rows, dtype=np.int64)
+        scores = self.score(features, viewer_row)[candidate_rows]
+        profile_ids = features.profile_ids[candidate_rows]
+        order = np.lexsort((profile_ids, -scores))
+        return profile_ids[order], scores[order]
+
+    def top_k(self, features, viewer_row, candidate_rows, k):
+        """Like :meth:`rank`, keeping only the best ``k`` without sorting the rest."""
+        candidate_rows = np.asarray(candidate_rows, dtype=np.int64)
+        scores = self.score(features, viewer_row)[candidate_rows]
+        profile_ids = features.profile_ids[candidate_rows]
+        if len(candidate_rows) > k:
+            # Ties at the k-th score are resolved by profileID, as in rank()
+            threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+            above = np.flatnonzero(scores > threshold)
+            tied = np.flatnonzero(scores == threshold)
+            keep = np.concatenate((above, tied[np.argsort(profile_ids[tied])][:k - len(above)]))
+            profile_ids, scores = profile_ids[keep], scores[keep]
+        order = np.lexsort((profile_ids, -scores))
+        return profile_ids[order], scores[order]
+
+
+_engine = None
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = ScoringEngine.from_settings()
+    return _engine
@@ -0,0 +1,123 @@
+"""
+Profile search over Postgres full-text and trigram indexes.
+
+Matching profiles are collected by four index-driven branches (see
+foundermatchingdb.sql), so no branch scans the Profile table:
+
+- ``Profile."SearchVector"``: name, description and about us (GIN)
+- ``Profile."IndustrySearchVector"`` / ``"SloganSearchVector"``: only
+  where the field is public, as cards hide it otherwise (GIN)
+- ``JobPosition."SearchVector"``: titles of open positions (partial GIN)
+- ``Profile."Name"``: typo-tolerant word similarity (pg_trgm GIN)
+
+Only the matches are then scored: full-text rank of the visible fields, plus
+the best open job title rank, plus the name similarity. Own profiles and
+profiles the viewer accepted, rejected, skipped or saved are left out, as in
+discover. Pages are keyset pages on ``(score, profileID)``.
+"""
+from django.db import connection, transaction
+
+# pg_trgm word similarity a name must reach to match (the extension's default is 0.6)
+NAME_SIMILARITY_THRESHOLD = 0.4
+MAX_QUERY_LENGTH = 200
+
+_SEARCH_SQL = """
+    WITH query AS (
+        SELECT websearch_to_tsquery('english', %(q)s) AS tsq
+    ),
+    matches AS (
+        SELECT p."ProfileID" FROM "Profile" p, query
+        WHERE p."SearchVector" @@ query.tsq
+        UNION
+        SELECT p."ProfileID" FROM "Profile" p
+        WHERE %(q)s <%% p."Name"
+        UNION
+        SELECT p."ProfileID" FROM "Profile" p
+        JOIN query ON p."IndustrySearchVector" @@ query.tsq
+        LEFT JOIN "ProfilePrivacySettings" ps ON ps."ProfileID" = p."ProfileID"
+        WHERE coalesce(ps."IndustryPrivacy", 'public') = 'public'
+        UNION
+        SELECT p."ProfileID" FROM "Profile" p
+        JOIN query ON p."SloganSearchVector" @@ query.tsq
+        LEFT JOIN "ProfilePrivacySettings" ps ON ps."ProfileID" = p."ProfileID"
+        WHERE coalesce(ps."SloganPrivacy", 'public') = 'public'
+        UNION
+        SELECT j."ProfileOwner" FROM "JobPosition" j, query
+        WHERE j."IsOpening" AND j."SearchVector" @@ query.tsq
+    ),
+    scored AS (
+        SELECT p."ProfileID", (
+            ts_rank(
+                p."SearchVector"
+                || CASE WHEN coalesce(ps."IndustryPrivacy", 'public') = 'public'
+                        THEN p."IndustrySearchVector" ELSE ''::tsvector END
+                || CASE WHEN coalesce(ps."SloganPrivacy", 'public') = 'public'
+                        THEN p."SloganSearchVector" ELSE ''::tsvector END,
+                query.tsq
+            )
+            + coalesce((
+                SELECT max(ts_rank(j."SearchVector", query.tsq)) FROM "JobPosition" j
+                WHERE j."ProfileOwner" = p."ProfileID" AND j."IsOpening" AND j."SearchVector" @@ query.tsq
+            ), 0)
+            + word_similarity(%(q)s, p."Name")
+        )::real AS score
+        FROM matches
+        JOIN "Profile" p ON p."ProfileID" = matches."ProfileID"
+        CROSS JOIN query
+        LEFT JOIN "ProfilePrivacySettings" ps ON ps."ProfileID" = p."ProfileID"
+        WHERE p."UserID" <> %(user_id)s
+        AND NOT EXISTS (
+            SELECT 1 FROM "Matching" m
+            WHERE m."CandidateProfileID" = %(profile_id)s AND m."StartupProfileID" = p."ProfileID"
+            AND m."CandidateStatus" IN ('accepted', 'rejected')
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM "Matching" m
+            WHERE m."StartupProfileID" = %(profile_id)s AND m."CandidateProfileID" = p."ProfileID"
+            AND m."StartupStatus" IN ('accepted', 'rejected')
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM "SkippedProfiles" s
+            WHERE s."SkippedFromProfileID" = %(profile_id)s AND s."SkippedToProfileID" = p."ProfileID"
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM "SavedProfiles" sp
+            WHERE sp."SavedFromProfileID" = %(profile_id)s AND sp."SavedToProfileID" = p."ProfileID"
+        )
+    )
+    SELECT "ProfileID", score FROM scored
+    WHERE %(after_id)s IS NULL
+       OR score < %(after_score)s::real
+       OR (score = %(after_score)s::real AND "ProfileID" > %(after_id)s)
+    ORDER BY score DESC, "ProfileID"
+    LIMIT %(limit)s
+"""
+
+
+def normalize_query(q):
+    return ' '.join((q or '').split())[:MAX_QUERY_LENGTH]
+
+
+def search_profiles(q, profile_id, user_id, limit, after=None):
+    """
+    ``[(profileID, score)]`` of up to ``limit`` profiles matching ``q`` for
+    the viewer, best first, starting after the ``(score, profileID)`` of
+    ``after`` when given.
+    """
+    after_score, after_id = after if after is not None else (None, None)
+    params = {
+        'q': q,
+        'profile_id': int(profile_id),
+        'user_id': int(user_id),
+        'after_score': None if after_score is None else float(after_score),
+        'after_id': after_id,
+        'limit': int(limit),
+    }
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Local to the transaction; read by the <% operator and its index
+        cursor.execute(
+            "SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)",
+            [str(NAME_SIMILARITY_THRESHOLD)]
+        )
+        cursor.execute(_SEARCH_SQL, params)
+        return [(profile_id, score) for profile_id, score in cursor.fetchall()]
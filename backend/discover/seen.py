@@ -0,0 +1,151 @@
+"""
+Per-viewer "seen" bitmaps for discover.
+
+A viewer's handled profiles (accepted or rejected in ``Matching``, skipped or
+saved) are kept as one bit per profileID. The bitmap is stored in the cache
+packed (``np.packbits``) and zlib-compressed: long runs of unset bits
+compress to almost nothing, so thousands of handled profiles take a few
+kilobytes. Candidate filtering unpacks it once and checks every candidate
+with one array lookup.
+
+The bitmap is a pre-filter only: it drops most handled candidates before
+scoring, and the survivors are still checked by the anti-joins of
+``discover.queries``.
+
+Every write bumps a per-viewer generation after commit (see
+``discover.signals``), and a bitmap is stored with the generation it covers.
+A bitmap rebuilt from the database is tagged with the generation read
+before the queries ran, and an update only applies to the bitmap of the
+previous generation. A bitmap that missed a write therefore never matches
+the current generation and is rebuilt, however the writes and rebuilds of
+several workers interleave.
+"""
+import time
+import zlib
+
+import numpy as np
+from django.core.cache import cache
+
+from revisit.models import SavedProfiles, SkippedProfiles
+from .models import Matching
+from .queries import HANDLED_STATUSES
+
+SEEN_TTL = 24 * 3600
+CACHE_KEY_PREFIX = 'discover:seen:'
+
+
+def _cache_key(profile_id):
+    return f'{CACHE_KEY_PREFIX}{int(profile_id)}'
+
+
+def _generation_key(profile_id):
+    return f'{_cache_key(profile_id)}:generation'
+
+
+def _handled_ids(profile_id):
+    """Profile IDs ``profile_id`` accepted, rejected, skipped or saved, in four queries."""
+    querysets = (
+        Matching.objects.filter(
+            candidateprofileid=profile_id, candidatestatus__in=HANDLED_STATUSES
+        ).values_list('startupprofileid', flat=True),
+        Matching.objects.filter(
+            startupprofileid=profile_id, startupstatus__in=HANDLED_STATUSES
+        ).values_list('candidateprofileid', flat=True),
+        SkippedProfiles.objects.filter(skippedFromProfileID=profile_id).values_list('skippedToProfileID', flat=True),
+        SavedProfiles.objects.filter(savedFromProfileID=profile_id).values_list('savedToProfileID', flat=True),
+    )
+    return np.array([pid for queryset in querysets for pid in queryset], dtype=np.int64)
+
+
+class SeenBitmap:
+    def __init__(self, bits=None):
+        self.bits = np.zeros(0, dtype=bool) if bits is None else bits
+
+    @classmethod
+    def from_ids(cls, profile_ids):
+        bitmap = cls()
+        bitmap.add(profile_ids)
+        return bitmap
+
+    def __len__(self):
+        return int(self.bits.sum())
+
+    def add(self, profile_ids):
+        profile_ids = np.asarray(profile_ids, dtype=np.int64)
+        if not len(profile_ids):
+            return
+        size = int(profile_ids.max()) + 1
+        if size > len(self.bits):
+            # Grow in 4096-bit steps so most additions fit without copying
+            self.bits = np.concatenate((self.bits, np.zeros(-(-size // 4096) * 4096 - len(self.bits), dtype=bool)))
+        self.bits[profile_ids] = True
+
+    def ids(self):
+        return np.flatnonzero(self.bits)
+
+    def contains(self, profile_ids):
+        """Boolean mask over ``profile_ids``: True where the profile was handled."""
+        profile_ids = np.asarray(profile_ids, dtype=np.int64)
+        result = np.zeros(len(profile_ids), dtype=bool)
+        in_range = profile_ids < len(self.bits)
+        result[in_range] = self.bits[profile_ids[in_range]]
+        return result
+
+    def pack(self):
+        return len(self.bits), zlib.compress(np.packbits(self.bits).tobytes())
+
+    @classmethod
+    def unpack(cls, packed):
+        size, data = packed
+        return cls(np.unpackbits(np.frombuffer(zlib.decompress(data), dtype=np.uint8), count=size).astype(bool))
+
+
+def _generation(profile_id):
+    generation = cache.get(_generation_key(profile_id))
+    if generation is None:
+        # Not 0: a bitmap outliving an expired counter must not match the new one
+        cache.add(_generation_key(profile_id), time.time_ns(), SEEN_TTL)
+        generation = cache.get(_generation_key(profile_id))
+    return generation
+
+
+def _bump_generation(profile_id):
+    """The viewer's new generation, unique to this write."""
+    try:
+        return cache.incr(_generation_key(profile_id))
+    except ValueError:
+        _generation(profile_id)
+        return cache.incr(_generation_key(profile_id))
+
+
+def get_seen(profile_id):
+    """The viewer's bitmap from the cache, rebuilt from the database when missing or stale."""
+    key = _cache_key(profile_id)
+    # Read before the queries: a write committed after this bumps past it
+    generation = _generation(profile_id)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == generation:
+        return SeenBitmap.unpack(cached[1:])
+    bitmap = SeenBitmap.from_ids(_handled_ids(profile_id))
+    cache.set(key, (generation, *bitmap.pack()), SEEN_TTL)
+    return bitmap
+
+
+def mark_seen(profile_id, *target_ids):
+    """Record new handled profiles: bump the generation, and set the bits of an up to date bitmap."""
+    key = _cache_key(profile_id)
+    generation = _bump_generation(profile_id)
+    cached = cache.get(key)
+    # Only the bitmap of the generation just before ours holds every earlier write
+    if cached is None or cached[0] != generation - 1:
+        return
+    bitmap = SeenBitmap.unpack(cached[1:])
+    bitmap.add(target_ids)
+    cache.set(key, (generation, *bitmap.pack()), SEEN_TTL)
+
+
+def invalidate(*profile_ids):
+    """Profiles were un-skipped or un-saved: make their viewers' bitmaps stale."""
+    for profile_id in profile_ids:
+        if profile_id is not None:
+            _bump_generation(profile_id)
@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from profiles.signals import job_positions_changed, profile_fields_changed, profile_tags_changed, profile_text_changed
+from revisit.models import SavedProfiles, SkippedProfiles
+from . import facets, incremental, job_index, minhash, seen, snapshots, tag_index, text_relevance
+from .models import Matching
+from .queries import HANDLED_STATUSES
+
+
+def _update_seen(signal, viewer_id, target_id):
+    # After commit, so a rolled back swipe does not hide the profile
+    if signal is post_delete:
+        transaction.on_commit(lambda: seen.invalidate(viewer_id))
+    else:
+        transaction.on_commit(lambda: seen.mark_seen(viewer_id, target_id))
+
+
+def _invalidate_snapshots(*profile_ids):
+    # After commit too: a feed rebuilt before it would still list the handled profile
+    transaction.on_commit(lambda: snapshots.invalidate(*profile_ids))
+
+
+def matching_written(candidate_id, startup_id, candidate_status, startup_status, signal=post_save):
+    """Update both sides' feeds after a Matching row is saved or deleted."""
+    # Both sides' feeds exclude profiles they accepted or rejected
+    _invalidate_snapshots(candidate_id, startup_id)
+    if candidate_status in HANDLED_STATUSES or signal is post_delete:
+        _update_seen(signal, candidate_id, startup_id)
+    if startup_status in HANDLED_STATUSES or signal is post_delete:
+        _update_seen(signal, startup_id, candidate_id)
+
+
+def matchings_written(rows):
+    """
+    ``matching_written`` for many saved rows ``(candidate_id, startup_id,
+    candidate_status, startup_status)``, one seen update per viewer.
+    """
+    handled = defaultdict(list)
+    for candidate_id, startup_id, candidate_status, startup_status in rows:
+        if candidate_status in HANDLED_STATUSES:
+            handled[candidate_id].append(startup_id)
+        if startup_status in HANDLED_STATUSES:
+            handled[startup_id].append(candidate_id)
+    _invalidate_snapshots(*{profile_id for row in rows for profile_id in row[:2]})
+    for viewer_id, target_ids in handled.items():
+        transaction.on_commit(lambda viewer_id=viewer_id, target_ids=target_ids: seen.mark_seen(viewer_id, *target_ids))
+
+
+@receiver([post_save, post_delete], sender=Matching)
+def matching_changed(sender, instance, signal, **kwargs):
+    matching_written(
+        instance.candidateprofileid_id, instance.startupprofileid_id,
+        instance.candidatestatus, instance.startupstatus, signal
+    )
+
+
+@receiver([post_save, post_delete], sender=SkippedProfiles)
+def skipped_profiles_changed(sender, instance, signal, **kwargs):
+    _invalidate_snapshots(instance.skippedFromProfileID_id)
+    _update_seen(signal, instance.skippedFromProfileID_id, instance.skippedToProfileID_id)
+
+
+@receiver([post_save, post_delete], sender=SavedProfiles)
+def saved_profiles_changed(sender, instance, signal, **kwargs):
+    _invalidate_snapshots(instance.savedFromProfileID_id)
+    _update_seen(signal, instance.savedFromProfileID_id, instance.savedToProfileID_id)
+
+
+@receiver(profile_tags_changed)
+def update_tag_index(sender, profile_id, **kwargs):
+    tag_index.refresh_profile(profile_id)
+    minhash.refresh_profile(profile_id)
+    facets.refresh_profile(profile_id)
+    incremental.enqueue(profile_id)
+
+
+@receiver(profile_text_changed)
+def update_text_corpus(sender, profile_id, **kwargs):
+    text_relevance.refresh_profile(profile_id)
+    incremental.enqueue(profile_id)
+
+
+@receiver(profile_fields_changed)
+def rescore_scored_fields(sender, profile_id, fields, **kwargs):
+    if incremental.SCORED_FIELDS.intersection(fields):
+        incremental.enqueue(profile_id)
+    if facets.FACET_FIELDS.intersection(fields):
+        facets.refresh_profile(profile_id)
+
+
+@receiver(job_positions_changed)
+def update_job_index(sender, profile_id, **kwargs):
+    job_index.refresh_profile(profile_id)
@@ -0,0 +1,44 @@
+"""
+Per-viewer discover feed snapshots.
+
+The first page ranks every discoverable profile and stores the ranked IDs and
+scores in the cache as packed ``array`` blobs (4 bytes per entry each). Later
+pages slice the snapshot, so they cost only the hydration queries and keep the
+order of the first page while other users act. Snapshots are dropped when
+the viewer connects, skips or saves (see ``discover.signals``).
+
+A viewer has one snapshot at a time. ``variant`` (the facet filters) is
+stored with it, so changing the filters ranks again.
+"""
+from array import array
+
+import numpy as np
+from django.core.cache import cache
+
+SNAPSHOT_TTL = 900
+CACHE_KEY_PREFIX = 'discover:snapshot:'
+
+
+def _cache_key(profile_id):
+    return f'{CACHE_KEY_PREFIX}{int(profile_id)}'
+
+
+def store(profile_id, profile_ids, scores, variant=''):
+    ids = array('i')
+    ids.frombytes(np.asarray(profile_ids, dtype=np.int32).tobytes())
+    packed_scores = array('f')
+    packed_scores.frombytes(np.asarray(scores, dtype=np.float32).tobytes())
+    cache.set(_cache_key(profile_id), (ids.tobytes(), packed_scores.tobytes(), variant), SNAPSHOT_TTL)
+
+
+def load(profile_id, variant=''):
+    """``(profile_ids, scores)`` arrays of the viewer's snapshot, or None."""
+    packed = cache.get(_cache_key(profile_id))
+    if packed is None or packed[2] != variant:
+        return None
+    ids, scores, _ = packed
+    return np.frombuffer(ids, dtype=np.int32).astype(np.int64), np.frombuffer(scores, dtype=np.float32)
+
+
+def invalidate(*profile_ids):
+    cache.delete_many([_cache_key(profile_id) for profile_id in profile_ids if profile_id is not None])
@@ -0,0 +1,142 @@
+"""
+In-process inverted tag index for discover candidate retrieval.
+
+Maps a tag ID to the sorted array of profile IDs carrying it, either as a
+profile tag or as a tag of one of the profile's open job positions (the same
+tags the scoring signals use). Retrieval does not query the database: it
+counts shared tags across the viewer's posting lists and returns the best N
+profile IDs.
+
+Each worker keeps its own copy (see ``discover.indexes``). Changes made by
+this worker are applied to it incrementally; other workers rebuild.
+"""
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+from .indexes import VersionedIndex
+from .models import ProfileTagInstances, JobPositionTagInstances
+
+VERSION_CACHE_KEY = 'discover:tag_index:version'
+
+_EMPTY = np.zeros(0, dtype=np.int64)
+
+
+def load_tags(profile_id=None):
+    """``{profileID: set(tagID)}`` of profile tags and open job position tags."""
+    profile_tags = ProfileTagInstances.objects.all()
+    job_tags = JobPositionTagInstances.objects.filter(jobPositionID__isOpening=True)
+    if profile_id is not None:
+        profile_tags = profile_tags.filter(profileOwnerID=profile_id)
+        job_tags = job_tags.filter(jobPositionID__profileOwner=profile_id)
+
+    tags = defaultdict(set)
+    for owner_id, tag_id in profile_tags.values_list('profileOwnerID', 'tagID'):
+        tags[owner_id].add(tag_id)
+    for owner_id, tag_id in job_tags.values_list('jobPositionID__profileOwner', 'tagID'):
+        tags[owner_id].add(tag_id)
+    return tags
+
+
+class TagIndex:
+    def __init__(self, profile_tags=None):
+        self._lock = threading.Lock()
+        # profileID -> frozenset(tagID), the forward index used for updates
+        self._profile_tags = {}
+        # tagID -> sorted int64 array of profileIDs
+        self._postings = {}
+        if profile_tags:
+            self._build(profile_tags)
+
+    def _build(self, profile_tags):
+        postings = defaultdict(list)
+        for profile_id, tag_ids in profile_tags.items():
+            self._profile_tags[profile_id] = frozenset(tag_ids)
+            for tag_id in tag_ids:
+                postings[tag_id].append(profile_id)
+        self._postings = {
+            tag_id: np.unique(np.array(profile_ids, dtype=np.int64))
+            for tag_id, profile_ids in postings.items()
+        }
+
+    @classmethod
+    def build(cls):
+        return cls(load_tags())
+
+    def __len__(self):
+        return len(self._profile_tags)
+
+    def tags_of(self, profile_id):
+        return self._profile_tags.get(int(profile_id), frozenset())
+
+    def postings(self, tag_id):
+        return self._postings.get(tag_id, _EMPTY)
+
+    def update_profile(self, profile_id, tag_ids):
+        """Replace the tags of one profile, touching only the affected posting lists."""
+        profile_id = int(profile_id)
+        new_tags = frozenset(tag_ids)
+        with self._lock:
+            old_tags = self._profile_tags.get(profile_id, frozenset())
+            postings = dict(self._postings)
+            for tag_id in old_tags - new_tags:
+                remaining = postings[tag_id][postings[tag_id] != profile_id]
+                if len(remaining):
+                    postings[tag_id] = remaining
+                else:
+                    del postings[tag_id]
+            for tag_id in new_tags - old_tags:
+                current = postings.get(tag_id, _EMPTY)
+                postings[tag_id] = np.insert(current, np.searchsorted(current, profile_id), profile_id)
+            # Readers see either the old or the new mapping, never a partial one
+            self._postings = postings
+            if new_tags:
+                self._profile_tags[profile_id] = new_tags
+            else:
+                self._profile_tags.pop(profile_id, None)
+
+    def candidates(self, tag_ids, limit=None, exclude=()):
+        """
+        Profile IDs sharing at least one of ``tag_ids``, most shared tags
+        first, then profileID ascending. ``limit`` keeps only the best N.
+        """
+        lists = [self.postings(tag_id) for tag_id in tag_ids]
+        if not any(len(posting) for posting in lists):
+            return _EMPTY
+        profile_ids, shared = np.unique(np.concatenate(lists), return_counts=True)
+        if len(exclude):
+            keep = ~np.isin(profile_ids, np.asarray(list(exclude), dtype=np.int64))
+            profile_ids, shared = profile_ids[keep], shared[keep]
+        if limit is not None and len(profile_ids) > limit:
+            top = np.argpartition(-shared, limit - 1)[:limit]
+            profile_ids, shared = profile_ids[top], shared[top]
+        order = np.lexsort((profile_ids, -shared))
+        return profile_ids[order]
+
+
+_index = VersionedIndex('tag_index', VERSION_CACHE_KEY, TagIndex.build)
+
+
+def get_tag_index():
+    """This worker's index; see ``discover.indexes``."""
+    return _index.get()
+
+
+def refresh_profile(profile_id):
+    """Re-read one profile's tags into this worker's index and signal the other workers."""
+    _index.apply(
+        _index.bump(),
+        lambda index: index.update_profile(profile_id, load_tags(profile_id).get(int(profile_id), ()))
+    )
+
+
+def retrieve(profile_id, limit, exclude=()):
+    """
+    Discover retriever: the profiles sharing most tags with the viewer, or
+    None when the index is small enough to rank everyone.
+    """
+    index = get_tag_index()
+    if len(index) <= limit:
+        return None
+    return index.candidates(index.tags_of(profile_id), limit=limit, exclude=exclude)
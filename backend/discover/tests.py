@@ -1,3 +1,482 @@
-from django.test import TestCase
+import contextlib
+import unittest
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+from scipy import sparse
+
+from accounts.identity import IdentityContext
+
+from . import seen, signals, transitions, views
+from .diversity import DiversityState
+from .indexes import VersionedIndex
+from .pagination import InvalidCursor, cursor_page, decode_cursor, encode_cursor, seek
+from .seen import SeenBitmap
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+class SeenBitmapTests(SimpleTestCase):
+    def test_add_and_contains(self):
+        bitmap = SeenBitmap.from_ids([3, 5000, 7])
+        bitmap.add([9000])
+        self.assertEqual(len(bitmap), 4)
+        self.assertEqual(
+            bitmap.contains([3, 4, 7, 5000, 9000, 10 ** 9]).tolist(),
+            [True, False, True, True, True, False]
+        )
+        self.assertEqual(bitmap.ids().tolist(), [3, 7, 5000, 9000])
+
+    def test_add_nothing(self):
+        bitmap = SeenBitmap()
+        bitmap.add([])
+        self.assertEqual(len(bitmap), 0)
+        self.assertEqual(bitmap.contains([0, 1]).tolist(), [False, False])
+
+    def test_pack_round_trip(self):
+        bitmap = SeenBitmap.from_ids(np.arange(0, 1_000_000, 997))
+        unpacked = SeenBitmap.unpack(bitmap.pack())
+        self.assertTrue(np.array_equal(unpacked.bits, bitmap.bits))
+
+    def test_pack_is_compact(self):
+        _, data = SeenBitmap.from_ids(np.arange(0, 1_000_000, 200)).pack()
+        self.assertLess(len(data), 16 * 1024)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class SeenCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _get_seen(self, handled):
+        with mock.patch.object(seen, '_handled_ids', return_value=np.array(handled, dtype=np.int64)) as handled_ids:
+            bitmap = seen.get_seen(1)
+        return bitmap, handled_ids.called
+
+    def test_cached_after_build(self):
+        bitmap, built = self._get_seen([2, 3])
+        self.assertTrue(built)
+        bitmap, built = self._get_seen([])
+        self.assertFalse(built)
+        self.assertEqual(bitmap.ids().tolist(), [2, 3])
+
+    def test_mark_seen_updates_current_bitmap(self):
+        self._get_seen([2])
+        seen.mark_seen(1, 4, 5)
+        bitmap, built = self._get_seen([])
+        self.assertFalse(built)
+        self.assertEqual(bitmap.ids().tolist(), [2, 4, 5])
+
+    def test_write_during_rebuild_is_not_lost(self):
+        def handled_ids(profile_id):
+            # The write commits after the queries ran, before the bitmap is stored
+            seen.mark_seen(1, 4)
+            return np.array([2], dtype=np.int64)
+
+        with mock.patch.object(seen, '_handled_ids', side_effect=handled_ids):
+            seen.get_seen(1)
+        bitmap, built = self._get_seen([2, 4])
+        self.assertTrue(built)
+        self.assertEqual(bitmap.ids().tolist(), [2, 4])
+
+    def test_invalidate_forces_rebuild(self):
+        self._get_seen([2, 3])
+        seen.invalidate(1)
+        bitmap, built = self._get_seen([3])
+        self.assertTrue(built)
+        self.assertEqual(bitmap.ids().tolist(), [3])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class VersionedIndexTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.builds = []
+        self.index = VersionedIndex('test', 'test:version', self._build)
+
+    def _build(self):
+        self.builds.append(len(self.builds))
+        return {'build': len(self.builds)}
+
+    def _wait_for_refresh(self):
+        with self.index._build_lock:
+            pass
+
+    def test_first_get_builds(self):
+        self.assertEqual(self.index.get(), {'build': 1})
+        self.assertEqual(self.index.get(), {'build': 1})
+        self.assertEqual(len(self.builds), 1)
+
+    def test_stale_index_served_while_rebuilding(self):
+        first = self.index.get()
+        self.index.bump()
+        self.assertIs(self.index.get(), first)
+        self._wait_for_refresh()
+        self.assertEqual(self.index.get(), {'build': 2})
+        self.assertEqual(self.index.version, self.index.current_version())
+
+    def test_apply_own_change_in_place(self):
+        index = self.index.get()
+        self.index.apply(self.index.bump(), lambda current: current.update(changed=True))
+        self.assertIs(self.index.get(), index)
+        self.assertTrue(index['changed'])
+        self.assertEqual(len(self.builds), 1)
+
+    def test_apply_skipped_after_missed_change(self):
+        index = self.index.get()
+        self.index.bump()
+        self.index.apply(self.index.bump(), lambda current: current.update(changed=True))
+        self.assertNotIn('changed', index)
+
+
+class CursorTests(SimpleTestCase):
+    def setUp(self):
+        self.profile_ids = np.array([7, 3, 9, 4, 8, 2], dtype=np.int64)
+        self.scores = np.array([5.0, 4.5, 4.5, 4.5, 1.25, -2.0], dtype=np.float32)
+
+    def test_round_trip(self):
+        score, profile_id = decode_cursor(encode_cursor(np.float32(4.5), 9))
+        self.assertEqual((score, profile_id), (np.float32(4.5), 9))
+        self.assertEqual(decode_cursor(encode_cursor(-0.1, 2 ** 31 - 1))[1], 2 ** 31 - 1)
+
+    def test_cursor_is_url_safe(self):
+        cursor = encode_cursor(np.float32(-123.456), 65535)
+        self.assertRegex(cursor, r'^[A-Za-z0-9_-]+$')
+
+    def test_invalid_cursor(self):
+        for cursor in ('x', 'not a cursor!', encode_cursor(1.0, 1) + 'AAAA'):
+            with self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_pages_cover_the_list_once(self):
+        served, cursor = [], ''
+        while True:
+            page_ids, cursor = cursor_page(self.profile_ids, self.scores, cursor, 4 if not served else 1)
+            served += page_ids
+            if cursor is None:
+                break
+        self.assertEqual(served, self.profile_ids.tolist())
+
+    def test_seek_after_removed_entry(self):
+        # Profile 9 was handled since the cursor was issued: resume at the next (score, profileID)
+        cursor = encode_cursor(np.float32(4.5), 9)
+        remaining = self.profile_ids != 9
+        self.assertEqual(seek(self.profile_ids[remaining], self.scores[remaining], cursor), 3)
+
+    def test_seek_past_the_end(self):
+        cursor = encode_cursor(np.float32(-5.0), 1)
+        self.assertEqual(seek(self.profile_ids, self.scores, cursor), len(self.profile_ids))
+
+
+def _mmr(relevance, similarity, count, lam):
+    """Greedy MMR recomputed from scratch at every pick."""
+    picks = []
+    while len(picks) < count:
+        best, best_gain = None, -np.inf
+        for i in range(len(relevance)):
+            if i in picks:
+                continue
+            gain = lam * relevance[i] - (1 - lam) * max((similarity[i][j] for j in picks), default=0.0)
+            if gain > best_gain:
+                best, best_gain = i, gain
+        picks.append(best)
+    return picks
+
+
+class DiversityTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(5)
+        vectors = rng.random((40, 12), dtype=np.float32) * (rng.random((40, 12)) < 0.3)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-6)
+        self.vectors = sparse.csr_matrix(vectors.astype(np.float32))
+        self.relevance = np.sort(rng.random(40, dtype=np.float32))[::-1].copy()
+        self.pool_ids = np.arange(100, 140, dtype=np.int64)
+
+    def state(self):
+        return DiversityState(self.pool_ids, self.relevance, self.vectors)
+
+    def test_matches_greedy_mmr(self):
+        state = self.state()
+        self.assertEqual(state.extend(15, 0.6), 15)
+        similarity = (self.vectors @ self.vectors.T).toarray()
+        self.assertEqual(state.picks.tolist(), _mmr(self.relevance, similarity, 15, 0.6))
+
+    def test_lambda_one_keeps_score_order(self):
+        state = self.state()
+        state.extend(10, 1.0)
+        self.assertEqual(state.picks.tolist(), list(range(10)))
+
+    def test_near_duplicate_moves_down(self):
+        vectors = sparse.csr_matrix(np.array([[1, 0], [1, 0], [0, 1]], dtype=np.float32))
+        state = DiversityState(np.array([1, 2, 3]), np.array([1.0, 0.9, 0.8], dtype=np.float32), vectors)
+        state.extend(3, 0.5)
+        self.assertEqual(state.picks.tolist(), [0, 2, 1])
+
+    def test_pages_continue_the_picks(self):
+        whole = self.state()
+        whole.extend(20, 0.6)
+        paged = self.state()
+        for upto in (5, 10, 20):
+            paged.extend(upto, 0.6)
+        self.assertEqual(paged.picks.tolist(), whole.picks.tolist())
+        self.assertEqual(paged.extend(20, 0.6), 0)
+
+    def test_extend_stops_at_the_pool(self):
+        state = self.state()
+        self.assertEqual(state.extend(100, 0.6), 40)
+        self.assertEqual(sorted(state.picks.tolist()), list(range(40)))
+
+    def test_served_order(self):
+        state = self.state()
+        state.extend(5, 0.3)
+        profile_ids = np.concatenate((self.pool_ids, [500, 501]))
+        scores = np.concatenate((self.relevance, [-1.0, -2.0])).astype(np.float32)
+        served_ids, served_scores = state.served(profile_ids, scores)
+        picks = state.picks.tolist()
+        rest = [i for i in range(40) if i not in picks]
+        self.assertEqual(served_ids.tolist(), self.pool_ids[picks + rest].tolist() + [500, 501])
+        self.assertEqual(served_scores.tolist(), scores[picks + rest + [40, 41]].tolist())
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_save_and_load_continue(self):
+        cache.clear()
+        whole = self.state()
+        whole.extend(12, 0.6)
+        state = self.state()
+        state.extend(6, 0.6)
+        state.save(1)
+        loaded = DiversityState.load(1)
+        self.assertEqual(loaded.picks.tolist(), state.picks.tolist())
+        loaded.extend(12, 0.6)
+        self.assertEqual(loaded.picks.tolist(), whole.picks.tolist())
+
+
+class TransitionOutcomeTests(SimpleTestCase):
+    def outcome(self, candidate_status, startup_status, is_matched=False, written=False, inserted=False,
+                from_startup=False):
+        return transitions._outcome(
+            (candidate_status, startup_status, is_matched, written, inserted), from_startup
+        )
+
+    def test_written(self):
+        self.assertEqual(self.outcome('accepted', 'pending', written=True, inserted=True), transitions.REQUESTED)
+        self.assertEqual(self.outcome('accepted', 'accepted', True, written=True), transitions.CONNECTED)
+        self.assertEqual(self.outcome('rejected', 'pending', written=True, inserted=True), transitions.DECLINED)
+        self.assertEqual(
+            self.outcome('accepted', 'rejected', written=True, from_startup=True), transitions.DECLINED
+        )
+
+    def test_refused(self):
+        self.assertEqual(self.outcome('accepted', 'accepted', True), transitions.ALREADY_CONNECTED)
+        self.assertEqual(self.outcome('accepted', 'rejected'), transitions.REJECTED)
+        self.assertEqual(self.outcome('accepted', 'pending'), transitions.PENDING)
+        self.assertEqual(self.outcome('rejected', 'accepted', from_startup=True), transitions.REJECTED)
+        self.assertEqual(self.outcome('rejected', 'pending'), transitions.PENDING)
+        self.assertEqual(self.outcome('pending', 'accepted'), transitions.INVALID_STATUS)
+
+
+class FakeCursor:
+    def __init__(self, results):
+        self.results = list(results)
+        self.executed = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, sql, params):
+        self.executed.append(params)
+
+    def fetchall(self):
+        return self.results.pop(0)
+
+
+class TransitionRetryTests(SimpleTestCase):
+    def apply(self, results, pairs):
+        cursor = FakeCursor(results)
+        with mock.patch.object(transitions, 'connection') as fake_connection, \
+                mock.patch.object(transitions.transaction, 'atomic', contextlib.nullcontext), \
+                mock.patch.object(transitions, 'matchings_written') as written:
+            fake_connection.cursor.return_value = cursor
+            return transitions.apply(False, pairs), cursor.executed, written
+
+    def test_retries_pairs_missing_from_the_first_pass(self):
+        # The row for (1, 3) was committed by another request after the statement's snapshot
+        results, executed, written = self.apply([
+            [(1, 2, 'accepted', 'pending', False, True, True)],
+            [(1, 3, 'accepted', 'accepted', True, True, False)],
+        ], [(1, 2, 'accepted'), (1, 3, 'accepted')])
+        self.assertEqual([params['startup_ids'] for params in executed], [[2, 3], [3]])
+        self.assertEqual(results, {
+            (1, 2): (transitions.REQUESTED, 'pending'),
+            (1, 3): (transitions.CONNECTED, 'accepted'),
+        })
+        written.assert_called_once_with([(1, 2, 'accepted', 'pending'), (1, 3, 'accepted', 'accepted')])
+
+    def test_no_retry_when_every_pair_is_returned(self):
+        results, executed, written = self.apply([
+            [(1, 2, 'accepted', 'rejected', False, False, False)],
+        ], [(1, 2, 'accepted')])
+        self.assertEqual(len(executed), 1)
+        self.assertEqual(results, {(1, 2): (transitions.REJECTED, 'rejected')})
+        written.assert_called_once_with([])
+
+    def test_at_most_two_passes(self):
+        results, executed, _ = self.apply([[], []], [(1, 2, 'accepted')])
+        self.assertEqual(len(executed), 2)
+        self.assertEqual(results, {})
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'The upsert is PostgreSQL SQL')
+class TransitionUpsertTests(TestCase):
+    def setUp(self):
+        # The Matching model is unmanaged: create the table the way foundermatchingdb.sql does
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                DO $$ BEGIN
+                    CREATE TYPE "match_status" AS ENUM ('pending', 'accepted', 'rejected');
+                EXCEPTION WHEN duplicate_object THEN NULL;
+                END $$;
+                CREATE TABLE IF NOT EXISTS "Matching" (
+                  "ID" SERIAL PRIMARY KEY,
+                  "CandidateProfileID" integer NOT NULL,
+                  "StartupProfileID" integer NOT NULL,
+                  "CandidateStatus" match_status NOT NULL DEFAULT 'pending',
+                  "StartupStatus" match_status NOT NULL DEFAULT 'pending',
+                  "IsMatched" boolean NOT NULL DEFAULT false,
+                  "MatchDate" timestamp DEFAULT CURRENT_TIMESTAMP,
+                  "CandidateNotification" integer,
+                  "StartupNotification" integer
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS "Matching_Candidate_Startup_key"
+                ON "Matching" ("CandidateProfileID", "StartupProfileID");
+            """)
+        patcher = mock.patch.object(transitions, 'matchings_written')
+        self.written = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def row(self, candidate_id, startup_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT "CandidateStatus"::text, "StartupStatus"::text, "IsMatched" FROM "Matching"'
+                ' WHERE "CandidateProfileID" = %s AND "StartupProfileID" = %s',
+                [candidate_id, startup_id]
+            )
+            return cursor.fetchall()
+
+    def test_request_then_connect(self):
+        self.assertEqual(transitions.connect(1, 2, False), (transitions.REQUESTED, 'pending'))
+        self.assertEqual(self.row(1, 2), [('accepted', 'pending', False)])
+        self.assertEqual(transitions.connect(1, 2, True), (transitions.CONNECTED, 'accepted'))
+        self.assertEqual(self.row(1, 2), [('accepted', 'accepted', True)])
+        self.assertEqual(transitions.connect(1, 2, True), (transitions.ALREADY_CONNECTED, 'accepted'))
+        self.assertEqual(transitions.connect(1, 2, False), (transitions.ALREADY_CONNECTED, 'accepted'))
+
+    def test_refused_requests_leave_the_row(self):
+        transitions.connect(1, 2, False)
+        self.assertEqual(transitions.connect(1, 2, False), (transitions.PENDING, 'pending'))
+        self.assertEqual(
+            transitions.apply(True, [(1, 3, 'rejected')]), {(1, 3): (transitions.DECLINED, 'pending')}
+        )
+        self.assertEqual(transitions.connect(1, 3, False), (transitions.REJECTED, 'rejected'))
+        self.assertEqual(self.row(1, 3), [('pending', 'rejected', False)])
+
+    def test_batch(self):
+        transitions.connect(1, 2, True)
+        transitions.connect(3, 2, True)
+        transitions.connect(3, 2, False)
+        results = transitions.apply(False, [(1, 2, 'accepted'), (3, 2, 'accepted'), (4, 2, 'rejected')])
+        self.assertEqual(results, {
+            (1, 2): (transitions.CONNECTED, 'accepted'),
+            (3, 2): (transitions.ALREADY_CONNECTED, 'accepted'),
+            (4, 2): (transitions.DECLINED, 'pending'),
+        })
+        self.assertEqual(
+            sorted(self.written.call_args.args[0]),
+            [(1, 2, 'accepted', 'accepted'), (4, 2, 'rejected', 'pending')]
+        )
+
+
+class BatchConnectTests(SimpleTestCase):
+    def post(self, items, targets, applied):
+        request = APIRequestFactory().post('/discover/connect/batch/', {'fromID': 11, 'items': items}, format='json')
+        force_authenticate(request, user=mock.Mock(username='user_1'))
+        request.identity = IdentityContext(mock.Mock(userID=1), {11: False})
+        with mock.patch.object(views.Profile.objects, 'filter') as profiles, \
+                mock.patch.object(transitions, 'apply', return_value=applied) as apply:
+            profiles.return_value.values_list.return_value = targets
+            response = views.BatchConnectView.as_view()(request)
+        return response, apply
+
+    def test_partial_failure(self):
+        response, apply = self.post([
+            {'toID': 7, 'action': 'connect'},
+            {'toID': 8, 'action': 'connect'},
+            {'toID': 9, 'action': 'connect'},
+            {'toID': 'x', 'action': 'connect'},
+            {'toID': 11, 'action': 'connect'},
+            {'toID': 10, 'action': 'wave'},
+            {'toID': 12, 'action': 'connect'},
+            {'toID': 12, 'action': 'reject'},
+            {'toID': 13, 'action': 'accept'},
+        ], [(7, True), (8, False), (12, True), (13, True)], {
+            (11, 7): (transitions.REQUESTED, 'pending'),
+            (11, 12): (transitions.DECLINED, 'pending'),
+            (11, 13): (transitions.ALREADY_CONNECTED, 'accepted'),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['outcome'] for result in response.data['results']], [
+            transitions.REQUESTED, 'invalid_target', 'not_found', 'invalid_target', 'invalid_target',
+            'invalid_action', 'superseded', transitions.DECLINED, transitions.ALREADY_CONNECTED,
+        ])
+        apply.assert_called_once_with(False, [(11, 7, 'accepted'), (11, 12, 'rejected'), (11, 13, 'accepted')])
+
+    def test_not_owned(self):
+        request = APIRequestFactory().post('/discover/connect/batch/', {'fromID': 5, 'items': [{'toID': 7}]}, format='json')
+        force_authenticate(request, user=mock.Mock(username='user_1'))
+        request.identity = IdentityContext(mock.Mock(userID=1), {11: False})
+        response = views.BatchConnectView.as_view()(request)
+        self.assertEqual(response.status_code, 403)
+
+    def test_too_many_items(self):
+        response, apply = self.post([{'toID': 7, 'action': 'connect'}] * 101, [], {})
+        self.assertEqual(response.status_code, 400)
+        apply.assert_not_called()
+
+
+class MatchingWrittenTests(SimpleTestCase):
+    def setUp(self):
+        self.callbacks = []
+        for target, kwargs in (
+            (signals.transaction, {'on_commit': self.callbacks.append}),
+            (signals.snapshots, {'invalidate': mock.DEFAULT}),
+            (signals.seen, {'mark_seen': mock.DEFAULT}),
+        ):
+            patcher = mock.patch.multiple(target, **kwargs)
+            patched = patcher.start()
+            self.addCleanup(patcher.stop)
+            if 'invalidate' in patched:
+                self.invalidate = patched['invalidate']
+
+    def commit(self):
+        for callback in self.callbacks:
+            callback()
+
+    def test_snapshots_dropped_after_commit(self):
+        signals.matchings_written([(1, 2, 'accepted', 'pending'), (1, 3, 'rejected', 'pending')])
+        self.invalidate.assert_not_called()
+        self.commit()
+        self.assertEqual(set(self.invalidate.call_args.args), {1, 2, 3})
+        signals.seen.mark_seen.assert_called_once_with(1, 2, 3)
+
+    def test_single_row_after_commit(self):
+        signals.matching_written(1, 2, 'accepted', 'accepted')
+        self.invalidate.assert_not_called()
+        self.commit()
+        self.invalidate.assert_called_once_with(1, 2)
@@ -0,0 +1,253 @@
+"""
+BM25 text relevance for discover.
+
+Every profile has two documents: its own free text (description, slogan,
+about us, statement, hobbies, education and experience descriptions) and the
+descriptions of its open job positions. Both are kept as sparse
+term-document matrices with BM25 weights, so scoring a viewer against every
+profile is one sparse matrix-vector product.
+
+Profiles are re-tokenized only when they change; the matrices are then
+reassembled from the cached per-document term counts with array operations.
+"""
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+from profiles.signals import PROFILE_TEXT_FIELDS
+from .indexes import VersionedIndex
+from .models import Profile, Experience, JobPosition
+from .scoring import Signal
+
+VERSION_CACHE_KEY = 'discover:text_corpus:version'
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#]*")
+STOP_WORDS = frozenset("""
+    a an and are as at be but by for from has have i in is it its of on or our
+    that the their this to was we were will with you your
+""".split())
+
+_NO_TERMS = (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOP_WORDS and len(token) > 1]
+
+
+def _load_texts(profile_id=None):
+    """``{profileID: (profile_text, job_text)}``, in three queries."""
+    profiles = Profile.objects.all()
+    experiences = Experience.objects.exclude(description__isnull=True)
+    jobs = JobPosition.objects.filter(isOpening=True).exclude(description__isnull=True)
+    if profile_id is not None:
+        profiles = profiles.filter(profileID=profile_id)
+        experiences = experiences.filter(profileOwner=profile_id)
+        jobs = jobs.filter(profileOwner=profile_id)
+
+    profile_texts = {
+        row[0]: [value for value in row[1:] if value]
+        for row in profiles.values_list('profileID', *PROFILE_TEXT_FIELDS)
+    }
+    job_texts = {owner_id: [] for owner_id in profile_texts}
+    for owner_id, description in experiences.values_list('profileOwner', 'description'):
+        profile_texts.setdefault(owner_id, []).append(description)
+    for owner_id, description in jobs.values_list('profileOwner', 'description'):
+        job_texts.setdefault(owner_id, []).append(description)
+    return {
+        owner_id: (' '.join(texts), ' '.join(job_texts.get(owner_id, ())))
+        for owner_id, texts in profile_texts.items()
+    }
+
+
+class TextCorpus:
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocabulary = {}
+        # profileID -> ((terms, counts) of the profile text, (terms, counts) of the job text)
+        self._documents = {}
+        self._matrices = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, **kwargs):
+        corpus = cls(**kwargs)
+        for profile_id, (profile_text, job_text) in _load_texts().items():
+            corpus.set_documents(profile_id, profile_text, job_text)
+        return corpus
+
+    def _vectorize(self, text):
+        counts = Counter(tokenize(text))
+        if not counts:
+            return _NO_TERMS
+        terms = np.array(
+            [self.vocabulary.setdefault(token, len(self.vocabulary)) for token in counts],
+            dtype=np.int32,
+        )
+        return terms, np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+
+    def set_documents(self, profile_id, profile_text, job_text):
+        with self._lock:
+            self._documents[int(profile_id)] = (self._vectorize(profile_text), self._vectorize(job_text))
+            self._matrices = None
+
+    def remove(self, profile_id):
+        with self._lock:
+            if self._documents.pop(int(profile_id), None) is not None:
+                self._matrices = None
+
+    def _bm25(self, documents, n_terms):
+        """BM25-weighted (documents x terms) matrix and the BM25 weight bound of each term."""
+        lengths = np.array([len(terms) for terms, _ in documents], dtype=np.int64)
+        indptr = np.concatenate(([0], np.cumsum(lengths)))
+        indices = np.concatenate([terms for terms, _ in documents] or [_NO_TERMS[0]])
+        tf = np.concatenate([counts for _, counts in documents] or [_NO_TERMS[1]])
+
+        doc_length = np.bincount(
+            np.repeat(np.arange(len(documents)), lengths), weights=tf, minlength=len(documents)
+        )
+        average_length = doc_length[lengths > 0].mean() if (lengths > 0).any() else 1.0
+        n_docs = max(int((lengths > 0).sum()), 1)
+        df = np.bincount(indices, minlength=n_terms)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        norm = self.k1 * (1 - self.b + self.b * np.repeat(doc_length, lengths) / average_length)
+        weights = idf[indices] * tf * (self.k1 + 1) / (tf + norm)
+        matrix = sparse.csr_matrix(
+            (weights.astype(np.float32), indices, indptr), shape=(len(documents), n_terms)
+        )
+        # A term's weight approaches idf * (k1 + 1) as its frequency grows
+        return matrix, idf * np.float32(self.k1 + 1)
+
+    def matrices(self):
+        """
+        ``(profile_ids, profile_text_bm25, job_text_bm25, profile_text_bound,
+        job_text_bound)``; matrix rows are aligned with ``profile_ids``.
+        """
+        matrices = self._matrices
+        if matrices is not None:
+            return matrices
+        with self._lock:
+            if self._matrices is None:
+                profile_ids = np.array(sorted(self._documents), dtype=np.int64)
+                documents = [self._documents[profile_id] for profile_id in profile_ids.tolist()]
+                n_terms = len(self.vocabulary)
+                profile_matrix, profile_bound = self._bm25([profile_doc for profile_doc, _ in documents], n_terms)
+                job_matrix, job_bound = self._bm25([job_doc for _, job_doc in documents], n_terms)
+                self._matrices = (profile_ids, profile_matrix, job_matrix, profile_bound, job_bound)
+            return self._matrices
+
+    def query_vector(self, profile_id, job_text=False):
+        """Binary term vector of one of the profile's documents."""
+        document = self._documents.get(int(profile_id))
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        if document is not None:
+            vector[document[1 if job_text else 0][0]] = 1.0
+        return vector
+
+    @staticmethod
+    def _normalize(raw, bound):
+        return np.divide(raw, bound, out=np.zeros_like(raw, dtype=np.float32), where=bound > 0)
+
+    def score(self, profile_id, is_startup):
+        """
+        BM25 scores in [0, 1] of every profile against the viewer, aligned
+        with the ``profile_ids`` of :meth:`matrices`. A startup's open job
+        descriptions are matched against candidates' profile text, and a
+        candidate's profile text against startups' job descriptions. Scores
+        are divided by the highest BM25 score the viewer's query can reach.
+        """
+        profile_ids, profile_matrix, job_matrix, profile_bound, job_bound = self.matrices()
+        if is_startup:
+            matrix, bound, query = profile_matrix, profile_bound, self.query_vector(profile_id, job_text=True)
+        else:
+            matrix, bound, query = job_matrix, job_bound, self.query_vector(profile_id)
+        # Terms added after the matrices were assembled are not in them yet
+        query = query[:matrix.shape[1]]
+        return profile_ids, self._normalize(matrix @ query, np.float32(query @ bound))
+
+    def score_column(self, profile_id):
+        """
+        Every profile's score for ``profile_id`` as the candidate:
+        ``(profile_ids, as_startup_viewer, as_candidate_viewer)``.
+        """
+        profile_ids, profile_matrix, job_matrix, profile_bound, job_bound = self.matrices()
+        row = np.searchsorted(profile_ids, int(profile_id))
+        if row >= len(profile_ids) or profile_ids[row] != int(profile_id):
+            empty = np.zeros(len(profile_ids), dtype=np.float32)
+            return profile_ids, empty, empty
+
+        def binary(matrix):
+            binary = matrix.copy()
+            binary.data[:] = 1.0
+            return binary
+
+        # Startup viewers query with their job text against the candidate's profile text
+        job_queries = binary(job_matrix)
+        as_startup = self._normalize(
+            job_queries @ profile_matrix[row].toarray().ravel(), job_queries @ profile_bound
+        )
+        # Candidate viewers query with their profile text against the candidate's job text
+        profile_queries = binary(profile_matrix)
+        as_candidate = self._normalize(
+            profile_queries @ job_matrix[row].toarray().ravel(), profile_queries @ job_bound
+        )
+        return profile_ids, as_startup, as_candidate
+
+
+class TextRelevanceSignal(Signal):
+    """BM25 relevance between a candidate's profile text and a startup's job descriptions."""
+
+    name = 'text'
+
+    @staticmethod
+    def _align(features, profile_ids, scores):
+        result = np.zeros(len(features), dtype=np.float32)
+        if not len(profile_ids):
+            return result
+        positions = np.minimum(np.searchsorted(profile_ids, features.profile_ids), len(profile_ids) - 1)
+        found = profile_ids[positions] == features.profile_ids
+        result[found] = scores[positions[found]]
+        return result
+
+    def score(self, features, viewer_row):
+        profile_ids, scores = get_text_corpus().score(
+            features.profile_ids[viewer_row], features.is_startup[viewer_row]
+        )
+        return self._align(features, profile_ids, scores)
+
+    def score_column(self, features, candidate_row):
+        profile_ids, as_startup, as_candidate = get_text_corpus().score_column(
+            features.profile_ids[candidate_row]
+        )
+        return np.where(
+            features.is_startup,
+            self._align(features, profile_ids, as_startup),
+            self._align(features, profile_ids, as_candidate),
+        )
+
+
+def _set_profile_texts(corpus, profile_id):
+    texts = _load_texts(profile_id).get(int(profile_id))
+    if texts is None:
+        corpus.remove(profile_id)
+    else:
+        corpus.set_documents(profile_id, *texts)
+
+
+_corpus = VersionedIndex('text_corpus', VERSION_CACHE_KEY, TextCorpus.build)
+
+
+def get_text_corpus():
+    """This worker's corpus; see ``discover.indexes``."""
+    return _corpus.get()
+
+
+def refresh_profile(profile_id):
+    """Re-tokenize one profile in this worker's corpus and signal the other workers."""
+    _corpus.apply(_corpus.bump(), lambda corpus: _set_profile_texts(corpus, profile_id))
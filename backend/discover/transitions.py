@@ -0,0 +1,149 @@
+"""
+Connect and reject requests as set-based Matching state transitions.
+
+``apply`` runs one ``INSERT ... ON CONFLICT DO UPDATE ... RETURNING``
+statement for every (candidate, startup) pair of a request, on the unique
+("CandidateProfileID", "StartupProfileID") index. The requesting side gets
+the action's status (accepted to connect, rejected to reject):
+
+- no row yet: the requester's side is inserted with that status, the other
+  side as pending.
+- a row whose other side already accepted, not yet matched: connecting sets
+  both sides accepted and matches the row.
+- a row not yet matched: rejecting sets the requester's side rejected.
+- anything else: the row is left as it is (the ``DO UPDATE ... WHERE``
+  fails) and returned unchanged by the second half of the statement, so the
+  caller can tell why the request was refused.
+
+Rows are inserted in key order, so concurrent requests lock shared rows in
+the same order: no duplicate row, no lost match and no deadlock. The writes
+bypass the model's signals, so snapshots and seen bitmaps are updated here
+the way ``discover.signals.matching_changed`` does for ORM saves.
+"""
+from datetime import datetime
+
+from django.db import connection, transaction
+
+from .signals import matchings_written
+
+_APPLY_SQL = """
+    WITH input AS (
+        SELECT * FROM unnest(%(candidate_ids)s::integer[], %(startup_ids)s::integer[], %(statuses)s::text[])
+        AS i("CandidateProfileID", "StartupProfileID", "Status")
+    ),
+    upsert AS (
+        INSERT INTO "Matching" AS m (
+            "CandidateProfileID", "StartupProfileID", "CandidateStatus", "StartupStatus", "IsMatched", "MatchDate"
+        )
+        SELECT "CandidateProfileID", "StartupProfileID", {candidate_value}, {startup_value}, false, %(now)s
+        FROM input
+        ORDER BY "CandidateProfileID", "StartupProfileID"
+        ON CONFLICT ("CandidateProfileID", "StartupProfileID") DO UPDATE
+        SET {own} = EXCLUDED.{own},
+            "IsMatched" = EXCLUDED.{own} = 'accepted' AND m.{other} = 'accepted',
+            "MatchDate" = CASE WHEN EXCLUDED.{own} = 'accepted' AND m.{other} = 'accepted'
+                          THEN EXCLUDED."MatchDate" ELSE m."MatchDate" END
+        WHERE NOT m."IsMatched" AND (EXCLUDED.{own} = 'rejected' OR m.{other} = 'accepted')
+        RETURNING m."CandidateProfileID", m."StartupProfileID", m."CandidateStatus"::text,
+            m."StartupStatus"::text, m."IsMatched", true AS written, (m.xmax = 0) AS inserted
+    )
+    SELECT * FROM upsert
+    UNION ALL
+    SELECT m."CandidateProfileID", m."StartupProfileID", m."CandidateStatus"::text,
+        m."StartupStatus"::text, m."IsMatched", false, false
+    FROM "Matching" m
+    JOIN input USING ("CandidateProfileID", "StartupProfileID")
+    WHERE NOT EXISTS (
+        SELECT 1 FROM upsert u
+        WHERE u."CandidateProfileID" = m."CandidateProfileID" AND u."StartupProfileID" = m."StartupProfileID"
+    )
+"""
+
+_SQL_BY_SIDE = {
+    # Requester is the startup: its status comes from the input, the candidate's starts pending
+    True: _APPLY_SQL.format(
+        own='"StartupStatus"', other='"CandidateStatus"',
+        candidate_value="'pending'", startup_value='"Status"::match_status',
+    ),
+    False: _APPLY_SQL.format(
+        own='"CandidateStatus"', other='"StartupStatus"',
+        candidate_value='"Status"::match_status', startup_value="'pending'",
+    ),
+}
+
+# Requester's status for each action
+ACTION_STATUSES = {
+    'connect': 'accepted',
+    'accept': 'accepted',
+    'reject': 'rejected',
+}
+
+# Outcomes of a request
+REQUESTED = 'requested'
+CONNECTED = 'connected'
+DECLINED = 'declined'
+ALREADY_CONNECTED = 'already_connected'
+REJECTED = 'rejected'
+PENDING = 'pending'
+INVALID_STATUS = 'invalid_status'
+
+
+def _outcome(statuses, from_startup):
+    candidate_status, startup_status, is_matched, written, inserted = statuses
+    own_status = startup_status if from_startup else candidate_status
+    if written:
+        if own_status == 'rejected':
+            return DECLINED
+        return REQUESTED if inserted else CONNECTED
+    if is_matched:
+        return ALREADY_CONNECTED
+    return {'rejected': REJECTED, 'pending': PENDING}.get(_counterpart_status(statuses, from_startup), INVALID_STATUS)
+
+
+def _counterpart_status(statuses, from_startup):
+    """Status of the side that did not send the request."""
+    candidate_status, startup_status = statuses[:2]
+    return candidate_status if from_startup else startup_status
+
+
+def apply(from_startup, pairs):
+    """
+    Apply requests from one side: ``pairs`` is ``[(candidate_id, startup_id,
+    status)]`` with distinct pairs. Returns ``{(candidate_id, startup_id):
+    (outcome, counterpart_status)}``, the status being the one the other
+    side had when a request was refused.
+    """
+    sql = _SQL_BY_SIDE[bool(from_startup)]
+    now = datetime.now()
+    rows = []
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            pending = list(pairs)
+            # A second pass for conflicting rows committed after the first statement's snapshot
+            for _ in range(2):
+                if not pending:
+                    break
+                cursor.execute(sql, {
+                    'candidate_ids': [int(candidate_id) for candidate_id, _, _ in pending],
+                    'startup_ids': [int(startup_id) for _, startup_id, _ in pending],
+                    'statuses': [status for _, _, status in pending],
+                    'now': now,
+                })
+                returned = cursor.fetchall()
+                rows.extend(returned)
+                seen_pairs = {(row[0], row[1]) for row in returned}
+                pending = [pair for pair in pending if (pair[0], pair[1]) not in seen_pairs]
+        matchings_written([row[:4] for row in rows if row[5]])
+    return {
+        (row[0], row[1]): (_outcome(row[2:], from_startup), _counterpart_status(row[2:], from_startup))
+        for row in rows
+    }
+
+
+def connect(candidate_id, startup_id, from_startup):
+    """
+    Apply a connect request from one side of the pair. Returns
+    ``(outcome, counterpart_status)``.
+    """
+    results = apply(from_startup, [(candidate_id, startup_id, ACTION_STATUSES['connect'])])
+    return results[(int(candidate_id), int(startup_id))]
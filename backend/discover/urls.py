@@ -2,13 +2,25 @@ from django.urls import path
 from .views import (
     GetConnectionsView,
     DiscoverView,
+    DiscoverProfileSectionsView,
+    DiscoverSimilarView,
+    JobFeedView,
+    SearchView,
     ConnectView,
-    CountViewView
+    BatchConnectView,
+    CountViewView,
+    discover_diagnostics
 )
 
 urlpatterns = [
     path('getConnections/', GetConnectionsView.as_view(), name='get_connections'),
     path('connect/', ConnectView.as_view(), name='connect'),
+    path('connect/batch/', BatchConnectView.as_view(), name='connect_batch'),
     path("discover/", DiscoverView.as_view(), name='discover'),
-    path('countView/', CountViewView.as_view(), name='count_view')
+    path('discover/<int:targetID>/sections/', DiscoverProfileSectionsView.as_view(), name='discover_profile_sections'),
+    path('discover/<int:targetID>/similar/', DiscoverSimilarView.as_view(), name='discover_similar'),
+    path('discover/jobs/', JobFeedView.as_view(), name='discover_jobs'),
+    path('discover/search/', SearchView.as_view(), name='discover_search'),
+    path('countView/', CountViewView.as_view(), name='count_view'),
+    path('discover/diagnostics/', discover_diagnostics, name='discover_diagnostics')
 ] 
\ No newline at end of file
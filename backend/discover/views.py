@@ -1,16 +1,28 @@
-from datetime import datetime
 from multiprocessing.managers import BaseManager
 from django.shortcuts import render
-from rest_framework import status
+from rest_framework import permissions, status
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
-from django.db import transaction
+from django.db import IntegrityError, transaction
 from django.core.files.base import ContentFile
 from django.http import HttpResponse
 from .serializers import ProfileSerializer, ProfilePreviewCardSerializer, TagSerializer
 from .models import Profile, UserAccount, ProfilePrivacySettings, Tags, ProfileTagInstances, Matching, ProfileViews
+from .cards import SECTIONS, SECTION_PRIVACY_FIELDS, is_connected, load_cards, load_job_cards, load_sections
+from .pagination import MAX_PER_PAGE, InvalidCursor, cursor_page, decode_cursor, encode_cursor, estimated_total, seek
+from .incremental import queue_stats
+from .job_index import candidate_terms, get_job_index
+from .minhash import get_minhash_index
+from .facets import InvalidFacetFilter, filter_key, parse_filters
+from .pipeline import DiscoverPipeline, stage_stats
+from .queries import discoverable_profiles
+from .search import normalize_query, search_profiles
+from . import snapshots, transitions
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from accounts.identity import get_identity
 from accounts.middlewares import JWTAuthenticationMiddleware
 import json
 import base64
@@ -32,10 +44,8 @@ class GetConnectionsView(APIView):
         print(request)
 
         try:
-            try:
-                user_account = UserAccount.objects.get(clerkUserID=request.user.username)
-                user_id = user_account.userID
-            except UserAccount.DoesNotExist:
+            identity = get_identity(request)
+            if identity.user_account is None:
                 return Response(
                     {'error': 'User account not found'},
                     status=status.HTTP_404_NOT_FOUND
@@ -54,49 +64,34 @@ class GetConnectionsView(APIView):
                     {'error': 'profileID must be an integer'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            
-
-            # Get profiles owned by this user with prefetched tags
-            profiles = Profile.objects.filter(userID=user_id).prefetch_related(
-                Prefetch(
-                    'tags',
-                    queryset=ProfileTagInstances.objects.select_related('tagID')
-                )
-            )
 
-            if not profiles.exists():
+            if not identity.profiles:
                 return Response(
                     {'error': 'No profiles found for this user'},
                     status=status.HTTP_404_NOT_FOUND
                 )
 
             # Check if profile_id is in the list of profiles owned by this user
-            current_profile : Profile = None
-            for profile in profiles:
-                print(profile.profileID, profile.name)
-                if profile.profileID == profile_id:
-                    current_profile = profile
-                    break
-            else:
+            if not identity.owns(profile_id):
                 return Response(
                     {'error': 'Profile not found or access denied'},
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            if current_profile.isStartup:
+            if identity.is_startup(profile_id):
                 # Get the list of connected profiles in the Matching table satisfying:
-                # startupprofileid = current_profile.profileID
+                # startupprofileid = profile_id
                 connected_profile_ids = Matching.objects.filter(
-                    startupprofileid=current_profile.profileID,
+                    startupprofileid=profile_id,
                     ismatched=True
                 )
                 # Get the array of candidates profiles only:
                 connected_profile_ids = [profile.candidateprofileid_id for profile in connected_profile_ids]
             else:
                 # Get the list of connected profiles in the Matching table satisfying:
-                # candidateprofileid = current_profile.profileID
+                # candidateprofileid = profile_id
                 connected_profile_ids = Matching.objects.filter(
-                    candidateprofileid=current_profile.profileID,
+                    candidateprofileid=profile_id,
                     ismatched=True
                 )
                 # Get the array of startupprofiles only:
@@ -152,12 +147,16 @@ class GetConnectionsView(APIView):
 class DiscoverView(APIView):
     authentication_classes = [JWTAuthenticationMiddleware]
 
+    @staticmethod
+    def _with_timings(response, pipeline):
+        response['Server-Timing'] = pipeline.timings.server_timing()
+        logger.debug(f"Discover pipeline stages: {pipeline.timings.stages}")
+        return response
+
     def get(self, request):
         try:
-            try:
-                user_account = UserAccount.objects.get(clerkUserID=request.user.username)
-                user_id = user_account.userID
-            except UserAccount.DoesNotExist:
+            identity = get_identity(request)
+            if identity.user_account is None:
                 return Response(
                     {'error': 'User account not found'},
                     status=status.HTTP_404_NOT_FOUND
@@ -170,73 +169,93 @@ class DiscoverView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Get pagination parameters
+            # Get pagination parameters; a `cursor` parameter (empty for the
+            # first page) switches to keyset pagination over (score, profileID)
             page = int(request.query_params.get('page', 1))
             per_page = int(request.query_params.get('perPage', 20))
-
-            # Verify profile belongs to user
+            cursor = request.query_params.get('cursor')
+            card_projection = request.query_params.get('projection') == 'card'
+            include_total = request.query_params.get('includeTotal') == 'true'
+            include_facets = request.query_params.get('includeFacets') == 'true'
             try:
-                requesting_profile = Profile.objects.get(profileID=profile_id)
-                if requesting_profile.userID_id != user_id:
+                facet_filters = parse_filters(request.query_params)
+            except InvalidFacetFilter as e:
+                return Response(
+                    {'error': str(e)},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            variant = filter_key(facet_filters)
+            if cursor is not None:
+                per_page = max(1, min(per_page, MAX_PER_PAGE))
+            if cursor:
+                try:
+                    decode_cursor(cursor)
+                except InvalidCursor:
                     return Response(
-                        {'error': 'Profile does not belong to authenticated user'},
-                        status=status.HTTP_403_FORBIDDEN
+                        {'error': 'Invalid cursor'},
+                        status=status.HTTP_400_BAD_REQUEST
                     )
-            except Profile.DoesNotExist:
+
+            # Verify profile belongs to user
+            if not identity.owns(profile_id):
                 return Response(
-                    {'error': 'Profile not found'},
-                    status=status.HTTP_404_NOT_FOUND
+                    {'error': 'Profile does not belong to authenticated user'},
+                    status=status.HTTP_403_FORBIDDEN
                 )
 
-            connected_profile_ids = Matching.objects.filter(
-                Q(candidateprofileid=profile_id, candidatestatus='accepted') |
-                Q(startupprofileid=profile_id, startupstatus='accepted')
-            ).values_list('candidateprofileid', 'startupprofileid')
-            
-            connected_ids = set()
-            for candidate_id, startup_id in connected_profile_ids:
-                connected_ids.add(candidate_id)
-                connected_ids.add(startup_id)
-
-            # Get rejected profile IDs
-            rejected_profile_ids = Matching.objects.filter(
-                Q(candidateprofileid=profile_id, candidatestatus='rejected') |
-                Q(startupprofileid=profile_id, startupstatus='rejected')
-            ).values_list(
-                'candidateprofileid' if requesting_profile.isStartup else 'startupprofileid',
-                flat=True
+            pipeline = DiscoverPipeline(
+                profile_id, identity.user_id, exclude=identity.profile_ids, facet_filters=facet_filters
             )
+            request.discover_timings = pipeline.timings
+
+            # Later pages are served from the feed snapshot taken by the first page
+            first_page = not cursor if cursor is not None else page <= 1
+            snapshot = None
+            if not first_page:
+                with pipeline.timings.stage('snapshot') as counts:
+                    snapshot = snapshots.load(profile_id, variant)
+                    counts['hit'] = int(snapshot is not None)
+            if snapshot is not None:
+                ranked_ids, scores = snapshot
+            else:
+                # Generate candidates, drop handled profiles, rerank the rest
+                ranked_ids, scores = pipeline.ranking()
+                snapshots.store(profile_id, ranked_ids, scores, variant)
 
-            # Get profiles to exclude (own profiles, connected, and rejected)
-            exclude_profiles = set(list(connected_ids) + list(rejected_profile_ids))
-            exclude_profiles.add(int(profile_id))  # Add requesting profile ID
-            user_profile_ids = Profile.objects.filter(userID=user_id).values_list('profileID', flat=True)
-            exclude_profiles.update(user_profile_ids)
-            print("Connected profiles:", connected_ids)
-            print("Rejected profiles:", rejected_profile_ids)
-            print("User profiles:", user_profile_ids)
-            print("=> Excluded profiles:", exclude_profiles)
-
-            # Query for discoverable profiles
-            all_discoverable_profiles = Profile.objects.exclude(
-                profileID__in=exclude_profiles
-            ).prefetch_related(
-                'experiences',
-                'certificates',
-                'achievements',
-                'profileprivacysettings'
-            ).order_by('profileID')  # Add consistent ordering
-
-            # Calculate total count and pagination
-            total_count = all_discoverable_profiles.count()
-            start_index = (page - 1) * per_page
-            end_index = start_index + per_page
+            def page_start(served_ids, served_scores):
+                if cursor is not None:
+                    return seek(served_ids, served_scores, cursor)
+                return (page - 1) * per_page
 
-            # Get the paginated profiles
-            discoverable_profiles = all_discoverable_profiles[start_index:end_index]
+            # Reorder the top of the feed for diversity, extending the picks to this page
+            ranked_ids, scores = pipeline.diversify(ranked_ids, scores, page_start, per_page)
 
-            # Serialize the profiles
-            serializer = ProfileSerializer(discoverable_profiles, many=True)
+            if cursor is not None:
+                page_ids, next_cursor = cursor_page(ranked_ids, scores, cursor, per_page)
+            else:
+                # Calculate total count and pagination
+                total_count = len(ranked_ids)
+                start_index = (page - 1) * per_page
+                end_index = start_index + per_page
+                page_ids = ranked_ids[start_index:end_index].tolist()
+
+            results = pipeline.hydrate(page_ids, card_projection)
+
+            if cursor is not None:
+                response_data = {
+                    'perPage': per_page,
+                    'nextCursor': next_cursor,
+                    'hasNext': next_cursor is not None,
+                    'results': results
+                }
+                if include_total:
+                    # Approximate: cached for a few minutes instead of recounted per page
+                    response_data['total'] = estimated_total(profile_id, lambda: len(ranked_ids), variant)
+                    response_data['totalIsEstimate'] = True
+                if include_facets:
+                    # Counts under the other filters, so selected facets keep their alternatives
+                    response_data['facets'] = pipeline.facet_counts()
+                return self._with_timings(Response(response_data, status=status.HTTP_200_OK), pipeline)
 
             # Prepare paginated response
             response_data = {
@@ -245,10 +264,10 @@ class DiscoverView(APIView):
                 'perPage': per_page,
                 'hasNext': end_index < total_count,
                 'hasPrev': page > 1,
-                'results': serializer.data
+                'results': results
             }
 
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            return self._with_timings(Response(results, status=status.HTTP_200_OK), pipeline)
 
         except Exception as e:
             logger.error(f"Error in discover view: {str(e)}")
@@ -257,6 +276,267 @@ class DiscoverView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class DiscoverProfileSectionsView(APIView):
+    """Nested sections of a discover card, loaded when the card is opened."""
+    authentication_classes = [JWTAuthenticationMiddleware]
+
+    def get(self, request, targetID):
+        try:
+            identity = get_identity(request)
+            if identity.user_account is None:
+                return Response(
+                    {'error': 'User account not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            profile_id = request.query_params.get('profileID')
+            if not profile_id:
+                return Response(
+                    {'error': 'profileID is required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            if not identity.owns(profile_id):
+                return Response(
+                    {'error': 'Profile does not belong to authenticated user'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+
+            requested = request.query_params.get('sections')
+            sections = [section for section in requested.split(',') if section] if requested else list(SECTIONS)
+            unknown = [section for section in sections if section not in SECTIONS]
+            if unknown:
+                return Response(
+                    {'error': f'Unknown sections: {", ".join(unknown)}'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            target = Profile.objects.filter(profileID=targetID).values('profileID').first()
+            if target is None:
+                return Response(
+                    {'error': 'Profile not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            privacy_fields = [field for field in SECTION_PRIVACY_FIELDS.values() if field]
+            privacy_settings = ProfilePrivacySettings.objects.filter(
+                profileID=targetID
+            ).values(*privacy_fields).first() or {}
+
+            data = {'profileID': targetID}
+            data.update(load_sections(
+                targetID,
+                sections,
+                privacy_settings,
+                connected=is_connected(profile_id, targetID)
+            ))
+            return Response(data, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error(f"Error in discover sections view: {str(e)}")
+            return Response(
+                {'error': 'An unexpected error occurred'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class DiscoverSimilarView(APIView):
+    """More like this: discoverable profiles whose tags resemble the target's."""
+    authentication_classes = [JWTAuthenticationMiddleware]
+
+    def get(self, request, targetID):
+        try:
+            identity = get_identity(request)
+            if identity.user_account is None:
+                return Response(
+                    {'error': 'User account not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            profile_id = request.query_params.get('profileID')
+            if not profile_id:
+                return Response(
+                    {'error': 'profileID is required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            limit = max(1, min(int(request.query_params.get('limit', 20)), MAX_PER_PAGE))
+
+            if not identity.owns(profile_id):
+                return Response(
+                    {'error': 'Profile does not belong to authenticated user'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+
+            similar_ids, similarity = get_minhash_index().similar_to(
+                targetID,
+                # Leave room for profiles the viewer already handled
+                limit=limit * 3,
+                exclude=identity.profile_ids
+            )
+            similarity_by_id = dict(zip(similar_ids.tolist(), similarity.tolist()))
+            visible = set(discoverable_profiles(profile_id, identity.user_id).filter(
+                profileID__in=similarity_by_id
+            ).values_list('profileID', flat=True))
+            page_ids = [pid for pid in similar_ids.tolist() if pid in visible][:limit]
+
+            results = load_cards(page_ids)
+            for card in results:
+                card['similarity'] = round(similarity_by_id[card['profileID']], 3)
+            return Response(
+                {'profileID': targetID, 'results': results},
+                status=status.HTTP_200_OK
+            )
+
+        except Exception as e:
+            logger.error(f"Error in discover similar view: {str(e)}")
+            return Response(
+                {'error': 'An unexpected error occurred'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class JobFeedView(APIView):
+    """Open job positions ranked for a candidate profile, with the startup's card."""
+    authentication_classes = [JWTAuthenticationMiddleware]
+
+    def get(self, request):
+        try:
+            identity = get_identity(request)
+            if identity.user_account is None:
+                return Response(
+                    {'error': 'User account not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            profile_id = request.query_params.get('profileID')
+            if not profile_id:
+                return Response(
+                    {'error': 'profileID is required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            cursor = request.query_params.get('cursor', '')
+            per_page = max(1, min(int(request.query_params.get('perPage', 20)), MAX_PER_PAGE))
+            if cursor:
+                try:
+                    decode_cursor(cursor)
+                except InvalidCursor:
+                    return Response(
+                        {'error': 'Invalid cursor'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+            if not identity.owns(profile_id):
+                return Response(
+                    {'error': 'Profile does not belong to authenticated user'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            if identity.is_startup(profile_id):
+                return Response(
+                    {'error': 'The job feed is only available for candidate profiles'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            tag_ids, role_tokens, country = candidate_terms(profile_id)
+            job_ids, _, scores = get_job_index().score(
+                tag_ids, role_tokens, country, exclude_owners=identity.profile_ids
+            )
+            page_ids, next_cursor = cursor_page(job_ids, scores, cursor, per_page)
+            start = seek(job_ids, scores, cursor)
+            score_by_id = dict(zip(page_ids, scores[start:start + len(page_ids)].tolist()))
+
+            results = load_job_cards(page_ids)
+            for job in results:
+                job['score'] = round(score_by_id[job['jobPositionID']], 3)
+            return Response({
+                'perPage': per_page,
+                'nextCursor': next_cursor,
+                'hasNext': next_cursor is not None,
+                'results': results
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error(f"Error in job feed view: {str(e)}")
+            return Response(
+                {'error': 'An unexpected error occurred'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+class SearchView(APIView):
+    """Profiles matching a text query, best match first, as discover cards."""
+    authentication_classes = [JWTAuthenticationMiddleware]
+
+    def get(self, request):
+        try:
+            identity = get_identity(request)
+            if identity.user_account is None:
+                return Response(
+                    {'error': 'User account not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            profile_id = request.query_params.get('profileID')
+            q = normalize_query(request.query_params.get('q'))
+            if not profile_id or not q:
+                return Response(
+                    {'error': 'profileID and q are required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            cursor = request.query_params.get('cursor', '')
+            per_page = max(1, min(int(request.query_params.get('perPage', 20)), MAX_PER_PAGE))
+            after = None
+            if cursor:
+                try:
+                    after = decode_cursor(cursor)
+                except InvalidCursor:
+                    return Response(
+                        {'error': 'Invalid cursor'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+
+            if not identity.owns(profile_id):
+                return Response(
+                    {'error': 'Profile does not belong to authenticated user'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+
+            # One extra row tells whether there is a next page
+            matches = search_profiles(q, profile_id, identity.user_id, per_page + 1, after=after)
+            has_next = len(matches) > per_page
+            matches = matches[:per_page]
+            next_cursor = encode_cursor(*matches[-1][::-1]) if has_next else None
+
+            score_by_id = dict(matches)
+            results = load_cards([match_id for match_id, _ in matches])
+            for card in results:
+                card['score'] = round(score_by_id[card['profileID']], 3)
+            return Response({
+                'query': q,
+                'perPage': per_page,
+                'nextCursor': next_cursor,
+                'hasNext': has_next,
+                'results': results
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error(f"Error in search view: {str(e)}")
+            return Response(
+                {'error': 'An unexpected error occurred'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def discover_diagnostics(request):
+    """
+    Incremental re-scoring queue, drained by `manage.py rescore_matches`
+    """
+    return Response({
+        "servePrecomputed": getattr(settings, 'DISCOVER_SERVE_PRECOMPUTED', False),
+        "rescoreQueue": queue_stats(),
+        "pipelineStages": stage_stats.snapshot(),
+    })
+
+
 class ConnectView(APIView):
     def post(self, request):
         """
@@ -372,42 +652,26 @@ class ConnectView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 ) 
 
-            try:
-                user_account = UserAccount.objects.get(clerkUserID=request.user.username)
-                user_id = user_account.userID
-            except UserAccount.DoesNotExist:
+            identity = get_identity(request)
+            if identity.user_account is None:
                 return Response(
                     {'error': 'User account not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            
-            # Get profiles owned by this user with prefetched tags
-            profiles = Profile.objects.filter(userID=user_id).prefetch_related(
-                Prefetch(
-                    'tags',
-                    queryset=ProfileTagInstances.objects.select_related('tagID')
-                )
-            )
-
-            if not profiles.exists():
+            if not identity.profiles:
                 return Response(
                     {'error': 'No profiles found for this user'},
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            # Check if profile_id is in the list of profiles owned by this user
-            current_profile : Profile = None
-            for profile in profiles:
-                if profile.profileID == from_id:
-                    current_profile = profile
-                    is_startup = current_profile.isStartup
-                    break
-            else:
+            # Check if from_id is in the list of profiles owned by this user
+            if not identity.owns(from_id):
                 return Response(
                     {'error': 'Profile not found or access denied'},
                     status=status.HTTP_403_FORBIDDEN
                 )
+            is_startup = identity.is_startup(from_id)
 
             if is_startup:
                 startup_id = from_id
@@ -416,91 +680,50 @@ class ConnectView(APIView):
                 startup_id = to_id
                 candidate_id = from_id
 
-            # Check if toID exists in the profile table
-            to_profile = Profile.objects.filter(profileID=to_id).first()
-            if not to_profile:
+            # One INSERT ... ON CONFLICT DO UPDATE on the (candidate, startup) pair
+            try:
+                outcome, counterpart_status = transitions.connect(candidate_id, startup_id, from_startup=is_startup)
+            except IntegrityError:
+                # Foreign key violation: toID is not a profile
                 return Response(
                     {'error': 'Profile to connect to is not found.'},
                     status=status.HTTP_404_NOT_FOUND
                 )
 
-            currentdatetime = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            print("Current datetime: %s" % currentdatetime)
-
-            # Check the connection status startup_id -> candidate_id in the Matching table
-            matching = Matching.objects.filter(candidateprofileid_id=candidate_id, startupprofileid_id=startup_id).first()
-            if matching:
-                if matching.ismatched:
-                    return Response(
-                        {'error': 'Connection request is denied: Already connected.'},
-                        status=status.HTTP_409_CONFLICT
-                    )
-                else:
-                    if is_startup:
-                        if matching.candidatestatus == 'accepted':
-                            matching.candidatestatus = 'accepted'
-                            matching.startupstatus = 'accepted'
-                            matching.ismatched = True
-                            matching.matchdate = currentdatetime
-                            matching.save()
-                            return Response(
-                                {'message': 'Connection request sent successfully. You are now connected with this profile.'},
-                                status=status.HTTP_200_OK
-                            )
-                        elif matching.candidatestatus == 'rejected':
-                            return Response(
-                                {'error': 'Connection request is denied: Candidate rejected your request.'},
-                                status=status.HTTP_409_CONFLICT
-                            )
-                        elif matching.candidatestatus == 'pending':
-                            return Response(
-                                {'error': 'Connection request is denied: Pending acceptance from recipient.'},
-                                status=status.HTTP_409_CONFLICT
-                            )
-                        else:
-                            return Response(
-                                {'error': 'Bad database value for candidatestatus: %s' % matching.candidatestatus},
-                                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                            )
-                    else:
-                        if matching.startupstatus == 'accepted':
-                            matching.candidatestatus = 'accepted'
-                            matching.startupstatus = 'accepted'
-                            matching.ismatched = True
-                            matching.matchdate = currentdatetime
-                            matching.save()
-                            return Response(
-                                {'message': 'Connection request sent successfully. You are now connected with this profile.'},
-                                status=status.HTTP_200_OK
-                            )
-                        elif matching.startupstatus == 'rejected':
-                            return Response(
-                                {'error': 'Connection request is denied: Startup rejected your request.'},
-                                status=status.HTTP_409_CONFLICT
-                            )
-                        elif matching.startupstatus == 'pending':
-                            return Response(
-                                {'error': 'Connection request is denied: Pending acceptance from recipient.'},
-                                status=status.HTTP_409_CONFLICT
-                            )
-                        else:
-                            return Response(
-                                {'error': 'Bad database value for startupstatus: %s' % matching.startupstatus},
-                                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                            )
-            else:
-                if is_startup:
-                    matching = Matching(candidateprofileid_id=candidate_id, startupprofileid_id=startup_id, candidatestatus='pending', startupstatus='accepted')
-                else:
-                    matching = Matching(candidateprofileid_id=candidate_id, startupprofileid_id=startup_id, candidatestatus='accepted', startupstatus='pending')
-                matching.ismatched = False
-                matching.matchdate = currentdatetime
-                matching.save()
+            if outcome == transitions.REQUESTED:
                 return Response(
                     {'message': 'Connection request sent successfully. Waiting for approval.'},
                     status=status.HTTP_200_OK
                 )
-            
+            if outcome == transitions.CONNECTED:
+                return Response(
+                    {'message': 'Connection request sent successfully. You are now connected with this profile.'},
+                    status=status.HTTP_200_OK
+                )
+            if outcome == transitions.ALREADY_CONNECTED:
+                return Response(
+                    {'error': 'Connection request is denied: Already connected.'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if outcome == transitions.REJECTED:
+                return Response(
+                    {'error': 'Connection request is denied: %s rejected your request.' % (
+                        'Candidate' if is_startup else 'Startup'
+                    )},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if outcome == transitions.PENDING:
+                return Response(
+                    {'error': 'Connection request is denied: Pending acceptance from recipient.'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return Response(
+                {'error': 'Bad database value for %s: %s' % (
+                    'candidatestatus' if is_startup else 'startupstatus', counterpart_status
+                )},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
         except Exception as e:
             logger.error(f"Error in discover view: {str(e)}")
             return Response(
@@ -508,15 +731,116 @@ class ConnectView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class BatchConnectView(APIView):
+    """
+    Apply queued swipes of one profile in a single request.
+
+    Body: ``{"fromID": 11, "items": [{"toID": 7, "action": "connect"}, ...]}``
+    with actions ``connect``, ``accept`` (the same transition, answering a
+    request) and ``reject``. Ownership is checked once, targets are loaded in
+    one query and every transition runs in one statement
+    (``transitions.apply``). Results come back per item, in order; when a
+    toID repeats, its last item is applied and earlier ones are superseded.
+    """
+    authentication_classes = [JWTAuthenticationMiddleware]
+    parser_classes = (JSONParser,)
+    MAX_ITEMS = 100
+
+    def post(self, request):
+        try:
+            from_id = request.data.get('fromID')
+            items = request.data.get('items')
+            if not from_id or not isinstance(items, list) or not items:
+                return Response(
+                    {'error': 'fromID and a non-empty items list are required'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if len(items) > self.MAX_ITEMS:
+                return Response(
+                    {'error': f'At most {self.MAX_ITEMS} items per request'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                from_id = int(from_id)
+            except (TypeError, ValueError):
+                return Response(
+                    {'error': 'fromID must be an integer'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            identity = get_identity(request)
+            if identity.user_account is None:
+                return Response(
+                    {'error': 'User account not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            if not identity.owns(from_id):
+                return Response(
+                    {'error': 'Profile not found or access denied'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            is_startup = identity.is_startup(from_id)
+
+            results = []
+            last_item = {}
+            for position, item in enumerate(items):
+                to_id = item.get('toID') if isinstance(item, dict) else None
+                action = item.get('action') if isinstance(item, dict) else None
+                try:
+                    to_id = int(to_id)
+                except (TypeError, ValueError):
+                    to_id = None
+                results.append({'toID': to_id, 'action': action, 'outcome': None})
+                if to_id is None or to_id == from_id:
+                    results[-1]['outcome'] = 'invalid_target'
+                elif action not in transitions.ACTION_STATUSES:
+                    results[-1]['outcome'] = 'invalid_action'
+                else:
+                    last_item[to_id] = position
+
+            # One query for every target; a pair needs one startup and one candidate
+            target_is_startup = dict(
+                Profile.objects.filter(profileID__in=list(last_item)).values_list('profileID', 'isStartup')
+            )
+            pairs = {}
+            for position, result in enumerate(results):
+                to_id = result['toID']
+                if result['outcome'] is not None:
+                    continue
+                if last_item[to_id] != position:
+                    result['outcome'] = 'superseded'
+                elif to_id not in target_is_startup:
+                    result['outcome'] = 'not_found'
+                elif target_is_startup[to_id] == is_startup:
+                    result['outcome'] = 'invalid_target'
+                else:
+                    pair = (to_id, from_id) if is_startup else (from_id, to_id)
+                    pairs[pair] = position
+
+            applied = transitions.apply(
+                is_startup,
+                [(*pair, transitions.ACTION_STATUSES[results[position]['action']]) for pair, position in pairs.items()]
+            )
+            for pair, position in pairs.items():
+                results[position]['outcome'], _ = applied[pair]
+
+            return Response({'fromID': from_id, 'results': results}, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            logger.error(f"Error in batch connect view: {str(e)}")
+            return Response(
+                {'error': 'An unexpected error occurred'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
 class CountViewView(APIView):
     authentication_classes = [JWTAuthenticationMiddleware]
 
     def post(self, request):
         try:
             # Get authenticated user
-            try:
-                user_account = UserAccount.objects.get(clerkUserID=request.user.username)
-            except UserAccount.DoesNotExist:
+            identity = get_identity(request)
+            if identity.user_account is None:
                 return Response(
                     {'error': 'User account not found'},
                     status=status.HTTP_404_NOT_FOUND
@@ -532,28 +856,24 @@ class CountViewView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            # Validate profiles exist
-            try:
-                from_profile = Profile.objects.get(profileID=from_id)
-                to_profile = Profile.objects.get(profileID=to_id)
-            except Profile.DoesNotExist:
-                return Response(
-                    {'error': 'One or both profiles not found'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-
             # Verify user owns the from_profile
-            if from_profile.userID_id != user_account.userID:
+            if not identity.owns(from_id):
                 return Response(
                     {'error': 'User does not own the fromID profile'},
                     status=status.HTTP_403_FORBIDDEN
                 )
 
-            # Create view record
-            ProfileViews.objects.create(
-                fromProfileID=from_profile,
-                toProfileID=to_profile
-            )
+            # Create view record; the foreign key rejects an unknown toID
+            try:
+                ProfileViews.objects.create(
+                    fromProfileID_id=from_id,
+                    toProfileID_id=to_id
+                )
+            except IntegrityError:
+                return Response(
+                    {'error': 'One or both profiles not found'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
 
             return Response(
                 {'message': 'View count updated'},
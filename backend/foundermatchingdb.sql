@@ -256,3 +256,83 @@ ALTER TABLE "Certificate" ADD FOREIGN KEY ("ProfileOwner") REFERENCES "Profile"
 ALTER TABLE "Achievement" ADD FOREIGN KEY ("ProfileOwner") REFERENCES "Profile" ("ProfileID");
 
 ALTER TABLE "JobPosition" ADD FOREIGN KEY ("ProfileOwner") REFERENCES "Profile" ("ProfileID");
+
+-- Discover exclusion anti-joins (NOT EXISTS against Matching/SkippedProfiles/SavedProfiles, own profiles by UserID)
+CREATE INDEX IF NOT EXISTS "Matching_Candidate_Startup_idx" ON "Matching" ("CandidateProfileID", "StartupProfileID", "CandidateStatus");
+
+CREATE INDEX IF NOT EXISTS "Matching_Startup_Candidate_idx" ON "Matching" ("StartupProfileID", "CandidateProfileID", "StartupStatus");
+
+CREATE INDEX IF NOT EXISTS "SkippedProfiles_From_To_idx" ON "SkippedProfiles" ("SkippedFromProfileID", "SkippedToProfileID");
+
+CREATE INDEX IF NOT EXISTS "SavedProfiles_From_To_idx" ON "SavedProfiles" ("SavedFromProfileID", "SavedToProfileID");
+
+CREATE INDEX IF NOT EXISTS "Profile_UserID_idx" ON "Profile" ("UserID");
+
+-- Offline top-K discover matches per profile, written by `manage.py precompute_matches`
+CREATE TABLE IF NOT EXISTS "PrecomputedMatches" (
+  "ProfileID" integer NOT NULL REFERENCES "Profile" ("ProfileID") ON DELETE CASCADE,
+  "Rank" smallint NOT NULL,
+  "MatchProfileID" integer NOT NULL REFERENCES "Profile" ("ProfileID") ON DELETE CASCADE,
+  "Score" real NOT NULL,
+  "ComputedAt" timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY ("ProfileID", "Rank")
+);
+
+-- Incremental re-scoring looks up the lists an edited profile appears in
+CREATE INDEX IF NOT EXISTS "PrecomputedMatches_Match_idx" ON "PrecomputedMatches" ("MatchProfileID");
+
+-- Profiles waiting for incremental re-scoring, drained by `manage.py rescore_matches`
+CREATE TABLE IF NOT EXISTS "RescoreQueue" (
+  "ProfileID" integer PRIMARY KEY REFERENCES "Profile" ("ProfileID") ON DELETE CASCADE,
+  "QueuedAt" timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS "RescoreQueue_QueuedAt_idx" ON "RescoreQueue" ("QueuedAt", "ProfileID");
+
+-- Open job positions only: the job feed index build and per-owner lookups of open roles
+CREATE INDEX IF NOT EXISTS "JobPosition_Open_Owner_idx" ON "JobPosition" ("ProfileOwner", "JobPositionID") WHERE "IsOpening";
+
+-- Profile search (discover/search.py). Full-text vectors are generated
+-- columns, so they never go stale; industry and slogan get their own so
+-- search can skip them when they are not public. Adding a stored generated
+-- column rewrites the table once.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE "Profile" ADD COLUMN IF NOT EXISTS "SearchVector" tsvector GENERATED ALWAYS AS (
+  setweight(to_tsvector('english', coalesce("Name", '')), 'A') ||
+  setweight(to_tsvector('english', coalesce("Description", '')), 'C') ||
+  setweight(to_tsvector('english', coalesce("AboutUs", '')), 'C')
+) STORED;
+
+ALTER TABLE "Profile" ADD COLUMN IF NOT EXISTS "IndustrySearchVector" tsvector GENERATED ALWAYS AS (
+  setweight(to_tsvector('english', coalesce("Industry", '')), 'B')
+) STORED;
+
+ALTER TABLE "Profile" ADD COLUMN IF NOT EXISTS "SloganSearchVector" tsvector GENERATED ALWAYS AS (
+  setweight(to_tsvector('english', coalesce("Slogan", '')), 'B')
+) STORED;
+
+ALTER TABLE "JobPosition" ADD COLUMN IF NOT EXISTS "SearchVector" tsvector GENERATED ALWAYS AS (
+  setweight(to_tsvector('english', coalesce("JobTitle", '')), 'B')
+) STORED;
+
+CREATE INDEX IF NOT EXISTS "Profile_SearchVector_idx" ON "Profile" USING gin ("SearchVector");
+
+CREATE INDEX IF NOT EXISTS "Profile_IndustrySearchVector_idx" ON "Profile" USING gin ("IndustrySearchVector");
+
+CREATE INDEX IF NOT EXISTS "Profile_SloganSearchVector_idx" ON "Profile" USING gin ("SloganSearchVector");
+
+CREATE INDEX IF NOT EXISTS "JobPosition_Open_SearchVector_idx" ON "JobPosition" USING gin ("SearchVector") WHERE "IsOpening";
+
+-- Typo-tolerant name lookups (word_similarity, the <% operator)
+CREATE INDEX IF NOT EXISTS "Profile_Name_trgm_idx" ON "Profile" USING gin ("Name" gin_trgm_ops);
+
+-- One Matching row per (candidate, startup) pair: the conflict target of the
+-- connect upsert (discover/transitions.py). Duplicates left by concurrent
+-- connects are removed first, keeping the matched row, then the newest.
+DELETE FROM "Matching" m USING "Matching" d
+WHERE d."CandidateProfileID" = m."CandidateProfileID"
+  AND d."StartupProfileID" = m."StartupProfileID"
+  AND (d."IsMatched", d."ID") > (m."IsMatched", m."ID");
+
+CREATE UNIQUE INDEX IF NOT EXISTS "Matching_Candidate_Startup_key" ON "Matching" ("CandidateProfileID", "StartupProfileID");
@@ -4,6 +4,9 @@ from .models import (
     Achievement, ProfilePrivacySettings, Countries,
     Tags, ProfileTagInstances, JobPosition, JobPositionTagInstances
 )
+from .signals import (
+    PROFILE_TEXT_FIELDS, job_positions_changed, profile_fields_changed, profile_tags_changed, profile_text_changed
+)
 from datetime import datetime
 import re
 import os
@@ -232,6 +235,31 @@ class ProfileSerializer(ModelSerializer):
                 
         raise serializers.ValidationError("Avatar must be a base64 encoded image string")
 
+    def _notify_tags_changed(self, profile):
+        profile_id = profile.profileID
+        transaction.on_commit(
+            lambda: profile_tags_changed.send(sender=Profile, profile_id=profile_id)
+        )
+
+    def _notify_text_changed(self, profile):
+        profile_id = profile.profileID
+        transaction.on_commit(
+            lambda: profile_text_changed.send(sender=Profile, profile_id=profile_id)
+        )
+
+    def _notify_job_positions_changed(self, profile):
+        profile_id = profile.profileID
+        transaction.on_commit(
+            lambda: job_positions_changed.send(sender=Profile, profile_id=profile_id)
+        )
+
+    def _notify_fields_changed(self, profile, fields):
+        profile_id = profile.profileID
+        fields = tuple(fields)
+        transaction.on_commit(
+            lambda: profile_fields_changed.send(sender=Profile, profile_id=profile_id, fields=fields)
+        )
+
     @transaction.atomic
     def _process_tags(self, profile, tags_data):
         if tags_data is None:
@@ -285,6 +313,9 @@ class ProfileSerializer(ModelSerializer):
                 ProfileTagInstances.objects.bulk_create(new_instances)
                 logger.info(f"Created {len(new_instances)} new tag instances")
 
+        if tags_to_remove or tags_to_add:
+            self._notify_tags_changed(profile)
+
     @transaction.atomic
     def create(self, validated_data):
         tags_data = validated_data.pop('tags', None)
@@ -295,6 +326,8 @@ class ProfileSerializer(ModelSerializer):
         privacy_settings_data = validated_data.pop('profileprivacysettings', None)
 
         profile = Profile.objects.create(**validated_data)
+        self._notify_fields_changed(profile, validated_data)
+        self._notify_text_changed(profile)
 
         # Process tags
         self._process_tags(profile, tags_data)
@@ -320,6 +353,8 @@ class ProfileSerializer(ModelSerializer):
                 )
 
         created_jobs = JobPosition.objects.bulk_create(new_job_positions)
+        if created_jobs:
+            self._notify_job_positions_changed(profile)
     
         if new_job_position_tags:
             for i, job in enumerate(created_jobs):
@@ -327,6 +362,7 @@ class ProfileSerializer(ModelSerializer):
                     if tag.jobPositionID == new_job_positions[i]:
                         tag.jobPositionID = job
             JobPositionTagInstances.objects.bulk_create(new_job_position_tags)
+            self._notify_tags_changed(profile)
 
         # Create experiences
         if experiences_data:
@@ -379,6 +415,12 @@ class ProfileSerializer(ModelSerializer):
                 setattr(instance, attr, value)
         instance.save(update_fields=[field for field in validated_data.keys() if not field.endswith('_set')])
 
+        if validated_data:
+            self._notify_fields_changed(instance, validated_data)
+        if experiences_data is not None or job_positions_data is not None or \
+                any(field in validated_data for field in PROFILE_TEXT_FIELDS):
+            self._notify_text_changed(instance)
+
         # Update tags if provided
         if tags_data is not None:
             self._process_tags(instance, tags_data)
@@ -443,6 +485,8 @@ class ProfileSerializer(ModelSerializer):
                         if tag.jobPositionID == new_job_positions[i]:
                             tag.jobPositionID = job
                 JobPositionTagInstances.objects.bulk_create(new_job_position_tags)
+            self._notify_tags_changed(instance)
+            self._notify_job_positions_changed(instance)
 
         # Update privacy settings if provided
         if privacy_settings_data is not None:
@@ -450,6 +494,8 @@ class ProfileSerializer(ModelSerializer):
             for field, value in privacy_settings_data.items():
                 setattr(privacy_settings, field, value)
             privacy_settings.save(update_fields=list(privacy_settings_data.keys()) if privacy_settings_data else None)
+            if privacy_settings_data:
+                self._notify_fields_changed(instance, privacy_settings_data)
 
         # Refresh from database to get updated data
         instance.refresh_from_db()
@@ -0,0 +1,19 @@
+from django.dispatch import Signal
+
+# Sent after commit when a profile's tags or its job position tags change.
+# Receivers get ``profile_id``.
+profile_tags_changed = Signal()
+
+# Sent after commit when one of these fields, the profile's experiences or its
+# job positions change. Receivers get ``profile_id``.
+PROFILE_TEXT_FIELDS = ('description', 'slogan', 'aboutUs', 'statement', 'hobbyInterest', 'education')
+profile_text_changed = Signal()
+
+# Sent after commit when a profile is created or its own columns or privacy
+# settings are updated. Receivers get ``profile_id`` and ``fields``, the names
+# of the columns written.
+profile_fields_changed = Signal()
+
+# Sent after commit when a profile's job positions are created or replaced.
+# Receivers get ``profile_id``.
+job_positions_changed = Signal()
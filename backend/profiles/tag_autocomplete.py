@@ -0,0 +1,166 @@
+"""
+In-memory tag autocomplete.
+
+Every tag is indexed under its lowercased value and under each later word of
+it ("machine learning" is also found by "learn"), in one sorted key list. A
+prefix is answered with two bisections and the tags in between ranked by
+exact match first, then ``ProfileTagInstances`` usage, then shortest value.
+
+Requests only read the worker's index. It is built from the database once,
+then refreshed in a background thread (see ``discover.indexes``):
+
+- a created tag bumps a cache version (see ``tag_created``); workers then
+  load only the tags with a higher ID and insert them into a copy of their
+  index. Tags are never edited or deleted, so this keeps it complete.
+- usage counts drift as profiles change tags; the index is rebuilt once it
+  is older than ``REBUILD_AFTER`` seconds.
+"""
+import bisect
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from discover.indexes import VersionedIndex
+from discover.models import Tags as DiscoverTags
+from .models import ProfileTagInstances, Tags
+
+VERSION_CACHE_KEY = 'profiles:tag_autocomplete:version'
+REBUILD_AFTER = 600
+MAX_LIMIT = 50
+# Tags.Value is varchar(50); longer values only tie on length
+MAX_TAG_LENGTH = 64
+
+
+def _normalize(value):
+    return ' '.join((value or '').lower().split())
+
+
+def _keys(value):
+    """The normalized value and each of its suffixes starting at a later word."""
+    words = _normalize(value).split(' ')
+    return [' '.join(words[i:]) for i in range(len(words)) if words[i]]
+
+
+class TagPrefixIndex:
+    def __init__(self, tags, counts):
+        """``tags``: ``(id, value)`` rows; ``counts``: ``{tag id: profiles using it}``."""
+        tags = sorted(tags)
+        self.tag_ids = np.array([tag_id for tag_id, _ in tags], dtype=np.int64)
+        self.values = [value for _, value in tags]
+        self.normalized = [_normalize(value) for value in self.values]
+        self.counts = np.array([counts.get(tag_id, 0) for tag_id, _ in tags], dtype=np.int64)
+        self.lengths = np.array([len(value) for value in self.values], dtype=np.int64)
+        entries = sorted((key, row) for row, (_, value) in enumerate(tags) for key in _keys(value))
+        self.keys = [key for key, _ in entries]
+        self.key_rows = np.array([row for _, row in entries], dtype=np.int64)
+
+    @classmethod
+    def build(cls):
+        tags = list(Tags.objects.values_list('id', 'value'))
+        return cls(tags, _usage_counts())
+
+    def __len__(self):
+        return len(self.tag_ids)
+
+    @property
+    def max_tag_id(self):
+        return int(self.tag_ids[-1]) if len(self.tag_ids) else 0
+
+    def with_tags(self, tags, counts):
+        """
+        A copy with ``tags`` inserted, for tags created since this index was
+        built. The copy is swapped in whole, so readers never see it half done.
+        """
+        index = TagPrefixIndex.__new__(TagPrefixIndex)
+        index.tag_ids = self.tag_ids
+        index.values = list(self.values)
+        index.normalized = list(self.normalized)
+        index.counts = self.counts
+        keys = list(self.keys)
+        key_rows = self.key_rows.tolist()
+        tags = sorted(tags)
+        for tag_id, value in tags:
+            row = len(index.values)
+            index.values.append(value)
+            index.normalized.append(_normalize(value))
+            for key in _keys(value):
+                position = bisect.bisect_right(keys, key)
+                keys.insert(position, key)
+                key_rows.insert(position, row)
+        index.tag_ids = np.concatenate((self.tag_ids, np.array([tag_id for tag_id, _ in tags], dtype=np.int64)))
+        index.counts = np.concatenate((
+            self.counts, np.array([counts.get(tag_id, 0) for tag_id, _ in tags], dtype=np.int64)
+        ))
+        index.lengths = np.concatenate((
+            self.lengths, np.array([len(value) for _, value in tags], dtype=np.int64)
+        ))
+        index.keys = keys
+        index.key_rows = np.array(key_rows, dtype=np.int64)
+        return index
+
+    def complete(self, prefix, limit=10):
+        """Up to ``limit`` tags with a word starting with ``prefix``, best first."""
+        prefix = _normalize(prefix)
+        if not prefix:
+            return []
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + '\U0010ffff', lo=start)
+        rows = np.unique(self.key_rows[start:end])
+        if not len(rows):
+            return []
+        # One sortable int per row: usage, then shorter value, then lower tagID
+        n_tags = len(self.tag_ids)
+        shortness = MAX_TAG_LENGTH - 1 - np.minimum(self.lengths[rows], MAX_TAG_LENGTH - 1)
+        rank = (self.counts[rows] * MAX_TAG_LENGTH + shortness) * n_tags + (n_tags - 1 - rows)
+        # Keys equal to the prefix sort first in the range; some are later words of longer tags
+        exact_end = bisect.bisect_right(self.keys, prefix, lo=start, hi=end)
+        exact = [row for row in self.key_rows[start:exact_end].tolist() if self.normalized[row] == prefix]
+        rank[np.isin(rows, exact)] += (int(self.counts.max()) + 1) * MAX_TAG_LENGTH * n_tags
+        if len(rows) > limit:
+            top = np.argpartition(-rank, limit - 1)[:limit]
+            rows, rank = rows[top], rank[top]
+        rows = rows[np.argsort(-rank)]
+        return [
+            {
+                'tagID': int(self.tag_ids[row]),
+                'value': self.values[row],
+                'usageCount': int(self.counts[row]),
+            }
+            for row in rows.tolist()
+        ]
+
+
+def _usage_counts(tag_ids=None):
+    instances = ProfileTagInstances.objects.all()
+    if tag_ids is not None:
+        instances = instances.filter(tagID__in=tag_ids)
+    return dict(instances.values('tagID').annotate(n=Count('tagID')).values_list('tagID', 'n'))
+
+
+def _with_new_tags(index):
+    """``index`` with the tags created since it was built."""
+    tags = list(Tags.objects.filter(id__gt=index.max_tag_id).values_list('id', 'value'))
+    counts = _usage_counts([tag_id for tag_id, _ in tags]) if tags else {}
+    return index.with_tags(tags, counts)
+
+
+_index = VersionedIndex(
+    'tag_autocomplete', VERSION_CACHE_KEY, TagPrefixIndex.build,
+    update=_with_new_tags, max_age=REBUILD_AFTER
+)
+
+
+def get_tag_index():
+    """This worker's index; see ``discover.indexes``."""
+    return _index.get()
+
+
+@receiver(post_save, sender=Tags)
+@receiver(post_save, sender=DiscoverTags)
+def tag_created(sender, instance, created, **kwargs):
+    # Both apps' ProfileSerializer create tags with get_or_create while saving profiles
+    if created:
+        transaction.on_commit(_index.bump)
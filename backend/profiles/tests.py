@@ -1,3 +1,16 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .views import _etag_matches
+
+
+class ETagMatchTests(SimpleTestCase):
+    def test_whole_tags_only(self):
+        self.assertTrue(_etag_matches('"abc"', '"abc"'))
+        self.assertTrue(_etag_matches('"x", "abc" ,"y"', '"abc"'))
+        self.assertFalse(_etag_matches('"abcd"', '"abc"'))
+        self.assertFalse(_etag_matches('"xabc"', '"abc"'))
+        self.assertFalse(_etag_matches('', '"abc"'))
+
+    def test_weak_and_any(self):
+        self.assertTrue(_etag_matches('W/"abc"', '"abc"'))
+        self.assertTrue(_etag_matches('*', '"abc"'))
@@ -4,7 +4,8 @@ from .views import (
     GetUserProfilesView,
     GetCurrentUserProfileView,
     GetUserProfileByIdView,
-    UpdateProfileView
+    UpdateProfileView,
+    TagAutocompleteView
 )
 
 urlpatterns = [
@@ -12,5 +13,6 @@ urlpatterns = [
     path('getUserProfiles/', GetUserProfilesView.as_view(), name='get_user_profiles'),
     path('me/', GetCurrentUserProfileView.as_view(), name='get_current_user_profile'),
     path('me/update/', UpdateProfileView.as_view(), name='update_profile'),
+    path('tags/autocomplete/', TagAutocompleteView.as_view(), name='tag_autocomplete'),
     path('<int:profileID>', GetUserProfileByIdView.as_view(), name='get_user_profile_by_id'),
 ] 
\ No newline at end of file
@@ -9,7 +9,9 @@ from django.http import HttpResponse
 from .serializers import ProfileSerializer, ProfilePreviewCardSerializer, TagSerializer
 from .models import Profile, UserAccount, ProfilePrivacySettings, Connection, Tags, ProfileTagInstances
 from django.core.exceptions import ValidationError
+from accounts.identity import get_identity, invalidate_identity
 from accounts.middlewares import JWTAuthenticationMiddleware
+from .tag_autocomplete import MAX_LIMIT, get_tag_index
 from discover.models import Matching
 import json
 import base64
@@ -18,6 +20,9 @@ import os
 import tempfile
 import mimetypes
 from django.db.models import Q, Prefetch
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
+import hashlib
 
 logger = logging.getLogger(__name__)
 
@@ -51,14 +56,13 @@ class CreateProfileView(APIView):
     @transaction.atomic
     def post(self, request):
         try:
-            try:
-                user_account = UserAccount.objects.get(clerkUserID=request.user.username)
-                user_id = user_account.userID
-            except UserAccount.DoesNotExist:
+            identity = get_identity(request)
+            if identity.user_account is None:
                 return Response(
                     {'error': 'User account not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
+            user_id = identity.user_id
 
             profile_data = json.loads(request.data.get('ProfileInfo', '{}'))
             profile_data['userID'] = user_id
@@ -82,6 +86,9 @@ class CreateProfileView(APIView):
             serializer = ProfileSerializer(data=profile_data)
             if serializer.is_valid():
                 profile = serializer.save()
+                # The cached identity must pick up the new profile once it is committed
+                clerk_user_id = request.user.username
+                transaction.on_commit(lambda: invalidate_identity(clerk_user_id))
                 return Response(
                     serializer.data,
                     status=status.HTTP_201_CREATED
@@ -103,14 +110,13 @@ class GetUserProfilesView(APIView):
 
     def get(self, request):
         try:
-            try:
-                user_account = UserAccount.objects.get(clerkUserID=request.user.username)
-                user_id = user_account.userID
-            except UserAccount.DoesNotExist:
+            identity = get_identity(request)
+            if identity.user_account is None:
                 return Response(
                     {'error': 'User account not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
+            user_id = identity.user_id
 
             # Get profiles with prefetched tags
             profiles = Profile.objects.filter(userID=user_id).prefetch_related(
@@ -154,14 +160,13 @@ class GetCurrentUserProfileView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            try:
-                user_account = UserAccount.objects.get(clerkUserID=request.user.username)
-                user_id = user_account.userID
-            except UserAccount.DoesNotExist:
+            identity = get_identity(request)
+            if identity.user_account is None:
                 return Response(
                     {'error': 'User account not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
+            user_id = identity.user_id
 
             # Get profile with prefetched tags and related data
             profile = Profile.objects.filter(
@@ -205,14 +210,13 @@ class GetCurrentUserProfileView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            try:
-                user_account = UserAccount.objects.get(clerkUserID=request.user.username)
-                user_id = user_account.userID
-            except UserAccount.DoesNotExist:
+            identity = get_identity(request)
+            if identity.user_account is None:
                 return Response(
                     {'error': 'User account not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
+            user_id = identity.user_id
 
             # Get profile
             profile = Profile.objects.filter(
@@ -243,6 +247,9 @@ class GetCurrentUserProfileView(APIView):
 
             serializer = ProfileSerializer(profile, data=profile_data, partial=True)
             if serializer.is_valid():
+                if 'isStartup' in serializer.validated_data:
+                    clerk_user_id = request.user.username
+                    transaction.on_commit(lambda: invalidate_identity(clerk_user_id))
                 updated_profile = serializer.save()
                 return Response(
                     {'message': 'Profile updated successfully'},
@@ -263,11 +270,11 @@ class GetCurrentUserProfileView(APIView):
 class GetUserProfileByIdView(APIView):
     authentication_classes = [JWTAuthenticationMiddleware]
 
-    def _check_connection_status(self, viewer_profileID, target_profileID):
-        """Check if the viewer is connected to the target profile"""
+    def _check_connection_status(self, viewer_profileIDs, target_profileID):
+        """Check if any of the viewer's profiles is connected to the target profile"""
         return Matching.objects.filter(
-            (Q(candidateprofileid=viewer_profileID) & Q(startupprofileid=target_profileID)) |
-            (Q(candidateprofileid=target_profileID) & Q(startupprofileid=viewer_profileID)),
+            (Q(candidateprofileid__in=viewer_profileIDs) & Q(startupprofileid=target_profileID)) |
+            (Q(candidateprofileid=target_profileID) & Q(startupprofileid__in=viewer_profileIDs)),
             ismatched=True
         ).exists()
 
@@ -282,14 +289,13 @@ class GetUserProfileByIdView(APIView):
     def get(self, request, profileID):
         try:
             # Get the authenticated user's account
-            try:
-                user_account = UserAccount.objects.get(clerkUserID=request.user.username)
-                viewer_id = user_account.userID
-            except UserAccount.DoesNotExist:
+            identity = get_identity(request)
+            if identity.user_account is None:
                 return Response(
                     {'error': 'User account not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
+            viewer_id = identity.user_id
 
             # Get the target profile with prefetched data
             target_profile = Profile.objects.filter(
@@ -318,14 +324,28 @@ class GetUserProfileByIdView(APIView):
             # If not owner, check connection status
             is_connected = False
             if not is_owner:
-                # Get viewer's active profile
-                viewer_profile = Profile.objects.filter(userID=viewer_id).first()
-                if not viewer_profile:
+                if not identity.profiles:
                     return Response(
                         {'error': 'Viewer profile not found'},
                         status=status.HTTP_404_NOT_FOUND
                     )
-                is_connected = self._check_connection_status(viewer_profile.profileID, profileID)
+                # The profile the viewer is browsing as, when given
+                viewer_profile_id = request.query_params.get('viewerProfileID')
+                if viewer_profile_id:
+                    if not identity.owns(viewer_profile_id):
+                        return Response(
+                            {'error': 'Viewer profile does not belong to authenticated user'},
+                            status=status.HTTP_403_FORBIDDEN
+                        )
+                    viewer_profile_ids = [int(viewer_profile_id)]
+                else:
+                    # Connections pair a candidate with a startup: only profiles on the other side count
+                    viewer_profile_ids = [
+                        pid for pid, is_startup in identity.profiles.items()
+                        if is_startup != target_profile.isStartup
+                    ]
+                if viewer_profile_ids:
+                    is_connected = self._check_connection_status(viewer_profile_ids, profileID)
 
             # Serialize the profile
             serializer = ProfileSerializer(target_profile)
@@ -477,14 +497,13 @@ class UpdateProfileView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            try:
-                user_account = UserAccount.objects.get(clerkUserID=request.user.username)
-                user_id = user_account.userID
-            except UserAccount.DoesNotExist:
+            identity = get_identity(request)
+            if identity.user_account is None:
                 return Response(
                     {'error': 'User account not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
+            user_id = identity.user_id
 
             try:
                 profile = Profile.objects.get(profileID=profile_id, userID=user_id)
@@ -512,6 +531,9 @@ class UpdateProfileView(APIView):
 
             serializer = ProfileSerializer(profile, data=profile_data, partial=True)
             if serializer.is_valid():
+                if 'isStartup' in serializer.validated_data:
+                    clerk_user_id = request.user.username
+                    transaction.on_commit(lambda: invalidate_identity(clerk_user_id))
                 serializer.save()
                 return Response(
                     serializer.data,
@@ -528,3 +550,44 @@ class UpdateProfileView(APIView):
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+def _etag_matches(if_none_match, etag):
+    """Weak comparison of ``etag`` with an If-None-Match list (``*`` matches anything)."""
+    etags = parse_etags(if_none_match)
+    return '*' in etags or any(tag.removeprefix('W/') == etag for tag in etags)
+
+
+class TagAutocompleteView(APIView):
+    """Tags starting with ``q`` (or having a word that does), most used first."""
+    authentication_classes = [JWTAuthenticationMiddleware]
+    # Same answer for every user; short so new tags and usage show up soon
+    MAX_AGE = 300
+
+    def get(self, request):
+        try:
+            q = request.query_params.get('q', '')
+            try:
+                limit = int(request.query_params.get('limit', 10))
+            except ValueError:
+                return Response(
+                    {'error': 'limit must be an integer'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            results = get_tag_index().complete(q, max(1, min(limit, MAX_LIMIT)))
+
+            etag = quote_etag(hashlib.md5(json.dumps(results).encode()).hexdigest())
+            if _etag_matches(request.headers.get('If-None-Match', ''), etag):
+                response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = Response({'query': q, 'results': results}, status=status.HTTP_200_OK)
+            response['ETag'] = etag
+            patch_cache_control(response, private=True, max_age=self.MAX_AGE)
+            return response
+
+        except Exception as e:
+            logger.error(f"Error in tag autocomplete view: {str(e)}")
+            return Response(
+                {'error': 'An unexpected error occurred'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
@@ -3,8 +3,8 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.core.paginator import Paginator
+from accounts.identity import get_identity
 from accounts.middlewares import JWTAuthenticationMiddleware
-from profiles.models import Profile
 from profiles.serializers import ProfilePreviewCardSerializer
 from .models import SavedProfiles, SkippedProfiles, ProfileViews
 import logging
@@ -23,17 +23,10 @@ class GetViewedProfilesView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            try:
-                profile = Profile.objects.get(profileID=profile_id)
-                if profile.userID.clerkUserID != request.user.username:
-                    return Response(
-                        {'error': 'You do not have permission to view these profiles'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-            except Profile.DoesNotExist:
+            if not get_identity(request).owns(profile_id):
                 return Response(
-                    {'error': 'Profile not found'},
-                    status=status.HTTP_404_NOT_FOUND
+                    {'error': 'You do not have permission to view these profiles'},
+                    status=status.HTTP_403_FORBIDDEN
                 )
 
             page = int(request.query_params.get('page', 1))
@@ -94,17 +87,10 @@ class GetSavedProfilesView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            try:
-                profile = Profile.objects.get(profileID=profile_id)
-                if profile.userID.clerkUserID != request.user.username:
-                    return Response(
-                        {'error': 'You do not have permission to view these saved profiles'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-            except Profile.DoesNotExist:
+            if not get_identity(request).owns(profile_id):
                 return Response(
-                    {'error': 'Profile not found'},
-                    status=status.HTTP_404_NOT_FOUND
+                    {'error': 'You do not have permission to view these saved profiles'},
+                    status=status.HTTP_403_FORBIDDEN
                 )
 
             page = int(request.query_params.get('page', 1))
@@ -165,17 +151,10 @@ class GetSkippedProfilesView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
 
-            try:
-                profile = Profile.objects.get(profileID=profile_id)
-                if profile.userID.clerkUserID != request.user.username:
-                    return Response(
-                        {'error': 'You do not have permission to view these skipped profiles'},
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-            except Profile.DoesNotExist:
+            if not get_identity(request).owns(profile_id):
                 return Response(
-                    {'error': 'Profile not found'},
-                    status=status.HTTP_404_NOT_FOUND
+                    {'error': 'You do not have permission to view these skipped profiles'},
+                    status=status.HTTP_403_FORBIDDEN
                 )
 
             page = int(request.query_params.get('page', 1))